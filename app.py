@@ -1,18 +1,20 @@
-import streamlit as st
-import requests
 import datetime
-import pandas as pd
-from datetime import timedelta
-import os
-from dotenv import load_dotenv
+from collections import deque
 
-# Load environment variables
-load_dotenv()
+import streamlit as st
 
-# Import utility modules
-from utils.weather import get_weather_data, get_forecast
+# Import utility modules; heavier ones (pandas, numpy, aiohttp) are imported
+# inside the pages and functions that use them to keep reruns and cold starts fast
+from utils.config import load_config
+from utils import metrics
+from utils.geocode import canonical_location, place_label, suggest_locations
+from utils.prefetch import get_scheduler
+from utils.ratelimit import RateLimited
 from utils.recommendations import get_watering_recommendation, get_mowing_recommendation
 
+# Load environment variables (once per process)
+load_config()
+
 # Page configuration
 st.set_page_config(
     page_title="TurboLawn - Lawn Care Assistant",
@@ -30,11 +32,34 @@ if 'selected_location' not in st.session_state:
 if 'lawn_type' not in st.session_state:
     st.session_state.lawn_type = "Cool Season Grass"  # Default
 
+# Soil-moisture model per lawn (location and lawn type), shared by every session and
+# saved to disk, advanced on every Dashboard render
+def get_soil_moisture(location, lawn_type, weather_data):
+    from utils.waterbalance import get_lawn_store
+    return get_lawn_store().observe(location, lawn_type, weather_data)
+
+def log_watering(location, lawn_type, amount):
+    from utils.waterbalance import get_lawn_store
+    get_lawn_store().irrigate(location, lawn_type, amount)
+
+# One background refresher per server process, shared by every session
+@st.cache_resource
+def get_prefetch_scheduler():
+    return get_scheduler()
+
+# Keep this session's saved locations warm in the cache
+prefetch_scheduler = get_prefetch_scheduler()
+for saved_location in st.session_state.saved_locations:
+    prefetch_scheduler.register(saved_location)
+
 # Function to add location to saved locations
 def add_location(location):
-    if location and location not in st.session_state.saved_locations:
+    # Compare canonical keys so "Austin, TX" and "austin tx" count as the same place
+    saved_keys = {canonical_location(saved) for saved in st.session_state.saved_locations}
+    if location and canonical_location(location) not in saved_keys:
         st.session_state.saved_locations.append(location)
         st.session_state.selected_location = location
+        prefetch_scheduler.register(location)
         return True
     return False
 
@@ -52,6 +77,11 @@ with st.sidebar:
     location_input = st.text_input("Enter your location (city, state)", 
                                   value=st.session_state.selected_location)
     
+    # Offer known places for partial or misspelled names; keeping the text as typed is the first option
+    suggestions = [place_label(place) for place in suggest_locations(location_input)]
+    if suggestions:
+        location_input = st.selectbox("Did you mean", options=[location_input] + suggestions, index=0)
+    
     if st.button("Add Location"):
         if add_location(location_input):
             st.success(f"Added {location_input} to saved locations!")
@@ -72,74 +102,126 @@ with st.sidebar:
 
 # Main content based on selected page
 if page == "Dashboard":
-    if st.session_state.selected_location:
-        try:
-            # Get weather data
-            weather_data = get_weather_data(st.session_state.selected_location)
-            forecast_data = get_forecast(st.session_state.selected_location)
+    # Time each stage of the render when instrumentation is enabled (see utils.metrics)
+    with metrics.trace("dashboard") as render:
+        if render is not None:
+            # Remember this session's renders, so the debug panel never shows other sessions'
+            if 'renders' not in st.session_state:
+                st.session_state.renders = deque(maxlen=10)
+            st.session_state.renders.append(render)
+        if st.session_state.selected_location:
+            try:
+                import pandas as pd
+                from utils.async_weather import get_client
+            
+                # Get current weather and forecast concurrently, over the process-wide connection pool
+                with metrics.span("fetch_weather"):
+                    weather_data, forecast_data = get_client().fetch(st.session_state.selected_location)
             
-            # Dashboard layout with columns
-            col1, col2 = st.columns(2)
+                # Dashboard layout with columns
+                col1, col2 = st.columns(2)
             
-            with col1:
-                st.subheader("Current Conditions")
-                st.metric("Temperature", f"{weather_data['temp']}°F")
-                st.metric("Humidity", f"{weather_data['humidity']}%")
-                st.metric("Conditions", weather_data['conditions'])
+                with col1:
+                    st.subheader("Current Conditions")
+                    st.metric("Temperature", f"{weather_data['temp']}°F")
+                    st.metric("Humidity", f"{weather_data['humidity']}%")
+                    st.metric("Conditions", weather_data['conditions'])
                 
-                if 'rainfall_24h' in weather_data:
-                    st.metric("Rainfall (Last 24h)", f"{weather_data['rainfall_24h']} in")
+                    if 'rainfall_24h' in weather_data:
+                        st.metric("Rainfall (Last 24h)", f"{weather_data['rainfall_24h']} in")
             
-            with col2:
-                st.subheader("Lawn Care Recommendations")
+                with col2:
+                    st.subheader("Lawn Care Recommendations")
                 
-                # Get recommendations based on weather data
-                watering_rec = get_watering_recommendation(
-                    weather_data, 
-                    forecast_data, 
-                    st.session_state.lawn_type
-                )
+                    # Get recommendations based on weather data
+                    with metrics.span("recommendations"):
+                        watering_rec = get_watering_recommendation(
+                            weather_data, 
+                            forecast_data, 
+                            st.session_state.lawn_type
+                        )
+                    
+                        mowing_rec = get_mowing_recommendation(
+                            weather_data, 
+                            forecast_data, 
+                            st.session_state.lawn_type
+                        )
                 
-                mowing_rec = get_mowing_recommendation(
-                    weather_data, 
-                    forecast_data, 
-                    st.session_state.lawn_type
-                )
+                    with metrics.span("soil_moisture"):
+                        soil_rec = get_soil_moisture(
+                            st.session_state.selected_location,
+                            st.session_state.lawn_type,
+                            weather_data
+                        )
                 
-                st.info(f"💧 **Watering Advice**: {watering_rec['message']}")
-                st.info(f"🌿 **Mowing Advice**: {mowing_rec['message']}")
+                    st.info(f"💧 **Watering Advice**: {watering_rec['message']}")
+                    st.info(f"🌿 **Mowing Advice**: {mowing_rec['message']}")
                 
-                if 'next_water_date' in watering_rec:
-                    st.write(f"Next recommended watering: **{watering_rec['next_water_date'].strftime('%A, %b %d')}**")
+                    if 'next_water_date' in watering_rec:
+                        st.write(f"Next recommended watering: **{watering_rec['next_water_date'].strftime('%A, %b %d')}**")
                 
-                if 'next_mow_date' in mowing_rec:
-                    st.write(f"Next recommended mowing: **{mowing_rec['next_mow_date'].strftime('%A, %b %d')}**")
-            
-            # 5-Day Forecast
-            st.subheader("5-Day Forecast")
+                    if 'next_mow_date' in mowing_rec:
+                        st.write(f"Next recommended mowing: **{mowing_rec['next_mow_date'].strftime('%A, %b %d')}**")
+                
+                    st.metric("Estimated Soil Moisture", f"{soil_rec['soil_moisture']:.0%}")
+                    st.caption(soil_rec['message'])
+                
+                    # Watering the model does not know about would leave the estimate too dry
+                    with st.form("log_watering"):
+                        amount = st.number_input("Watered (inches)", min_value=0.0, max_value=3.0,
+                                                 value=0.5, step=0.1)
+                        if st.form_submit_button("Log Watering") and amount > 0:
+                            log_watering(st.session_state.selected_location, st.session_state.lawn_type, amount)
+                            st.experimental_rerun()
             
-            forecast_df = pd.DataFrame(forecast_data)
-            st.line_chart(forecast_df[['date', 'temp_high', 'temp_low']].set_index('date'))
+                # 5-Day Forecast
+                st.subheader("5-Day Forecast")
             
-            # Create columns for each forecast day
-            forecast_cols = st.columns(min(5, len(forecast_data)))
+                with metrics.span("dataframe"):
+                    forecast_df = pd.DataFrame(forecast_data)
+                with metrics.span("line_chart"):
+                    st.line_chart(forecast_df[['date', 'temp_high', 'temp_low']].set_index('date'))
             
-            for i, (day, col) in enumerate(zip(forecast_data, forecast_cols)):
-                with col:
-                    st.write(f"**{day['date'].strftime('%a')}**")
-                    st.write(f"{day['temp_high']}°F / {day['temp_low']}°F")
-                    st.write(f"{day['conditions']}")
-                    if 'rainfall' in day:
-                        st.write(f"Rain: {day['rainfall']} in")
+                # Create columns for each forecast day
+                forecast_cols = st.columns(min(5, len(forecast_data)))
             
-        except Exception as e:
-            st.error(f"Error retrieving data: {str(e)}")
-    else:
-        st.info("Please enter a location in the sidebar to get started.")
+                for i, (day, col) in enumerate(zip(forecast_data, forecast_cols)):
+                    with col:
+                        st.write(f"**{day['date'].strftime('%a')}**")
+                        st.write(f"{day['temp_high']}°F / {day['temp_low']}°F")
+                        st.write(f"{day['conditions']}")
+                        if 'rainfall' in day:
+                            st.write(f"Rain: {day['rainfall']} in")
+
+                # Watering and mowing planned together over today and the forecast days
+                st.subheader("Planned Schedule")
+                with metrics.span("schedule"):
+                    from utils.planner import plan_schedule
+                    schedule = plan_schedule(weather_data, forecast_data, st.session_state.lawn_type,
+                                             moisture=soil_rec['soil_moisture'])
+
+                schedule_cols = st.columns(len(schedule))
+                for day, col in zip(schedule, schedule_cols):
+                    with col:
+                        st.write(f"**{day['date'].strftime('%a')}**")
+                        if day['mow']:
+                            st.write("🌿 Mow")
+                        if day['water']:
+                            st.write(f"💧 Water {day['water_amount']:.2f} in")
+                        if not day['mow'] and not day['water']:
+                            st.write("Rest")
+                        st.caption(f"Soil moisture {day['moisture']:.0%}")
+
+            except RateLimited as e:
+                st.warning(f"The weather service is busy right now. Please try again in {max(1, round(e.retry_after))} seconds.")
+            except Exception as e:
+                st.error(f"Error retrieving data: {str(e)}")
+        else:
+            st.info("Please enter a location in the sidebar to get started.")
         
-        # Display sample dashboard when no location is selected
-        st.subheader("Sample Dashboard Preview")
-        st.image("https://via.placeholder.com/800x400.png?text=TurboLawn+Dashboard+Preview")
+            # Display sample dashboard when no location is selected
+            st.subheader("Sample Dashboard Preview")
+            st.image("https://via.placeholder.com/800x400.png?text=TurboLawn+Dashboard+Preview")
         
 elif page == "Settings":
     st.header("Settings")
@@ -165,6 +247,28 @@ elif page == "Settings":
     if st.button("Save Settings"):
         st.success("Settings saved successfully!")
     
+    with st.expander("Debug: Render Timings"):
+        # Read-only: sinks are configured per process with TURBOLAWN_METRICS, not per session
+        ring = metrics.registry.sink(metrics.RingBufferSink)
+        if ring is None:
+            st.write("Metrics disabled. Set TURBOLAWN_METRICS=ring to record Dashboard render timings.")
+        else:
+            own = {id(render) for render in st.session_state.get('renders', ())}
+            renders = [render for render in ring.recent() if id(render) in own]
+            if renders:
+                import pandas as pd
+                
+                rows = []
+                for render in reversed(renders):
+                    row = {'started': datetime.datetime.fromtimestamp(render.started_at).strftime('%H:%M:%S'),
+                           'total_ms': round(render.duration * 1000, 1)}
+                    for name, _, _, duration in render.spans:
+                        row[f"{name}_ms"] = round(row.get(f"{name}_ms", 0) + duration * 1000, 1)
+                    rows.append(row)
+                st.dataframe(pd.DataFrame(rows))
+            else:
+                st.write("No renders recorded yet. Open the Dashboard to record one.")
+    
 elif page == "About":
     st.header("About TurboLawn")
     
@@ -0,0 +1,456 @@
+"""
+Batch runner: lawn care recommendations (and optionally schedules) for a file of lawns
+
+Run with:
+    python batch_runner.py lawns.csv --output results.csv
+    python batch_runner.py lawns.jsonl --output results.parquet --schedule --workers 8
+    python batch_runner.py lawns.csv --output results.csv --resume
+
+Input is CSV with a header row or JSONL (by extension), one lawn per row:
+location (or lat and lon), lawn_type, and for --schedule optionally
+moisture and days_since_mow. Output is CSV, JSONL or Parquet, by the
+output's extension or --format; Parquet is written as a directory with
+one part file per chunk and needs pyarrow (or fastparquet).
+
+The input is read a chunk at a time. The main process fetches each chunk's
+weather tiles with the async client, at bulk priority, while a process
+pool runs the vectorized engines on earlier chunks and encodes their
+rows; chunks are written in input order. At most two chunks per worker
+are in flight, so memory stays bounded whatever the size of the input.
+
+After each chunk is written and flushed, <output>.progress records how
+many input rows are done. --resume cuts the output back to the last
+recorded chunk and carries on from the next row.
+
+Rows are only written with real weather. Rate limits are waited out and
+other failed tiles are fetched again a few times; if a tile still fails,
+the chunks before it are written and the run exits with status 1, so
+--resume retries from the failed chunk.
+"""
+import argparse
+import asyncio
+import csv
+import datetime
+import io
+import itertools
+import json
+import logging
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from utils.async_weather import WeatherClient
+from utils.batch import get_recommendations, pack_lawns
+from utils.planner import plan_schedules
+from utils.ratelimit import BULK, RateLimited, priority
+from utils.tiles import lawn_tile_keys
+
+logger = logging.getLogger("batch_runner")
+
+DEFAULT_LAWN_TYPE = "Cool Season Grass"
+
+# Lawns read, fetched and scored together; bounds memory per chunk in flight
+CHUNK_SIZE = 5000
+
+# Rounds of fetching a chunk's failed tiles (each after the client's own retries) before the run fails
+FETCH_ATTEMPTS = 3
+FETCH_BACKOFF = 5.0
+
+FORMATS = ('csv', 'jsonl', 'parquet')
+
+COLUMNS = ('location', 'lat', 'lon', 'lawn_type', 'tile', 'should_water', 'water_amount',
+           'next_water_date', 'should_mow', 'next_mow_date')
+# Added with --schedule: the planned days as lists of ISO dates
+SCHEDULE_COLUMNS = ('water_dates', 'mow_dates')
+
+
+class InputError(Exception):
+    """
+    Raised for input rows that cannot be scored
+    """
+
+
+class FetchError(Exception):
+    """
+    Raised when a chunk's weather could not be fetched
+    """
+
+
+def _days_since_mow(value):
+    return int(float(value))
+
+
+def _lawn(row, path, number):
+    lawn = {'lawn_type': row.get('lawn_type') or DEFAULT_LAWN_TYPE}
+    for name, cast in (('lat', float), ('lon', float), ('moisture', float), ('days_since_mow', _days_since_mow)):
+        value = row.get(name)
+        if value is None or value == "":
+            continue
+        try:
+            lawn[name] = cast(value)
+        except (TypeError, ValueError):
+            raise InputError(f"{path}, row {number}: {name} must be a number")
+    if row.get('location'):
+        lawn['location'] = row['location']
+    elif 'lat' not in lawn or 'lon' not in lawn:
+        raise InputError(f"{path}, row {number}: every lawn needs a location or lat and lon")
+    return lawn
+
+
+def read_lawns(path):
+    """
+    Yield lawn dicts from a CSV (with a header row) or JSONL file
+
+    Raises:
+        InputError: For rows without a location or lat/lon, or with non-numeric values
+    """
+    with open(path, newline="", encoding="utf-8") as f:
+        if path.endswith(".jsonl"):
+            rows = (json.loads(line) for line in f if line.strip())
+        else:
+            rows = csv.DictReader(f)
+        for number, row in enumerate(rows, 1):
+            yield _lawn(row, path, number)
+
+
+def _csv_value(value):
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        return ";".join(value)
+    return value
+
+
+def encode_csv(rows):
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(zip(*([_csv_value(value) for value in column] for column in rows.values())))
+    return buffer.getvalue().encode("utf-8")
+
+
+def encode_jsonl(rows):
+    names = list(rows)
+    return "".join(json.dumps(dict(zip(names, values))) + "\n" for values in zip(*rows.values())).encode("utf-8")
+
+
+def encode_parquet(rows):
+    import pandas as pd
+
+    buffer = io.BytesIO()
+    pd.DataFrame(rows).to_parquet(buffer, index=False)
+    return buffer.getvalue()
+
+
+ENCODERS = {'csv': encode_csv, 'jsonl': encode_jsonl, 'parquet': encode_parquet}
+
+
+def score_chunk(lawns, keys, tile_of, weather, forecasts, fmt, schedule, today, current_hour):
+    """
+    Run the batch engines on one chunk and encode its output rows (runs in a worker process)
+
+    Returns:
+        Tuple of (number of lawns, encoded rows)
+    """
+    columns, matrix = pack_lawns(lawns, tile_of, weather, forecasts, DEFAULT_LAWN_TYPE)
+    results = get_recommendations(columns, matrix, today=today, current_hour=current_hour)
+    should_water = results['should_water']
+    water_amount = np.round(results['water_amount'], 3).tolist()
+    rows = {
+        'location': [lawn.get('location') for lawn in lawns],
+        'lat': [lawn.get('lat') for lawn in lawns],
+        'lon': [lawn.get('lon') for lawn in lawns],
+        'lawn_type': [lawn['lawn_type'] for lawn in lawns],
+        'tile': keys,
+        'should_water': should_water.tolist(),
+        'water_amount': [amount if water else None for amount, water in zip(water_amount, should_water.tolist())],
+        'next_water_date': [str(date) for date in results['next_water_date']],
+        'should_mow': results['should_mow'].tolist(),
+        'next_mow_date': [str(date) for date in results['next_mow_date']],
+    }
+
+    if schedule:
+        for name, missing in (('moisture', np.nan), ('days_since_mow', -1)):
+            if any(name in lawn for lawn in lawns):
+                columns[name] = np.array([lawn.get(name, missing) for lawn in lawns])
+        plan = plan_schedules(columns, matrix, today=today)
+        dates = np.array([str(date) for date in plan['date'][0]])
+        rows['water_dates'] = [dates[days].tolist() for days in plan['water']]
+        rows['mow_dates'] = [dates[days].tolist() for days in plan['mow']]
+
+    return len(lawns), ENCODERS[fmt](rows)
+
+
+class FileSink:
+    """
+    CSV or JSONL output: one file, appended to chunk by chunk
+
+    Positions are byte sizes of the file.
+    """
+
+    def __init__(self, path, header=b""):
+        self.path = path
+        self.header = header
+        self._file = None
+
+    def open(self, position=None):
+        """
+        Start a new file, or reopen one cut back to a recorded position
+        """
+        if position is None:
+            self._file = open(self.path, "wb")
+            self._file.write(self.header)
+        else:
+            self._file = open(self.path, "r+b")
+            self._file.truncate(position)
+            self._file.seek(position)
+
+    def write(self, data):
+        self._file.write(data)
+
+    def flush(self):
+        """
+        Make everything written so far durable and return the position to resume from
+        """
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return self._file.tell()
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+
+
+class PartSink:
+    """
+    Parquet output: a directory with one part file per chunk
+
+    Positions are numbers of part files.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.parts = 0
+
+    def _part(self, number):
+        return os.path.join(self.path, f"part-{number:06d}.parquet")
+
+    def open(self, position=None):
+        os.makedirs(self.path, exist_ok=True)
+        self.parts = position or 0
+        for name in os.listdir(self.path):
+            if name.startswith("part-") and int(name[5:11]) >= self.parts:
+                os.remove(os.path.join(self.path, name))
+
+    def write(self, data):
+        # Write then rename, so a part file is either complete or absent
+        path = self._part(self.parts)
+        with open(path + ".tmp", "wb") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(path + ".tmp", path)
+        self.parts += 1
+
+    def flush(self):
+        return self.parts
+
+    def close(self):
+        pass
+
+
+def _sink(path, fmt, schedule):
+    if fmt == 'parquet':
+        import pandas as pd
+
+        # Fail before fetching anything if no Parquet engine is installed
+        pd.io.parquet.get_engine('auto')
+        return PartSink(path)
+    if fmt == 'csv':
+        return FileSink(path, encode_csv({name: [name] for name in COLUMNS + SCHEDULE_COLUMNS * schedule}))
+    return FileSink(path)
+
+
+def _load_progress(path):
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _save_progress(path, progress):
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(progress, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(path + ".tmp", path)
+
+
+async def _fetch(client, tiles):
+    """
+    Fetch every tile of a chunk without falling back to mock data
+
+    Upstream rate limits are waited out; tiles that fail otherwise are
+    fetched again, up to FETCH_ATTEMPTS rounds.
+
+    Raises:
+        FetchError: If some tiles still failed
+    """
+    fetched = {}
+    missing = list(tiles)
+    attempt = 0
+    while missing:
+        results = await asyncio.gather(*(client.fetch(tile, fallback=False) for tile in missing),
+                                       return_exceptions=True)
+        errors = {}
+        for tile, result in zip(missing, results):
+            if isinstance(result, Exception):
+                errors[tile] = result
+            else:
+                fetched[tile] = result
+        missing = list(errors)
+        if not missing:
+            break
+
+        limited = [e for e in errors.values() if isinstance(e, RateLimited)]
+        if limited:
+            wait = max(e.retry_after for e in limited)
+            logger.warning("Weather API rate limited; retrying %d tiles in %.0f s", len(missing), wait)
+            await asyncio.sleep(wait)
+            continue
+        attempt += 1
+        tile, error = next(iter(errors.items()))
+        if attempt >= FETCH_ATTEMPTS:
+            raise FetchError(f"Could not fetch weather for {len(missing)} of {len(tiles)} tiles "
+                             f"(e.g. {tile}: {error!r})")
+        logger.warning("Fetching %d tiles failed (e.g. %s: %r); retrying", len(missing), tile, error)
+        await asyncio.sleep(FETCH_BACKOFF * attempt)
+    return fetched
+
+
+def _chunks(lawns, size):
+    while True:
+        chunk = list(itertools.islice(lawns, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+async def run(input_path, output_path, fmt, schedule=False, workers=None, chunk_size=CHUNK_SIZE, resume=False):
+    """
+    Score every lawn in input_path and write the results to output_path
+
+    Returns:
+        Number of rows written by this run
+    """
+    progress_path = output_path + ".progress"
+    run_options = {'input': os.path.abspath(input_path), 'format': fmt, 'schedule': schedule}
+    progress = _load_progress(progress_path) if resume else None
+    if progress is not None:
+        if any(progress.get(name) != value for name, value in run_options.items()):
+            raise InputError(f"{progress_path} belongs to a run with another input, format or --schedule")
+        if progress.get('complete'):
+            logger.info("%s is already complete (%d rows)", output_path, progress['rows'])
+            return 0
+        logger.info("Resuming after %d rows", progress['rows'])
+    elif resume:
+        logger.info("No progress recorded for %s; starting from the beginning", output_path)
+
+    done = progress['rows'] if progress else 0
+    sink = _sink(output_path, fmt, schedule)
+    sink.open(progress['position'] if progress else None)
+    _save_progress(progress_path, {**run_options, 'rows': done, 'position': sink.flush()})
+
+    workers = workers or os.cpu_count() or 1
+    # One date and hour for the whole run, so every chunk is scored alike
+    now = datetime.datetime.now()
+    lawns = itertools.islice(read_lawns(input_path), done, None)
+    loop = asyncio.get_running_loop()
+    pending = deque()
+    written = 0
+    started = time.perf_counter()
+
+    async def write_oldest():
+        nonlocal done, written
+        count, data = await pending.popleft()
+        sink.write(data)
+        done += count
+        written += count
+        _save_progress(progress_path, {**run_options, 'rows': done, 'position': sink.flush()})
+        elapsed = time.perf_counter() - started
+        logger.info("%d rows done (%.0f rows/s)", done, written / elapsed if elapsed else 0)
+
+    try:
+        with ProcessPoolExecutor(workers) as pool, priority(BULK):
+            async with WeatherClient(max_wait=None) as client:
+                if client.api_key == "demo_key":
+                    logger.warning("OPENWEATHER_API_KEY is not set; every row is scored against demo weather")
+                for chunk in _chunks(lawns, chunk_size):
+                    keys = lawn_tile_keys(chunk)
+                    numbers = {}
+                    tile_of = [numbers.setdefault(key, len(numbers)) for key in keys]
+                    tiles = list(numbers)
+                    try:
+                        fetched = await _fetch(client, tiles)
+                    except FetchError:
+                        # Keep the chunks already fetched, so --resume starts at the failed one
+                        while pending:
+                            await write_oldest()
+                        raise
+                    # Scoring runs in the pool while the next chunk's tiles are fetched
+                    pending.append(loop.run_in_executor(
+                        pool, score_chunk, chunk, keys, tile_of,
+                        [fetched[tile][0] for tile in tiles], [fetched[tile][1] for tile in tiles],
+                        fmt, schedule, now.date(), now.hour,
+                    ))
+                    if len(pending) >= 2 * workers:
+                        await write_oldest()
+                while pending:
+                    await write_oldest()
+        _save_progress(progress_path, {**run_options, 'rows': done, 'position': sink.flush(), 'complete': True})
+    finally:
+        for future in pending:
+            future.cancel()
+        sink.close()
+    return written
+
+
+def _output_format(path, fmt):
+    if fmt:
+        return fmt
+    extension = os.path.splitext(path)[1].lstrip(".").lower()
+    if extension not in FORMATS:
+        raise InputError(f"Cannot tell the output format of {path}; pass --format")
+    return extension
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="TurboLawn batch runner: recommendations for a file of lawns")
+    parser.add_argument("input", help="CSV (with a header row) or JSONL file of lawns")
+    parser.add_argument("-o", "--output", required=True, help="Output .csv or .jsonl file, or .parquet directory")
+    parser.add_argument("--format", choices=FORMATS, help="Output format (defaults to the output's extension)")
+    parser.add_argument("--schedule", action="store_true", help="Also plan watering and mowing days")
+    parser.add_argument("--workers", type=int, help="Worker processes (defaults to the number of CPUs)")
+    parser.add_argument("--chunk-size", type=int, default=CHUNK_SIZE, help="Lawns per chunk")
+    parser.add_argument("--resume", action="store_true", help="Continue an interrupted run of the same output")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    started = time.perf_counter()
+    try:
+        fmt = _output_format(args.output, args.format)
+        rows = asyncio.run(run(args.input, args.output, fmt, args.schedule, args.workers,
+                               args.chunk_size, args.resume))
+    except (InputError, ImportError, OSError, ValueError) as e:
+        parser.exit(1, f"error: {e}\n")
+    except FetchError as e:
+        parser.exit(1, f"error: {e}\nRerun with --resume to retry from the failed chunk\n")
+    except KeyboardInterrupt:
+        parser.exit(130, "Interrupted; rerun with --resume to continue\n")
+    logger.info("Wrote %d rows in %.1f s", rows, time.perf_counter() - started)
+
+
+if __name__ == "__main__":
+    main()
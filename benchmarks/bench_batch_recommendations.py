@@ -0,0 +1,105 @@
+"""
+Compare the scalar recommendation functions against the vectorized batch engine
+
+Usage:
+    python benchmarks/bench_batch_recommendations.py [lawns]
+"""
+import datetime
+import os
+import random
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.batch import LAWN_TYPES, forecast_matrix, get_recommendations, lawn_type_codes
+from utils.recommendations import get_watering_recommendation, get_mowing_recommendation
+
+CONDITIONS = ['Clear', 'Clouds', 'Partly Cloudy', 'Rain', 'Light Rain', 'Drizzle', 'Thunderstorm']
+
+
+def make_lawns(count, days=5, seed=42):
+    """
+    Generate random current weather, forecasts and lawn types
+    """
+    rng = random.Random(seed)
+    today = datetime.datetime.now().date()
+    weather, forecasts, lawn_types = [], [], []
+
+    for _ in range(count):
+        weather.append({
+            'temp': rng.randint(30, 110),
+            'humidity': rng.randint(10, 100),
+            'conditions': rng.choice(CONDITIONS),
+            'rainfall_24h': rng.choice([0, 0, 0, round(rng.uniform(0, 1), 2)]),
+        })
+        forecasts.append([{
+            'date': today + datetime.timedelta(days=i),
+            'temp_high': rng.randint(40, 105),
+            'conditions': rng.choice(CONDITIONS),
+            'rainfall': rng.choice([0, 0, round(rng.uniform(0, 0.6), 2)]),
+        } for i in range(1, days + 1)])
+        lawn_types.append(rng.choice(LAWN_TYPES))
+
+    return weather, forecasts, lawn_types
+
+
+def run_scalar(weather, forecasts, lawn_types):
+    return [
+        (get_watering_recommendation(w, f, t), get_mowing_recommendation(w, f, t))
+        for w, f, t in zip(weather, forecasts, lawn_types)
+    ]
+
+
+def pack(weather, forecasts, lawn_types):
+    lawns = {
+        'temp': np.array([w['temp'] for w in weather]),
+        'humidity': np.array([w['humidity'] for w in weather]),
+        'rainfall_24h': np.array([w['rainfall_24h'] for w in weather]),
+        'conditions': np.array([w['conditions'] for w in weather]),
+        'lawn_type': lawn_type_codes(lawn_types),
+    }
+    return lawns, forecast_matrix(forecasts)
+
+
+def check_same(scalar, batch):
+    """
+    Assert that both paths produced the same answers
+    """
+    for i, (watering, mowing) in enumerate(scalar):
+        assert watering['should_water'] == batch['should_water'][i], i
+        assert np.datetime64(watering['next_water_date']) == batch['next_water_date'][i], i
+        if watering['should_water']:
+            assert watering['water_amount'] == batch['water_amount'][i], i
+        assert mowing['should_mow'] == batch['should_mow'][i], i
+        assert np.datetime64(mowing['next_mow_date']) == batch['next_mow_date'][i], i
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    weather, forecasts, lawn_types = make_lawns(count)
+
+    # Batch jobs load columns straight from a DataFrame, so packing is timed separately
+    (lawns, forecast), pack_time = timed(pack, weather, forecasts, lawn_types)
+
+    scalar, scalar_time = timed(run_scalar, weather, forecasts, lawn_types)
+    batch, batch_time = timed(get_recommendations, lawns, forecast)
+    check_same(scalar, batch)
+
+    print(f"lawns:    {count}")
+    print(f"scalar:   {scalar_time * 1000:.1f} ms")
+    print(f"batch:    {batch_time * 1000:.1f} ms")
+    print(f"packing:  {pack_time * 1000:.1f} ms")
+    print(f"speedup:  {scalar_time / batch_time:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
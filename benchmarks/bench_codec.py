@@ -0,0 +1,60 @@
+"""
+Disk-tier serialization: utils.codec vs pickle
+
+Times encoding and decoding one location's current weather and 5-day
+forecast (what a disk-cache hit costs on top of the SQLite read), the
+encoded sizes, and the bulk path: packing many cached forecasts into a
+ForecastBlock from pickles vs straight from the binary payloads.
+
+Usage:
+    python benchmarks/bench_codec.py [locations]
+"""
+import os
+import pickle
+import random
+import sys
+import timeit
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import synthetic
+from bench_memory import weather_payload
+from utils import codec
+from utils.batch import ForecastBlock
+from utils.weather import parse_forecast, parse_weather
+
+
+def per_call_us(func, number=20000):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(0)
+    observation = parse_weather(weather_payload(rng))
+    forecast = parse_forecast(synthetic.forecast_payloads(1)[0])[:5]
+
+    print(f"{'payload':<14} {'format':<8} {'bytes':>6} {'dumps':>9} {'loads':>9}")
+    for name, value in (("observation", observation), ("forecast", forecast)):
+        for label, serializer in (("pickle", pickle), ("codec", codec)):
+            data = serializer.dumps(value)
+            assert serializer.loads(data) == value
+            print(f"{name:<14} {label:<8} {len(data):>6} "
+                  f"{per_call_us(lambda: serializer.dumps(value)):>6.1f} us "
+                  f"{per_call_us(lambda: serializer.loads(data)):>6.1f} us")
+
+    forecasts = [parse_forecast(payload)[:5] for payload in synthetic.forecast_payloads(count)]
+    pickled = [pickle.dumps(days) for days in forecasts]
+    encoded = [codec.dumps(days) for days in forecasts]
+    from_pickles = min(timeit.repeat(
+        lambda: ForecastBlock.from_forecasts([pickle.loads(data) for data in pickled]), number=1, repeat=3))
+    from_encoded = min(timeit.repeat(lambda: ForecastBlock.from_encoded(encoded), number=1, repeat=3))
+    print(f"\nForecastBlock from {count} cached forecasts:")
+    print(f"  pickle.loads + from_forecasts  {from_pickles * 1000:8.1f} ms")
+    print(f"  from_encoded                   {from_encoded * 1000:8.1f} ms  ({from_pickles / from_encoded:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
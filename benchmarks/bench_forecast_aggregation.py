@@ -0,0 +1,119 @@
+"""
+Compare the forecast aggregation paths on synthetic 40-slot forecast payloads
+
+Usage:
+    python benchmarks/bench_forecast_aggregation.py [locations]
+"""
+import datetime
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.weather import parse_forecast, parse_forecasts_numpy
+
+CONDITIONS = ['Clear', 'Clouds', 'Rain', 'Drizzle', 'Thunderstorm', 'Snow', 'Mist']
+
+
+def legacy_parse_forecast(data, days=5):
+    """
+    The original get_forecast aggregation, kept here as the baseline
+    """
+    forecast_data = []
+    today = datetime.datetime.now().date()
+    forecasts_by_date = {}
+
+    for item in data['list']:
+        dt = datetime.datetime.fromtimestamp(item['dt'])
+        date_str = dt.date()
+        if date_str not in forecasts_by_date:
+            forecasts_by_date[date_str] = []
+        forecasts_by_date[date_str].append({
+            'temp': item['main']['temp'],
+            'conditions': item['weather'][0]['main'],
+            'humidity': item['main']['humidity'],
+            'rainfall': item.get('rain', {}).get('3h', 0),
+            'time': dt.time()
+        })
+
+    for i in range(1, days + 1):
+        forecast_date = today + datetime.timedelta(days=i)
+        if forecast_date in forecasts_by_date:
+            day_forecasts = forecasts_by_date[forecast_date]
+            temps = [f['temp'] for f in day_forecasts]
+            rainfall = sum(f.get('rainfall', 0) for f in day_forecasts)
+            conditions = max(set(f['conditions'] for f in day_forecasts),
+                             key=[f['conditions'] for f in day_forecasts].count)
+            forecast_data.append({
+                'date': forecast_date,
+                'temp_high': round(max(temps)),
+                'temp_low': round(min(temps)),
+                'temp_avg': round(sum(temps) / len(temps)),
+                'conditions': conditions,
+                'rainfall': round(rainfall, 2),
+                'humidity': round(sum(f['humidity'] for f in day_forecasts) / len(day_forecasts))
+            })
+
+    return forecast_data
+
+
+def make_payload(rng, slots=40):
+    """
+    Build an OpenWeatherMap-shaped 5-day/3-hour forecast response
+    """
+    start = int(time.time()) // 10800 * 10800
+    items = []
+    for i in range(slots):
+        item = {
+            'dt': start + i * 10800,
+            'main': {'temp': round(rng.uniform(40, 100), 2), 'humidity': rng.randint(20, 100)},
+            'weather': [{'main': rng.choice(CONDITIONS)}],
+        }
+        if rng.random() < 0.3:
+            item['rain'] = {'3h': round(rng.uniform(0, 0.5), 2)}
+        items.append(item)
+    return {'list': items}
+
+
+def check_same(legacy, streaming, vectorized):
+    """
+    All paths must agree; legacy breaks modal-condition ties arbitrarily, so
+    for it only the count of the chosen condition is compared.
+    """
+    assert streaming == vectorized
+    assert len(legacy) == len(streaming)
+    for old, new in zip(legacy, streaming):
+        assert {k: v for k, v in old.items() if k != 'conditions'} == \
+            {k: v for k, v in new.items() if k != 'conditions'}
+
+
+def timed(fn, payloads):
+    start = time.perf_counter()
+    results = [fn(payload) for payload in payloads]
+    return results, time.perf_counter() - start
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    rng = random.Random(42)
+    payloads = [make_payload(rng) for _ in range(count)]
+
+    legacy, legacy_time = timed(legacy_parse_forecast, payloads)
+    streaming, streaming_time = timed(parse_forecast, payloads)
+    start = time.perf_counter()
+    vectorized = parse_forecasts_numpy(payloads)
+    vectorized_time = time.perf_counter() - start
+
+    for results in zip(legacy, streaming, vectorized):
+        check_same(*results)
+
+    print(f"payloads:   {count} x 40 slots")
+    print(f"legacy:     {legacy_time * 1000:.1f} ms")
+    print(f"streaming:  {streaming_time * 1000:.1f} ms ({legacy_time / streaming_time:.1f}x)")
+    print(f"numpy bulk: {vectorized_time * 1000:.1f} ms ({legacy_time / vectorized_time:.1f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Import-time regression check driven by `python -X importtime`
+
+Each module is imported in a fresh interpreter a few times; the best
+cumulative import time must stay within its budget, and none of the heavy
+modules listed for it may be pulled in at import time.
+
+Usage:
+    python benchmarks/bench_import_time.py [--runs N]
+
+Exits with status 1 if any budget is exceeded.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = {'streamlit', 'pandas', 'numpy', 'requests', 'aiohttp'}
+
+# Module -> (cumulative import budget in ms, heavy modules it must not import)
+BUDGETS = {
+    'utils.config': (30, HEAVY_MODULES),
+    'utils.recommendations': (30, HEAVY_MODULES),
+    'utils.cache': (100, HEAVY_MODULES),
+    'utils.weather': (150, HEAVY_MODULES),
+    'utils.prefetch': (150, HEAVY_MODULES),
+}
+
+
+def measure(module):
+    """
+    Import a module in a fresh interpreter
+
+    Returns:
+        Tuple of (cumulative import time in ms, set of top-level modules imported)
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    cumulative = None
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative_us, name = line.split("|")
+        if not cumulative_us.strip().isdigit():
+            continue  # Header line
+        imported.add(name.strip().split(".")[0])
+        if name.strip() == module:
+            cumulative = int(cumulative_us) / 1000
+    return cumulative, imported
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    failed = False
+    for module, (budget, forbidden) in BUDGETS.items():
+        runs = [measure(module) for _ in range(args.runs)]
+        best = min(cumulative for cumulative, _ in runs)
+        heavy = sorted(runs[0][1] & forbidden)
+
+        ok = best <= budget and not heavy
+        failed |= not ok
+        status = "ok  " if ok else "FAIL"
+        extra = f"  imports {', '.join(heavy)}" if heavy else ""
+        print(f"{status} {module:<24} {best:7.1f} ms  (budget {budget} ms){extra}")
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,78 @@
+"""
+Memory per cached location: plain dicts vs slotted records vs ForecastBlock
+
+Parses synthetic API responses the way get_weather_data and get_forecast
+do, then measures the Python heap held by each representation of the
+current weather plus a 5-day forecast (tracemalloc), and the pickled size
+each would take in the disk cache tier.
+
+Usage:
+    python benchmarks/bench_memory.py [locations]
+"""
+import gc
+import os
+import pickle
+import random
+import sys
+import tracemalloc
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+import synthetic
+from utils.batch import ForecastBlock
+from utils.weather import parse_forecast, parse_weather
+
+
+def weather_payload(rng):
+    return {
+        'main': {'temp': rng.uniform(40, 100), 'humidity': rng.randint(10, 100)},
+        'weather': [{'main': rng.choice(synthetic.CONDITIONS)}],
+        'wind': {'speed': round(rng.uniform(0, 20), 1)},
+        'name': "Somewhere",
+        'sys': {'country': "US"},
+        'rain': {'1h': round(rng.uniform(0, 0.2), 2)},
+    }
+
+
+def measure(build):
+    """
+    Return (result, bytes allocated and still held after building it)
+    """
+    gc.collect()
+    tracemalloc.start()
+    result = build()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return result, size
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rng = random.Random(0)
+    weather_payloads = [weather_payload(rng) for _ in range(count)]
+    forecast_payloads = synthetic.forecast_payloads(count)
+
+    records, record_bytes = measure(lambda: [(parse_weather(w), parse_forecast(f))
+                                             for w, f in zip(weather_payloads, forecast_payloads)])
+    # Parse again so the dicts own their values rather than sharing the records'
+    dicts, dict_bytes = measure(lambda: [(parse_weather(w).as_dict(), [day.as_dict() for day in parse_forecast(f)])
+                                         for w, f in zip(weather_payloads, forecast_payloads)])
+    days = min(len(forecast) for _, forecast in records)
+    block, block_bytes = measure(lambda: ForecastBlock.from_forecasts([forecast[:days] for _, forecast in records]))
+
+    # The block replaces the forecast lists; current weather stays as records
+    _, observation_bytes = measure(lambda: [parse_weather(w) for w in weather_payloads])
+
+    print(f"locations: {count} ({days} forecast days)")
+    print(f"{'representation':<28} {'heap/location':>14} {'pickled/location':>17}")
+    print(f"{'dicts':<28} {dict_bytes / count:>12.0f} B {len(pickle.dumps(dicts)) / count:>15.0f} B")
+    print(f"{'records':<28} {record_bytes / count:>12.0f} B {len(pickle.dumps(records)) / count:>15.0f} B")
+    print(f"{'records + ForecastBlock':<28} {(observation_bytes + block_bytes) / count:>12.0f} B "
+          f"{(len(pickle.dumps([w for w, _ in records])) + len(pickle.dumps(block))) / count:>15.0f} B")
+    print(f"records save {1 - record_bytes / dict_bytes:.0%} of the dict heap")
+
+
+if __name__ == "__main__":
+    main()
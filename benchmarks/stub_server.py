@@ -0,0 +1,209 @@
+"""
+Local stand-in for the OpenWeatherMap API that replays recorded responses
+
+Responses come from the JSON fixtures in benchmarks/fixtures
+(weather-<place>.json and forecast-<place>.json). Timestamps are shifted so
+the first forecast slot falls on the current 3-hour boundary, so parsed
+forecasts always cover the coming days. Free-text queries pick the fixture
+whose place name they start with; anything else (coordinates, synthetic
+locations) maps to a fixture by hash, so every location gets a stable answer.
+
+Usage:
+    python benchmarks/stub_server.py [--port 8765] [--latency 0.05]
+
+then point the app at it with OPENWEATHER_BASE_URL=http://127.0.0.1:8765
+and any OPENWEATHER_API_KEY other than "demo_key".
+"""
+import argparse
+import copy
+import datetime
+import glob
+import json
+import os
+import threading
+import time
+import zlib
+from collections import Counter
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def load_fixtures(fixtures_dir=FIXTURES_DIR):
+    """
+    Return {endpoint: {place: payload}} for every fixture file
+    """
+    fixtures = {'weather': {}, 'forecast': {}}
+    for path in sorted(glob.glob(os.path.join(fixtures_dir, "*.json"))):
+        endpoint, _, place = os.path.basename(path)[:-len(".json")].partition("-")
+        if endpoint in fixtures:
+            with open(path, encoding="utf-8") as f:
+                fixtures[endpoint][place] = json.load(f)
+    return fixtures
+
+
+def rebase(endpoint, payload, now=None):
+    """
+    Copy a recorded payload with its timestamps moved to the present
+    """
+    now = int(now or time.time())
+    payload = copy.deepcopy(payload)
+    if endpoint == 'forecast':
+        slots = payload['list']
+        shift = now - now % 10800 - slots[0]['dt']
+        for slot in slots:
+            slot['dt'] += shift
+            slot['dt_txt'] = datetime.datetime.fromtimestamp(slot['dt'], datetime.timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+    else:
+        payload['dt'] = now
+    return payload
+
+
+class FixtureServer:
+    """
+    Threaded HTTP server replaying fixtures, with optional artificial latency
+
+    Counts requests per endpoint in `requests` so benchmarks can check how
+    many upstream calls a code path made, the client connections seen in
+    `connections` and the most requests served at once in `max_in_flight`.
+    With limit_per_minute set, requests
+    beyond it within a sliding minute get a 429 with Retry-After, like the
+    real API's quota.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, fixtures_dir=FIXTURES_DIR, limit_per_minute=None):
+        self.latency = latency
+        self.limit_per_minute = limit_per_minute
+        self._window = []
+        self.fixtures = load_fixtures(fixtures_dir)
+        self.requests = Counter()
+        self.connections = set()
+        self.max_in_flight = 0
+        self._in_flight = 0
+        self._lock = threading.Lock()
+        self._httpd = ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def respond(self, endpoint, params):
+        """
+        Pick and rebase the fixture for one request; returns (status, payload)
+        """
+        places = self.fixtures.get(endpoint)
+        if not places:
+            return 404, {'cod': '404', 'message': "not found"}
+        query = params.get('q') or f"{params.get('lat')},{params.get('lon')}"
+        slug = query.casefold().replace(",", " ").split()
+        for place in places:
+            if slug and place.split("-")[0] == slug[0]:
+                break
+        else:
+            names = sorted(places)
+            place = names[zlib.crc32(query.encode("utf-8")) % len(names)]
+        return 200, rebase(endpoint, places[place])
+
+    def _throttle(self):
+        """
+        Record a request against the per-minute limit; return Retry-After seconds if over it
+        """
+        if not self.limit_per_minute:
+            return 0
+        now = time.monotonic()
+        self._window = [t for t in self._window if t > now - 60]
+        if len(self._window) >= self.limit_per_minute:
+            self.requests['429'] += 1
+            return max(1, int(self._window[0] + 60 - now + 1))
+        self._window.append(now)
+        return 0
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes; without this, delayed ACKs
+            # stall every response on a kept-alive connection by ~40 ms
+            disable_nagle_algorithm = True
+
+            def do_GET(self):
+                url = urlsplit(self.path)
+                endpoint = url.path.rstrip("/").rsplit("/", 1)[-1]
+                params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+                with server._lock:
+                    server.requests[endpoint] += 1
+                    server.connections.add(self.client_address)
+                    server._in_flight += 1
+                    server.max_in_flight = max(server.max_in_flight, server._in_flight)
+                    retry_after = server._throttle()
+                try:
+                    self._respond(endpoint, params, retry_after)
+                finally:
+                    with server._lock:
+                        server._in_flight -= 1
+
+            def _respond(self, endpoint, params, retry_after):
+                if server.latency:
+                    time.sleep(server.latency)
+
+                if retry_after:
+                    status, payload = 429, {'cod': 429, 'message': "rate limit exceeded"}
+                else:
+                    status, payload = server.respond(endpoint, params)
+                body = json.dumps(payload).encode("utf-8")
+                self.send_response(status)
+                if retry_after:
+                    self.send_header('Retry-After', str(retry_after))
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="owm-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._thread is not None:
+            self._httpd.shutdown()
+            self._thread = None
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded OpenWeatherMap responses")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds to delay each response")
+    parser.add_argument("--limit-per-minute", type=int, help="Answer 429 beyond this many requests a minute")
+    args = parser.parse_args()
+
+    server = FixtureServer(args.host, args.port, args.latency, limit_per_minute=args.limit_per_minute)
+    print(f"Replaying {sum(len(places) for places in server.fixtures.values())} fixtures on {server.base_url}")
+    try:
+        server._httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server._httpd.server_close()
+
+
+if __name__ == "__main__":
+    main()
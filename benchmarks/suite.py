@@ -0,0 +1,322 @@
+"""
+Benchmark suite for the hot paths, with saved baselines for regression checks
+
+Covers forecast aggregation, both recommendation functions (scalar and
+batch), the schedule planner, cache lookups, and end-to-end Dashboard data
+assembly against the fixture-replaying stub server (see stub_server.py).
+Each benchmark runs at one or more sizes; synthetic inputs come from
+synthetic.py.
+
+Usage:
+    python benchmarks/suite.py                      # run everything up to 100k items
+    python benchmarks/suite.py --max-size 1000000   # include the 1M-location runs
+    python benchmarks/suite.py -k recommendations   # only matching benchmarks
+    python benchmarks/suite.py --save baseline.json
+    python benchmarks/suite.py --compare baseline.json [--threshold 1.25]
+
+With --compare, exits with status 1 if any benchmark's median got slower
+than the baseline by more than the threshold ratio.
+
+New engines can be compared against the current code by registering them
+with @benchmark under the same group as the existing implementation.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from stub_server import FixtureServer, load_fixtures, rebase
+
+# The weather modules read their settings at import time, so point them at the
+# stub server (bound to a free port now, started on first use) before importing them
+STUB = FixtureServer()
+_cache_dir = tempfile.mkdtemp(prefix="turbolawn-bench-")
+os.environ.update({
+    'OPENWEATHER_API_KEY': "benchmark",
+    'OPENWEATHER_BASE_URL': STUB.base_url,
+    'TURBOLAWN_CACHE_DB': os.path.join(_cache_dir, "cache.sqlite3"),
+    'TURBOLAWN_HISTORY_DIR': "",
+    'TURBOLAWN_METRICS': "off",
+})
+
+import numpy as np
+
+import synthetic
+from utils import batch, planner, recommendations
+from utils.cache import LRUCache, SQLiteCache, TieredCache, cached, get_cache
+from utils.geocode import canonical_location
+from utils.memo import get_memo
+from utils.tiles import TileIndex
+from utils.weather import parse_forecast, parse_forecasts_numpy
+
+BENCHMARKS = []
+
+
+def benchmark(group, name, sizes=(1,)):
+    """
+    Register a benchmark
+
+    The decorated function takes a size, does its setup, and returns a
+    zero-argument callable that performs the timed work on `size` items.
+    """
+    def decorator(setup):
+        BENCHMARKS.append((group, name, sizes, setup))
+        return setup
+    return decorator
+
+
+# Forecast aggregation
+
+@benchmark("forecast", "parse_forecast.fixtures", sizes=(len(load_fixtures()['forecast']),))
+def forecast_fixture(size):
+    payloads = [rebase('forecast', payload) for payload in load_fixtures()['forecast'].values()]
+    return lambda: [parse_forecast(payload) for payload in payloads]
+
+
+@benchmark("forecast", "parse_forecast", sizes=(1_000, 10_000))
+def forecast_streaming(size):
+    payloads = synthetic.forecast_payloads(size)
+    return lambda: [parse_forecast(payload) for payload in payloads]
+
+
+@benchmark("forecast", "parse_forecasts_numpy", sizes=(1_000, 10_000))
+def forecast_numpy(size):
+    payloads = synthetic.forecast_payloads(size)
+    return lambda: parse_forecasts_numpy(payloads)
+
+
+# Recommendations
+
+@benchmark("recommendations", "watering.scalar", sizes=(1_000, 10_000, 100_000))
+def watering_scalar(size):
+    lawns = synthetic.scalar_inputs(size)
+    return lambda: [recommendations.get_watering_recommendation(*lawn) for lawn in lawns]
+
+
+@benchmark("recommendations", "mowing.scalar", sizes=(1_000, 10_000, 100_000))
+def mowing_scalar(size):
+    lawns = synthetic.scalar_inputs(size)
+    return lambda: [recommendations.get_mowing_recommendation(*lawn) for lawn in lawns]
+
+
+@benchmark("recommendations", "memoized.hit", sizes=(1_000,))
+def memoized_hit(size):
+    # Snapshots the weather cache stored are fingerprinted on the way in
+    lawns = synthetic.scalar_inputs(size)
+    memo = get_memo()
+    for weather_data, forecast_data, _ in lawns:
+        memo.remember(weather_data)
+        memo.remember(forecast_data)
+
+    def run():
+        for lawn in lawns:
+            recommendations.get_watering_recommendation(*lawn)
+            recommendations.get_mowing_recommendation(*lawn)
+    return run
+
+
+@benchmark("recommendations", "watering.batch", sizes=(10_000, 100_000, 1_000_000))
+def watering_batch(size):
+    lawns, forecast = synthetic.lawn_columns(size), synthetic.forecast_arrays(size)
+    return lambda: batch.get_watering_recommendations(lawns, forecast)
+
+
+@benchmark("recommendations", "mowing.batch", sizes=(10_000, 100_000, 1_000_000))
+def mowing_batch(size):
+    lawns, forecast = synthetic.lawn_columns(size), synthetic.forecast_arrays(size)
+    return lambda: batch.get_mowing_recommendations(lawns, forecast)
+
+
+@benchmark("recommendations", "pack.forecast_matrix", sizes=(10_000, 100_000))
+def pack_forecasts(size):
+    forecasts = [forecast for _, forecast, _ in synthetic.scalar_inputs(size)]
+    return lambda: batch.forecast_matrix(forecasts)
+
+
+@benchmark("recommendations", "schedule.distinct", sizes=(1_000, 10_000))
+def schedule_distinct(size):
+    lawns, forecast = synthetic.lawn_columns(size), synthetic.forecast_arrays(size)
+    return lambda: planner.plan_schedules(lawns, forecast)
+
+
+@benchmark("recommendations", "schedule.shared_tiles", sizes=(10_000, 100_000))
+def schedule_shared(size):
+    # Every lawn shares its weather with ~100 others, as in a dense service area
+    tile_of = np.random.default_rng(0).integers(0, max(1, size // 100), size)
+    lawns = {name: values[tile_of] for name, values in synthetic.lawn_columns(size).items()}
+    lawns['lawn_type'] = synthetic.lawn_columns(size, seed=1)['lawn_type']
+    forecast = {name: values[tile_of] for name, values in synthetic.forecast_arrays(size).items()}
+    return lambda: planner.plan_schedules(lawns, forecast)
+
+
+# Cache lookups
+
+def _filled_tier(size, disk=None):
+    tier = TieredCache(LRUCache(maxsize=size), disk)
+    tier.configure("bench", ttl=3600)
+    keys = [f"bench:{location!r}" for location in synthetic.locations(size)]
+    for key in keys:
+        tier.set("bench", key, {'temp': 70})
+    return tier, keys
+
+
+@benchmark("cache", "lookup.memory", sizes=(10_000, 100_000))
+def cache_memory(size):
+    tier, keys = _filled_tier(size)
+    return lambda: [tier.lookup("bench", key) for key in keys]
+
+
+@benchmark("cache", "lookup.disk", sizes=(10_000,))
+def cache_disk(size):
+    disk = SQLiteCache(os.path.join(tempfile.mkdtemp(prefix="turbolawn-bench-"), "cache.sqlite3"))
+    _, keys = _filled_tier(size, disk)
+    return lambda: [disk.get(key) for key in keys]
+
+
+@benchmark("cache", "cached_wrapper.hit", sizes=(10_000,))
+def cache_wrapper(size):
+    tier = TieredCache()
+
+    @cached("bench", ttl=3600, cache=tier)
+    def lookup(location, days=5):
+        return location
+
+    locations = synthetic.locations(size)
+    for location in locations:
+        lookup(location)
+    return lambda: [lookup(location) for location in locations]
+
+
+# Spatial bucketing
+
+@benchmark("tiles", "TileIndex.build", sizes=(100_000, 1_000_000))
+def tile_index(size):
+    rng = np.random.default_rng(0)
+    lats, lons = rng.uniform(*synthetic.LAT_RANGE, size), rng.uniform(*synthetic.LON_RANGE, size)
+    return lambda: TileIndex(lats, lons)
+
+
+@benchmark("tiles", "canonical_location.coordinates", sizes=(10_000,))
+def tile_snap(size):
+    places = synthetic.locations(size)
+    return lambda: [canonical_location(location) for location in places]
+
+
+# End-to-end Dashboard data assembly (fetch, recommendations, DataFrame)
+
+def _dashboard(location, lawn_type="Cool Season Grass"):
+    import pandas as pd
+    from utils.async_weather import get_client
+
+    weather_data, forecast_data = get_client().fetch(location)
+    recommendations.get_watering_recommendation(weather_data, forecast_data, lawn_type)
+    recommendations.get_mowing_recommendation(weather_data, forecast_data, lawn_type)
+    return pd.DataFrame(forecast_data)[['date', 'temp_high', 'temp_low']].set_index('date')
+
+
+@benchmark("dashboard", "render_data.cold", sizes=(10,))
+def dashboard_cold(size):
+    _ensure_stub()
+    places = synthetic.locations(size)
+
+    def run():
+        get_cache().clear()
+        return [_dashboard(location) for location in places]
+    return run
+
+
+@benchmark("dashboard", "render_data.warm", sizes=(100,))
+def dashboard_warm(size):
+    _ensure_stub()
+    places = synthetic.locations(size)
+    for location in places:
+        _dashboard(location)
+    return lambda: [_dashboard(location) for location in places]
+
+
+def _ensure_stub():
+    if STUB._thread is None:
+        STUB.start()
+
+
+def measure(func, repeat, min_time):
+    """
+    Time func repeatedly after one warm-up call
+
+    Runs at least `repeat` times and until `min_time` seconds have passed.
+
+    Returns:
+        List of per-call durations in seconds
+    """
+    func()
+    samples = []
+    deadline = time.perf_counter() + min_time
+    while len(samples) < repeat or time.perf_counter() < deadline:
+        start = time.perf_counter()
+        func()
+        samples.append(time.perf_counter() - start)
+        if len(samples) >= 100:
+            break
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("-k", dest="pattern", help="Only run benchmarks whose group.name contains this")
+    parser.add_argument("--max-size", type=int, default=100_000)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--min-time", type=float, default=0.5, help="Minimum seconds spent timing each benchmark")
+    parser.add_argument("--save", help="Write median timings to this JSON file")
+    parser.add_argument("--compare", help="Compare median timings against this JSON file")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Slowdown ratio that counts as a regression")
+    args = parser.parse_args()
+
+    baseline = {}
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)['results']
+
+    results = {}
+    regressions = []
+    print(f"{'benchmark':<44} {'size':>9} {'median':>11} {'min':>11} {'per item':>11}")
+    for group, name, sizes, setup in BENCHMARKS:
+        full_name = f"{group}.{name}"
+        if args.pattern and args.pattern not in full_name:
+            continue
+        for size in sizes:
+            if size > args.max_size:
+                continue
+            samples = measure(setup(size), args.repeat, args.min_time)
+            median = statistics.median(samples)
+            key = f"{full_name}[{size}]"
+            results[key] = median
+
+            line = (f"{full_name:<44} {size:>9} {median * 1000:>9.2f}ms {min(samples) * 1000:>9.2f}ms "
+                    f"{median / size * 1e6:>9.3f}us")
+            if key in baseline:
+                ratio = median / baseline[key]
+                line += f"  {ratio:5.2f}x"
+                if ratio > args.threshold:
+                    regressions.append(key)
+                    line += "  REGRESSION"
+            print(line, flush=True)
+
+    if args.save:
+        with open(args.save, "w", encoding="utf-8") as f:
+            json.dump({'python': sys.version.split()[0], 'results': results}, f, indent=2, sort_keys=True)
+    STUB.stop()
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) over {args.threshold}x: {', '.join(regressions)}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
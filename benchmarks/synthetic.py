@@ -0,0 +1,120 @@
+"""
+Synthetic inputs for benchmarks, from a handful of lawns up to millions
+
+Small-scale generators build the same dicts the app passes around
+(get_weather_data / get_forecast results) so scalar code paths can run on
+them. Large-scale generators build NumPy columns in the layout the batch
+engine takes (see utils.batch.forecast_matrix), so 1M locations fit in
+memory and generate in seconds.
+"""
+import datetime
+import random
+
+import numpy as np
+
+from utils.batch import LAWN_TYPES
+
+CONDITIONS = ['Clear', 'Clouds', 'Partly Cloudy', 'Rain', 'Light Rain', 'Drizzle', 'Thunderstorm']
+
+# Rough bounding box of the contiguous US, for synthetic coordinates
+LAT_RANGE = (25.0, 49.0)
+LON_RANGE = (-124.0, -67.0)
+
+
+def locations(count, seed=0):
+    """
+    Generate "lat,lon" location strings spread over the contiguous US
+    """
+    rng = np.random.default_rng(seed)
+    lats = rng.uniform(*LAT_RANGE, count)
+    lons = rng.uniform(*LON_RANGE, count)
+    return [f"{lat:.4f},{lon:.4f}" for lat, lon in zip(lats.tolist(), lons.tolist())]
+
+
+def forecast_payload(rng, start=None, slots=40):
+    """
+    Generate an OpenWeatherMap-shaped 5-day/3-hour forecast response
+
+    Args:
+        rng: random.Random instance
+        start: Unix time of the first slot (defaults to the current 3-hour boundary)
+        slots: Number of 3-hour slots
+    """
+    if start is None:
+        now = int(datetime.datetime.now().timestamp())
+        start = now - now % 10800
+    items = []
+    for i in range(slots):
+        item = {
+            'dt': start + i * 10800,
+            'main': {'temp': round(rng.uniform(40, 100), 2), 'humidity': rng.randint(10, 100)},
+            'weather': [{'main': rng.choice(CONDITIONS)}],
+        }
+        if rng.random() < 0.3:
+            item['rain'] = {'3h': round(rng.uniform(0, 0.4), 2)}
+        items.append(item)
+    return {'cod': '200', 'cnt': slots, 'list': items}
+
+
+def forecast_payloads(count, seed=0, slots=40):
+    rng = random.Random(seed)
+    now = int(datetime.datetime.now().timestamp())
+    start = now - now % 10800
+    return [forecast_payload(rng, start, slots) for _ in range(count)]
+
+
+def scalar_inputs(count, days=5, seed=0):
+    """
+    Generate per-lawn (weather_data, forecast_data, lawn_type) as the scalar functions take them
+    """
+    rng = random.Random(seed)
+    today = datetime.datetime.now().date()
+    lawns = []
+    for _ in range(count):
+        weather_data = {
+            'temp': rng.randint(30, 110),
+            'humidity': rng.randint(10, 100),
+            'conditions': rng.choice(CONDITIONS),
+            'rainfall_24h': rng.choice([0, 0, 0, round(rng.uniform(0, 1), 2)]),
+        }
+        forecast_data = [{
+            'date': today + datetime.timedelta(days=i),
+            'temp_high': rng.randint(40, 105),
+            'temp_low': rng.randint(30, 70),
+            'humidity': rng.randint(10, 100),
+            'conditions': rng.choice(CONDITIONS),
+            'rainfall': rng.choice([0, 0, round(rng.uniform(0, 0.6), 2)]),
+        } for i in range(1, days + 1)]
+        lawns.append((weather_data, forecast_data, rng.choice(LAWN_TYPES)))
+    return lawns
+
+
+def lawn_columns(count, seed=0):
+    """
+    Generate current-weather and lawn-type columns for the batch engine
+    """
+    rng = np.random.default_rng(seed)
+    return {
+        'temp': rng.integers(30, 111, count).astype(float),
+        'humidity': rng.integers(10, 101, count).astype(float),
+        'rainfall_24h': np.where(rng.random(count) < 0.25, rng.uniform(0, 1, count).round(2), 0.0),
+        'conditions': np.array(CONDITIONS)[rng.integers(0, len(CONDITIONS), count)],
+        'lawn_type': rng.integers(0, len(LAWN_TYPES), count).astype(np.int8),
+    }
+
+
+def forecast_arrays(count, days=5, seed=0, today=None):
+    """
+    Generate (count x days) forecast arrays in the forecast_matrix layout
+    """
+    rng = np.random.default_rng(seed + 1)
+    today = np.datetime64(today or datetime.datetime.now().date(), 'D')
+    shape = (count, days)
+    rain = rng.random(shape) < 3 / len(CONDITIONS)
+    return {
+        'date': np.broadcast_to(today + np.arange(1, days + 1), shape),
+        'rainfall': np.where(rng.random(shape) < 1 / 3, rng.uniform(0, 0.6, shape).round(2), 0.0),
+        'temp_high': rng.integers(40, 106, shape).astype(float),
+        'humidity': rng.integers(10, 101, shape).astype(float),
+        'rain': rain,
+    }
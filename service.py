@@ -0,0 +1,550 @@
+"""
+Headless HTTP/JSON service for weather, forecasts and lawn care recommendations
+
+Run locally with:
+    python service.py --port 8080
+
+Endpoints:
+    GET  /health
+    GET  /weather?location=Austin, TX
+    GET  /forecast?location=Austin, TX&days=5
+    GET  /places?q=aus&limit=5     (location autocomplete from the local gazetteer)
+    GET  /recommendations?location=Austin, TX&lawn_type=Warm Season Grass
+    POST /recommendations/batch   {"lawns": [{"location": ..., "lawn_type": ...}, ...]}
+                                  (lawns may give "lat" and "lon" instead of "location")
+    GET  /schedule?location=Austin, TX&lawn_type=Mixed Grass&moisture=0.6&days_since_mow=3
+    POST /schedule/batch          same body as /recommendations/batch; lawns may also
+                                  give "moisture" and "days_since_mow"
+    GET  /sync?location=Austin, TX&lawn_type=Mixed Grass&since=<version>
+                                  (If-None-Match: "<version>" gets 304 when nothing changed)
+    POST /sync                    {"lawns": [{"location": ..., "lawn_type": ..., "since": ...}, ...]}
+    GET  /metrics
+    GET  /metrics/prometheus   (requires TURBOLAWN_METRICS or --metrics)
+"""
+import argparse
+import datetime
+import json
+import logging
+import math
+import threading
+import time
+from collections import deque
+from collections.abc import Mapping
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+import numpy as np
+
+from utils import metrics
+from utils.async_weather import FETCH_ERRORS, WeatherAPIError, get_client
+from utils.batch import get_recommendations, pack_lawns
+from utils.geocode import place_label, suggest_locations
+from utils.memo import get_memo
+from utils.planner import plan_schedule, plan_schedules
+from utils.ratelimit import RateLimited, get_limiter
+from utils.recommendations import get_watering_recommendation, get_mowing_recommendation
+from utils.sync import build_snapshot, get_sync_store
+from utils.tiles import lawn_tile_keys
+from utils.weather import get_weather_data, get_forecast
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_LAWN_TYPE = "Cool Season Grass"
+
+# Largest batch accepted in one request
+MAX_BATCH_LAWNS = 10000
+
+
+class LatencyRecorder:
+    """
+    Keeps the most recent request latencies per route for p50/p99 reporting
+    """
+
+    def __init__(self, window=2048):
+        self.window = window
+        self._samples = {}
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds):
+        with self._lock:
+            self._samples.setdefault(route, deque(maxlen=self.window)).append(seconds)
+            self._counts[route] = self._counts.get(route, 0) + 1
+
+    def summary(self):
+        with self._lock:
+            snapshot = {route: sorted(samples) for route, samples in self._samples.items()}
+            counts = dict(self._counts)
+
+        return {
+            route: {
+                'count': counts[route],
+                'p50_ms': round(_percentile(samples, 0.50) * 1000, 3),
+                'p99_ms': round(_percentile(samples, 0.99) * 1000, 3),
+                'max_ms': round(samples[-1] * 1000, 3),
+            }
+            for route, samples in snapshot.items()
+        }
+
+
+def _percentile(sorted_samples, fraction):
+    index = min(len(sorted_samples) - 1, int(fraction * len(sorted_samples)))
+    return sorted_samples[index]
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class Response:
+    """
+    Route result with response headers; one with an etag is answered with
+    304 Not Modified when the request's If-None-Match names it
+    """
+
+    def __init__(self, payload, etag=None, headers=None):
+        self.payload = payload
+        self.etag = etag
+        self.headers = headers or {}
+
+
+def _etag_matches(if_none_match, etag):
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    return any(tag.strip().removeprefix("W/").strip('"') == etag for tag in if_none_match.split(","))
+
+
+def _json_default(value):
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    # NumPy scalars from the batch engine
+    if hasattr(value, 'item'):
+        return value.item()
+    # Weather records (utils.models)
+    if isinstance(value, Mapping):
+        return dict(value)
+    raise TypeError(f"Cannot serialize {type(value).__name__}")
+
+
+def _require(params, name):
+    value = params.get(name)
+    if not value:
+        raise HTTPError(400, f"Missing required parameter: {name}")
+    return value
+
+
+def _optional_number(params, name, cast=float):
+    value = params.get(name)
+    if value in (None, ""):
+        return None
+    try:
+        number = cast(value)
+    except (TypeError, ValueError):
+        raise HTTPError(400, f"{name} must be a number")
+    if not math.isfinite(number):
+        raise HTTPError(400, f"{name} must be a finite number")
+    return number
+
+
+def _check_coordinate(lawn, name, limit):
+    value = lawn[name]
+    # bool is an int subclass; NaN and inf would snap to an arbitrary edge tile
+    if (isinstance(value, bool) or not isinstance(value, (int, float))
+            or not math.isfinite(value) or not -limit <= value <= limit):
+        raise HTTPError(400, f"{name} must be a number from -{limit} to {limit}")
+
+
+def _check_strings(lawn, *names):
+    for name in names:
+        if lawn.get(name) is not None and not isinstance(lawn[name], str):
+            raise HTTPError(400, f"{name} must be a string")
+
+
+def _weather_error(error):
+    """
+    HTTP status and message for a weather fetch that failed
+    """
+    if isinstance(error, WeatherAPIError):
+        return 502, f"Weather API error: {error}"
+    return 503, f"Weather API unavailable: {str(error) or type(error).__name__}"
+
+
+def _fetch_weather(location):
+    """
+    Current weather and forecast for one lawn; never scores against mock data
+    """
+    try:
+        return get_client().fetch(location, fallback=False)
+    except FETCH_ERRORS as e:
+        raise HTTPError(*_weather_error(e))
+
+
+def weather_route(params):
+    return get_weather_data(_require(params, 'location'))
+
+
+def forecast_route(params):
+    try:
+        days = int(params.get('days', 5))
+    except ValueError:
+        raise HTTPError(400, "days must be an integer")
+    return get_forecast(_require(params, 'location'), days)
+
+
+def recommendations_route(params):
+    location = _require(params, 'location')
+    lawn_type = params.get('lawn_type', DEFAULT_LAWN_TYPE)
+    weather_data, forecast_data = _fetch_weather(location)
+    return {
+        'location': location,
+        'lawn_type': lawn_type,
+        'weather': weather_data,
+        'forecast': forecast_data,
+        'watering': get_watering_recommendation(weather_data, forecast_data, lawn_type),
+        'mowing': get_mowing_recommendation(weather_data, forecast_data, lawn_type),
+    }
+
+
+def places_route(params):
+    """
+    Location autocomplete: known places for a partial or misspelled name
+    """
+    text = _require(params, 'q')
+    limit = _optional_number(params, 'limit', int) or 5
+    return {'places': [
+        {'label': place_label(place), 'name': place.name, 'state': place.state, 'country': place.country,
+         'lat': place.lat, 'lon': place.lon}
+        for place in suggest_locations(text, max(1, min(limit, 20)))
+    ]}
+
+
+def schedule_route(params):
+    location = _require(params, 'location')
+    lawn_type = params.get('lawn_type', DEFAULT_LAWN_TYPE)
+    moisture = _optional_number(params, 'moisture')
+    days_since_mow = _optional_number(params, 'days_since_mow', int)
+    weather_data, forecast_data = _fetch_weather(location)
+    return {
+        'location': location,
+        'lawn_type': lawn_type,
+        'schedule': plan_schedule(weather_data, forecast_data, lawn_type, moisture, days_since_mow),
+    }
+
+
+def _batch_inputs(body):
+    """
+    Validate a batch body, fetch each weather tile once (concurrently) and
+    pack the inputs of the vectorized engines for the lawns whose weather
+    could be fetched
+
+    Returns:
+        (lawns, tile key per lawn, number of tiles, indexes of the packed lawns,
+        {tile key: error} for tiles that failed, lawn columns, forecast arrays)
+    """
+    lawns = body.get('lawns') if isinstance(body, dict) else None
+    if not isinstance(lawns, list) or not lawns:
+        raise HTTPError(400, "Body must be {\"lawns\": [{\"location\": ..., \"lawn_type\": ...}, ...]}")
+    if len(lawns) > MAX_BATCH_LAWNS:
+        raise HTTPError(413, f"At most {MAX_BATCH_LAWNS} lawns per request")
+    for lawn in lawns:
+        if not isinstance(lawn, dict):
+            raise HTTPError(400, "Every lawn must be an object")
+        _check_strings(lawn, 'location', 'lawn_type')
+        if 'lat' in lawn and 'lon' in lawn:
+            _check_coordinate(lawn, 'lat', 90)
+            _check_coordinate(lawn, 'lon', 180)
+        elif not (lawn.get('location') or "").strip():
+            raise HTTPError(400, "Every lawn needs a location or lat/lon")
+
+    keys = lawn_tile_keys(lawns)
+    fetched = get_client().fetch_many(list(dict.fromkeys(keys)), fallback=False)
+    errors = {key: result for key, result in fetched.items() if isinstance(result, BaseException)}
+    if len(errors) == len(fetched):
+        raise HTTPError(*_weather_error(next(iter(errors.values()))))
+
+    packed = [i for i, key in enumerate(keys) if key not in errors]
+    numbers = {}
+    tile_of = np.array([numbers.setdefault(keys[i], len(numbers)) for i in packed])
+    try:
+        columns, matrix = pack_lawns([lawns[i] for i in packed], tile_of, [fetched[tile][0] for tile in numbers],
+                                     [fetched[tile][1] for tile in numbers], DEFAULT_LAWN_TYPE)
+    except ValueError as e:
+        raise HTTPError(503, str(e))
+    errors = {key: _weather_error(error)[1] for key, error in errors.items()}
+    return lawns, keys, len(fetched), packed, errors, columns, matrix
+
+
+def _batch_results(lawns, keys, packed, errors, result):
+    """
+    One result per lawn, in request order: result(row, i) for the lawn packed
+    at row, or an error for lawns whose weather could not be fetched
+    """
+    results = [
+        {'location': lawn.get('location'), 'tile': keys[i], 'lawn_type': lawn.get('lawn_type', DEFAULT_LAWN_TYPE),
+         'error': errors[keys[i]]} if keys[i] in errors else None
+        for i, lawn in enumerate(lawns)
+    ]
+    for row, i in enumerate(packed):
+        results[i] = result(row, i)
+    return results
+
+
+def batch_recommendations_route(body):
+    """
+    Recommendations for many lawns: lawns are grouped by weather tile, each
+    tile is fetched once (concurrently), then every lawn is scored in one
+    vectorized pass
+    """
+    lawns, keys, tiles, packed, errors, columns, matrix = _batch_inputs(body)
+    results = get_recommendations(columns, matrix)
+
+    def result(row, i):
+        return {
+            'location': lawns[i].get('location'),
+            'tile': keys[i],
+            'lawn_type': lawns[i].get('lawn_type', DEFAULT_LAWN_TYPE),
+            'should_water': bool(results['should_water'][row]),
+            'water_amount': None if not results['should_water'][row] else round(float(results['water_amount'][row]), 3),
+            'next_water_date': str(results['next_water_date'][row]),
+            'should_mow': bool(results['should_mow'][row]),
+            'next_mow_date': str(results['next_mow_date'][row]),
+        }
+
+    return {'tiles': tiles, 'results': _batch_results(lawns, keys, packed, errors, result)}
+
+
+def batch_schedule_route(body):
+    """
+    Watering and mowing schedules for many lawns, planned in one pass;
+    lawns of the same type in the same tile share one solve
+    """
+    lawns, keys, tiles, packed, errors, columns, matrix = _batch_inputs(body)
+    for name, cast, missing in (('moisture', float, np.nan), ('days_since_mow', int, -1)):
+        values = [lawns[i].get(name) for i in packed]
+        if any(value is not None for value in values):
+            try:
+                columns[name] = np.array([missing if value is None else cast(value) for value in values])
+            except (TypeError, ValueError):
+                raise HTTPError(400, f"{name} must be a number")
+    plan = plan_schedules(columns, matrix)
+
+    dates = [str(date) for date in plan['date'][0]]
+    water = plan['water'].tolist()
+    mow = plan['mow'].tolist()
+    amount = np.round(plan['water_amount'], 3).tolist()
+
+    def result(row, i):
+        return {
+            'location': lawns[i].get('location'),
+            'tile': keys[i],
+            'lawn_type': lawns[i].get('lawn_type', DEFAULT_LAWN_TYPE),
+            'water': water[row],
+            'water_amount': [amount[row][day] if water[row][day] else None for day in range(len(dates))],
+            'mow': mow[row],
+        }
+
+    return {'tiles': tiles, 'plans': plan['groups'], 'dates': dates,
+            'results': _batch_results(lawns, keys, packed, errors, result)}
+
+
+def _lawn_snapshot(location, lawn_type, weather_data, forecast_data):
+    return build_snapshot(
+        location, lawn_type, weather_data, forecast_data,
+        get_watering_recommendation(weather_data, forecast_data, lawn_type),
+        get_mowing_recommendation(weather_data, forecast_data, lawn_type),
+    )
+
+
+def sync_route(params):
+    """
+    Offline sync for one lawn: the changes since the version the client
+    holds (since=...), or 304 when If-None-Match names the current version
+    """
+    location = _require(params, 'location')
+    lawn_type = params.get('lawn_type', DEFAULT_LAWN_TYPE)
+    weather_data, forecast_data = _fetch_weather(location)
+    result = get_sync_store().sync(_lawn_snapshot(location, lawn_type, weather_data, forecast_data),
+                                   params.get('since'))
+    return Response(result, etag=result['version'], headers={'Cache-Control': 'no-cache'})
+
+
+def batch_sync_route(body):
+    """
+    Offline sync for many lawns in one round trip; each lawn gives the
+    version it holds as since, and up-to-date lawns come back with no changes
+    """
+    lawns = body.get('lawns') if isinstance(body, dict) else None
+    if not isinstance(lawns, list) or not lawns:
+        raise HTTPError(400, "Body must be {\"lawns\": [{\"location\": ..., \"lawn_type\": ..., \"since\": ...}, ...]}")
+    if len(lawns) > MAX_BATCH_LAWNS:
+        raise HTTPError(413, f"At most {MAX_BATCH_LAWNS} lawns per request")
+    for lawn in lawns:
+        if not isinstance(lawn, dict):
+            raise HTTPError(400, "Every lawn must be an object with a location")
+        _check_strings(lawn, 'location', 'lawn_type', 'since')
+        if not (lawn.get('location') or "").strip():
+            raise HTTPError(400, "Every lawn must be an object with a location")
+
+    fetched = get_client().fetch_many([lawn['location'] for lawn in lawns], fallback=False)
+    store = get_sync_store()
+    results = []
+    for lawn in lawns:
+        lawn_type = lawn.get('lawn_type', DEFAULT_LAWN_TYPE)
+        if isinstance(fetched[lawn['location']], BaseException):
+            # The client keeps its last snapshot; it can retry this lawn later
+            results.append({'location': lawn['location'], 'lawn_type': lawn_type,
+                            'error': _weather_error(fetched[lawn['location']])[1]})
+            continue
+        weather_data, forecast_data = fetched[lawn['location']]
+        snapshot = _lawn_snapshot(lawn['location'], lawn_type, weather_data, forecast_data)
+        results.append({'location': lawn['location'], 'lawn_type': lawn_type,
+                        **store.sync(snapshot, lawn.get('since'))})
+    return {'results': results}
+
+
+def metrics_route(params):
+    report = {'latency': latency.summary()}
+    for func in (get_weather_data, get_forecast):
+        stats = func.get_cache().stats.get(func.endpoint)
+        if stats is not None:
+            report.setdefault('cache', {})[func.endpoint] = stats.as_dict()
+    report['memo'] = get_memo().stats.as_dict()
+    report['upstream_quota'] = get_limiter().usage()
+    if instrumentation.enabled:
+        report['instrumentation'] = instrumentation.snapshot()
+    return report
+
+
+def prometheus_route(params):
+    if not instrumentation.enabled:
+        raise HTTPError(404, "Instrumentation is disabled; set TURBOLAWN_METRICS or pass --metrics")
+    return instrumentation.render_prometheus()
+
+
+GET_ROUTES = {
+    '/health': lambda params: {'status': 'ok'},
+    '/weather': weather_route,
+    '/forecast': forecast_route,
+    '/places': places_route,
+    '/recommendations': recommendations_route,
+    '/schedule': schedule_route,
+    '/sync': sync_route,
+    '/metrics': metrics_route,
+    '/metrics/prometheus': prometheus_route,
+}
+
+POST_ROUTES = {
+    '/recommendations/batch': batch_recommendations_route,
+    '/schedule/batch': batch_schedule_route,
+    '/sync': batch_sync_route,
+}
+
+latency = LatencyRecorder()
+instrumentation = metrics.registry
+
+
+class ServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "TurboLawn/1.0"
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        params = {name: values[-1] for name, values in parse_qs(url.query).items()}
+        self._dispatch(url.path, GET_ROUTES, params)
+
+    def do_POST(self):
+        url = urlsplit(self.path)
+        length = int(self.headers.get('Content-Length') or 0)
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError:
+            self._send(400, {'error': "Invalid JSON body"})
+            return
+        self._dispatch(url.path, POST_ROUTES, body)
+
+    def _dispatch(self, path, routes, arg):
+        start = time.perf_counter()
+        route = routes.get(path)
+        headers = {}
+        with metrics.trace(f"{self.command} {path if route else 'unmatched'}"):
+            try:
+                if route is None:
+                    raise HTTPError(404, f"No route for {path}")
+                status, payload = 200, route(arg)
+                if isinstance(payload, Response):
+                    response, payload = payload, payload.payload
+                    headers = dict(response.headers)
+                    if response.etag is not None:
+                        headers['ETag'] = f'"{response.etag}"'
+                        if _etag_matches(self.headers.get('If-None-Match'), response.etag):
+                            status, payload = 304, None
+            except HTTPError as e:
+                status, payload = e.status, {'error': str(e)}
+            except RateLimited as e:
+                status, payload = 429, {'error': str(e), 'retry_after': round(e.retry_after, 1)}
+                headers = {'Retry-After': str(max(1, math.ceil(e.retry_after)))}
+            except Exception as e:
+                logger.exception("Error handling %s", path)
+                status, payload = 500, {'error': str(e)}
+
+            with metrics.span("serialize"):
+                self._send(status, payload, headers)
+        latency.record(f"{self.command} {path if route else 'unmatched'}", time.perf_counter() - start)
+
+    def _send(self, status, payload, headers=None):
+        if payload is None:
+            # 304 Not Modified: headers only
+            self.send_response(status)
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            return
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), 'text/plain; version=0.0.4'
+        else:
+            body, content_type = json.dumps(payload, default=_json_default).encode("utf-8"), 'application/json'
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.info("%s %s", self.address_string(), format % args)
+
+
+def make_server(host="127.0.0.1", port=8080):
+    return ThreadingHTTPServer((host, port), ServiceHandler)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="TurboLawn recommendation service")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument("--metrics", help="Comma-separated trace sinks (ring, log); overrides TURBOLAWN_METRICS")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    if args.metrics:
+        try:
+            instrumentation.configure(args.metrics)
+        except ValueError as e:
+            parser.error(f"--metrics: {e}")
+    server = make_server(args.host, args.port)
+    logger.info("Serving on http://%s:%d", args.host, server.server_port)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
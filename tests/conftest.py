@@ -0,0 +1,43 @@
+import os
+import sys
+import tempfile
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+# Keep caches, locks, rate-limit state, history and soil moisture out of the real temp files,
+# and set these before any utils module reads them
+STATE_DIR = tempfile.mkdtemp(prefix="turbolawn-tests-")
+os.environ.update(
+    OPENWEATHER_API_KEY="test_key",
+    OPENWEATHER_RATE_PER_MINUTE="1000000",
+    TURBOLAWN_CACHE_DB="",
+    TURBOLAWN_SYNC_DB="",
+    TURBOLAWN_LOCK_DIR=os.path.join(STATE_DIR, "locks"),
+    TURBOLAWN_RATE_LIMIT_STATE=os.path.join(STATE_DIR, "ratelimit"),
+    TURBOLAWN_HISTORY_DIR=os.path.join(STATE_DIR, "history"),
+    TURBOLAWN_WATER_BALANCE=os.path.join(STATE_DIR, "waterbalance.npz"),
+)
+
+from stub_server import FixtureServer  # noqa: E402
+from utils.cache import get_cache  # noqa: E402
+
+
+@pytest.fixture(autouse=True)
+def cache():
+    tier = get_cache()
+    tier.clear()
+    yield tier
+    tier.clear()
+
+
+@pytest.fixture
+def stub():
+    """
+    Local OpenWeatherMap stand-in; stub.requests counts calls per endpoint
+    """
+    with FixtureServer(latency=0.2) as server:
+        yield server
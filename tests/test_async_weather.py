@@ -0,0 +1,79 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from utils.async_weather import WeatherClient, fetch_weather
+from utils.singleflight import FileLock, LOCK_DIR
+from utils.weather import get_weather_data
+
+RENDERS = 8
+
+
+def render_concurrently(stub, location, **options):
+    """
+    Fetch from RENDERS threads at once, each on its own event loop like a page render
+    """
+    barrier = threading.Barrier(RENDERS)
+
+    def render(_):
+        barrier.wait()
+        return asyncio.run(fetch_weather(location, base_url=stub.base_url, **options))
+
+    with ThreadPoolExecutor(RENDERS) as pool:
+        return list(pool.map(render, range(RENDERS)))
+
+
+@pytest.mark.parametrize("coalesce", ["thread", "process"])
+def test_concurrent_renders_share_one_upstream_request(stub, coalesce):
+    # Without the cache, only coalescing can keep this to one request per endpoint
+    results = render_concurrently(stub, "Austin, TX", coalesce=coalesce, use_cache=False)
+
+    assert stub.requests['weather'] == 1
+    assert stub.requests['forecast'] == 1
+    assert all(result == results[0] for result in results)
+
+
+def test_equivalent_locations_share_one_upstream_request(stub):
+    barrier = threading.Barrier(2)
+
+    def render(location):
+        barrier.wait()
+        return asyncio.run(fetch_weather(location, base_url=stub.base_url, use_cache=False))
+
+    with ThreadPoolExecutor(2) as pool:
+        list(pool.map(render, ["Austin, TX", "  austin,tx "]))
+
+    assert stub.requests['weather'] == 1
+
+
+def test_coalescing_off_sends_every_request(stub):
+    render_concurrently(stub, "Austin, TX", coalesce="off", use_cache=False)
+
+    assert stub.requests['weather'] == RENDERS
+    assert stub.requests['forecast'] == RENDERS
+
+
+def test_process_mode_rechecks_cache_after_waiting_for_lock(stub, cache):
+    key = get_weather_data.cache_key("Austin, TX")
+
+    async def fetch():
+        async with WeatherClient(base_url=stub.base_url, coalesce="process") as client:
+            return await client.get_weather("Austin, TX")
+
+    pool = ThreadPoolExecutor(1)
+    # Stand in for another process that holds the lock while it fetches
+    with FileLock(key, LOCK_DIR):
+        future = pool.submit(asyncio.run, fetch())
+        time.sleep(0.2)
+        assert not future.done()
+        stored = asyncio.run(fetch_weather("Austin, TX", base_url=stub.base_url, coalesce="off"))[0]
+        cache.set(get_weather_data.endpoint, key, stored)
+        stub.requests.clear()
+    result = future.result(timeout=5)
+    pool.shutdown()
+
+    assert result == stored
+    assert stub.requests['weather'] == 0
@@ -0,0 +1,89 @@
+import csv
+import functools
+import json
+import threading
+
+import pytest
+
+import batch_runner
+from stub_server import FixtureServer
+from utils.async_weather import WeatherClient
+
+LAWNS = ["Austin, TX", "Seattle, WA", "Denver, CO"]
+
+
+class FlakyServer(FixtureServer):
+    """
+    Answers 503 to the first fail_first requests, and to every request after the first succeed_first
+    """
+
+    def __init__(self, fail_first=0, succeed_first=None, **options):
+        super().__init__(**options)
+        self.fail_first = fail_first
+        self.succeed_first = succeed_first
+        self._served = 0
+        self._served_lock = threading.Lock()
+
+    def respond(self, endpoint, params):
+        with self._served_lock:
+            self._served += 1
+            served = self._served
+        if served <= self.fail_first or (self.succeed_first is not None and served > self.succeed_first):
+            return 503, {'cod': 503, 'message': "stub failure"}
+        return super().respond(endpoint, params)
+
+
+@pytest.fixture
+def lawns_csv(tmp_path):
+    path = tmp_path / "lawns.csv"
+    with open(path, "w", newline="") as f:
+        writer = csv.writer(f)
+        writer.writerow(["location", "lawn_type"])
+        writer.writerows([location, "Cool Season Grass"] for location in LAWNS)
+    return str(path)
+
+
+def run(server, monkeypatch, lawns_csv, output, *options):
+    monkeypatch.setattr(batch_runner, "WeatherClient",
+                        functools.partial(WeatherClient, base_url=server.base_url, retries=0, backoff=0))
+    monkeypatch.setattr(batch_runner, "FETCH_BACKOFF", 0)
+    batch_runner.main([lawns_csv, "--output", output, "--workers", "1", "--chunk-size", "1", *options])
+
+
+def read_rows(path):
+    with open(path, newline="") as f:
+        return [row['location'] for row in csv.DictReader(f)]
+
+
+def read_progress(path):
+    with open(path + ".progress") as f:
+        return json.load(f)
+
+
+def test_failed_tiles_are_retried(monkeypatch, lawns_csv, tmp_path):
+    output = str(tmp_path / "results.csv")
+    with FlakyServer(fail_first=2) as server:
+        run(server, monkeypatch, lawns_csv, output)
+
+    assert read_rows(output) == LAWNS
+    assert read_progress(output)['complete']
+
+
+def test_failed_chunk_stops_run_and_resumes(monkeypatch, lawns_csv, tmp_path):
+    output = str(tmp_path / "results.csv")
+    # The first chunk's weather and forecast succeed, then the API goes down
+    with FlakyServer(succeed_first=2) as server:
+        with pytest.raises(SystemExit) as exited:
+            run(server, monkeypatch, lawns_csv, output)
+
+    assert exited.value.code == 1
+    # Chunks before the failure are kept; nothing made up is written for it
+    assert read_rows(output) == LAWNS[:1]
+    progress = read_progress(output)
+    assert progress['rows'] == 1 and not progress.get('complete')
+
+    with FlakyServer() as server:
+        run(server, monkeypatch, lawns_csv, output, "--resume")
+
+    assert read_rows(output) == LAWNS
+    assert read_progress(output)['complete']
@@ -0,0 +1,154 @@
+import threading
+import time
+
+import pytest
+
+from utils import weather
+from utils.cache import CacheEntry, TieredCache, cached
+from utils.models import Observation
+from utils.weather import get_forecast, get_weather_data
+
+UNREACHABLE = "http://127.0.0.1:9"
+
+
+def wait_for_refreshes():
+    for thread in threading.enumerate():
+        if thread.name.startswith("refresh-"):
+            thread.join(timeout=10)
+
+
+def real_observation(temp=99):
+    return Observation(temp=temp, humidity=20, conditions="Clear", wind_speed=3.0,
+                       location="Austin, US", rainfall_1h=0, rainfall_24h=0)
+
+
+def store(func, value, age, *args):
+    tier = func.get_cache()
+    key = func.cache_key("Austin, TX", *args)
+    tier.set(func.endpoint, key, value)
+    tier.memory.get(key).stored_at = time.time() - age
+    return tier, key
+
+
+@pytest.fixture
+def unreachable(monkeypatch):
+    monkeypatch.setattr(weather, "API_KEY", "test_key")
+    monkeypatch.setattr(weather, "BASE_URL", UNREACHABLE)
+
+
+def test_failed_refresh_keeps_the_stale_entry(unreachable):
+    tier, key = store(get_weather_data, real_observation(), 1800 + 60)
+    stored_at = tier.memory.get(key).stored_at
+
+    assert get_weather_data("Austin, TX")['temp'] == 99
+    wait_for_refreshes()
+
+    entry, state = tier.lookup(get_weather_data.endpoint, key, record=False)
+    assert state == 'stale'
+    assert entry.value['temp'] == 99 and entry.stored_at == stored_at
+
+
+def test_failed_miss_returns_mock_data_without_caching_it(unreachable):
+    weather_data = get_weather_data("Austin, TX")
+    forecast_data = get_forecast("Austin, TX")
+
+    mock = weather.get_mock_weather_data("Austin, TX")
+    assert (weather_data['temp'], weather_data['conditions']) == (mock['temp'], mock['conditions'])
+    assert len(forecast_data) == 5
+    for func in (get_weather_data, get_forecast):
+        _, state = func.get_cache().lookup(func.endpoint, func.cache_key("Austin, TX"), record=False)
+        assert state == 'miss'
+
+
+def test_refresh_raises_instead_of_falling_back(unreachable):
+    with pytest.raises(Exception):
+        get_weather_data.refresh("Austin, TX")
+
+
+class Upstream:
+    """
+    Counts calls; fails while failing is set
+    """
+
+    def __init__(self):
+        self.calls = 0
+        self.failing = False
+
+    def __call__(self, location):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError("upstream down")
+        return {'location': location, 'call': self.calls}
+
+
+@pytest.fixture
+def counted():
+    upstream = Upstream()
+    func = cached("test", ttl=60, stale_ttl=600, cache=TieredCache(), normalize=str.casefold)(upstream)
+    func.upstream = upstream
+    return func
+
+
+def age(func, seconds, location="austin"):
+    func.get_cache().memory.get(func.cache_key(location)).stored_at = time.time() - seconds
+
+
+def test_fresh_hits_skip_the_upstream(counted):
+    assert counted("Austin") == counted("AUSTIN") == {'location': "austin", 'call': 1}
+    assert counted.upstream.calls == 1
+    stats = counted.get_cache().stats["test"]
+    assert (stats.hits, stats.misses) == (1, 1)
+
+
+def test_stale_entries_are_served_while_refreshing(counted):
+    counted("Austin")
+    age(counted, 120)
+
+    assert counted("Austin")['call'] == 1
+    wait_for_refreshes()
+    assert counted.upstream.calls == 2
+    assert counted("Austin")['call'] == 2
+    assert counted.get_cache().stats["test"].stale_hits == 1
+
+
+def test_entries_past_the_stale_window_are_reloaded(counted):
+    counted("Austin")
+    age(counted, 60 + 600 + 1)
+    assert counted("Austin")['call'] == 2
+
+
+def test_failed_background_refresh_is_retried_on_the_next_stale_hit(counted):
+    counted("Austin")
+    age(counted, 120)
+    counted.upstream.failing = True
+
+    assert counted("Austin")['call'] == 1
+    wait_for_refreshes()
+    assert counted("Austin")['call'] == 1
+    wait_for_refreshes()
+    assert counted.upstream.calls == 3
+
+    counted.upstream.failing = False
+    counted("Austin")
+    wait_for_refreshes()
+    assert counted("Austin")['call'] == 4
+
+
+def test_concurrent_misses_share_one_call():
+    release = threading.Event()
+    calls = []
+
+    def slow(location):
+        calls.append(location)
+        release.wait(5)
+        return location
+
+    func = cached("slow", ttl=60, cache=TieredCache(), coalesce="thread")(slow)
+    threads = [threading.Thread(target=func, args=("austin",)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    time.sleep(0.1)
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert calls == ["austin"]
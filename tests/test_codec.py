@@ -0,0 +1,91 @@
+import datetime
+import pickle
+
+import numpy as np
+import pytest
+
+from utils import codec
+from utils.batch import ForecastBlock
+from utils.cache import CacheEntry, SQLiteCache
+from utils.weather import get_mock_forecast, get_mock_weather_data
+
+
+def test_observations_round_trip_in_binary():
+    observation = get_mock_weather_data("Austin, TX")
+    observation['humidity'] = None
+    data = codec.dumps(observation)
+
+    assert data.startswith(codec.MAGIC)
+    assert len(data) < len(pickle.dumps(observation))
+    loaded = codec.loads(data)
+    assert loaded == observation
+    assert type(loaded['temp']) is int and loaded['humidity'] is None
+
+
+def test_forecasts_round_trip_in_binary():
+    forecast = get_mock_forecast("Austin, TX")
+    forecast[0]['humidity'] = None
+    forecast[1]['rainfall'] = 2
+    data = codec.dumps(forecast)
+
+    assert data.startswith(codec.MAGIC)
+    assert len(data) < len(pickle.dumps(forecast))
+    loaded = codec.loads(data)
+    assert loaded == forecast
+    assert loaded[0]['humidity'] is None and type(loaded[1]['rainfall']) is int
+
+
+@pytest.mark.parametrize("change", [
+    lambda forecast: forecast[0].__setattr__('date', datetime.datetime(2026, 7, 1, 12)),
+    lambda forecast: forecast[0].__setattr__('temp_high', float('nan')),
+    lambda forecast: forecast[0].__setattr__('temp_low', (1 << 60) + 1),
+    lambda forecast: forecast[0].__setattr__('conditions', None),
+    lambda forecast: forecast[0].__setattr__('conditions', "Rain\0"),
+])
+def test_forecasts_the_format_cannot_hold_are_pickled(change):
+    forecast = get_mock_forecast("Austin, TX")
+    change(forecast)
+    data = codec.dumps(forecast)
+    assert not data.startswith(codec.MAGIC)
+    assert pickle.loads(data)[0]['date'] == forecast[0]['date']
+
+
+def test_other_values_are_pickled():
+    observation = get_mock_weather_data("Austin, TX")
+    observation['timestamp'] = observation['timestamp'].astimezone()
+    for value in ([], {'lat': 30.27, 'lon': -97.74}, observation):
+        data = codec.dumps(value)
+        assert not data.startswith(codec.MAGIC)
+        assert codec.loads(data) == value
+
+
+def test_from_encoded_matches_from_forecasts():
+    forecasts = [get_mock_forecast(location) for location in ("Austin, TX", "Boston, MA", "Denver, CO")]
+    forecasts[1][2]['humidity'] = None
+    expected = ForecastBlock.from_forecasts(forecasts)
+    block = ForecastBlock.from_encoded([codec.dumps(forecast) for forecast in forecasts])
+
+    assert (block.date == expected.date).all()
+    for name in ('temp_high', 'temp_low', 'temp_avg', 'humidity', 'rainfall'):
+        np.testing.assert_array_equal(getattr(block, name), getattr(expected, name))
+    labels = np.array(block.labels, dtype=object)[block.conditions]
+    assert (labels == np.array(expected.labels, dtype=object)[expected.conditions]).all()
+
+
+def test_from_encoded_rejects_ragged_and_foreign_payloads():
+    with pytest.raises(ValueError):
+        ForecastBlock.from_encoded([codec.dumps(get_mock_forecast("Austin, TX", days)) for days in (5, 3)])
+    with pytest.raises(codec.CodecError):
+        ForecastBlock.from_encoded([codec.dumps(get_mock_weather_data("Austin, TX"))])
+
+
+def test_unreadable_payloads_are_cache_misses(tmp_path):
+    disk = SQLiteCache(str(tmp_path / "cache.sqlite3"))
+    # A row written by another schema version
+    disk.set("forecast:old", CacheEntry(None, 0))
+    disk._connection().execute("UPDATE cache SET value = ? WHERE key = ?",
+                               (codec.HEADER.pack(codec.MAGIC, codec.SCHEMA_VERSION + 1, 2, 0, 0), "forecast:old"))
+    disk.set("weather:new", CacheEntry(get_mock_weather_data("Austin, TX"), datetime.datetime.now().timestamp()))
+
+    assert disk.get("forecast:old") is None
+    assert disk.get("weather:new") is not None
@@ -0,0 +1,22 @@
+from utils.geocode import place_label, suggest_locations
+
+
+def labels(text):
+    return [place_label(place) for place in suggest_locations(text)]
+
+
+def test_misspelled_names_are_suggested():
+    assert labels("Austn, TX") == ["Austin, TX"]
+    assert "Columbus, OH" in labels("colu")
+
+
+def test_suggestions_keep_an_explicitly_typed_state():
+    assert labels("Columbus, GA") == []
+    assert labels("Aurora, IL") == []
+    assert labels("Austn, Texas") == ["Austin, TX"]
+
+
+def test_exact_places_and_coordinates_get_no_suggestions():
+    assert labels("Austin, TX") == []
+    assert labels("30.27,-97.74") == []
+    assert labels("") == []
@@ -0,0 +1,31 @@
+import random
+
+import pytest
+
+from utils import geohash
+from utils.geocode import parse_coordinates
+
+
+@pytest.mark.parametrize("precision", range(1, geohash.MAX_PRECISION + 1))
+def test_tile_keys_snap_back_to_their_own_tile(precision):
+    rng = random.Random(precision)
+    for _ in range(200):
+        lat, lon = rng.uniform(-89.9, 89.9), rng.uniform(-179.9, 179.9)
+        code = geohash.encode(lat, lon, precision)
+        key = geohash.tile_key(lat, lon, precision)
+        assert geohash.encode(*parse_coordinates(key), precision) == code
+        assert geohash.tile_key(*parse_coordinates(key), precision) == key
+
+
+@pytest.mark.parametrize("precision", [9, 10, 11, 12])
+def test_neighbouring_tiles_never_share_a_key(precision):
+    lat_min, lat_max, lon_min, lon_max = geohash.bounds(geohash.encode(30.2672, -97.7431, precision))
+    here = geohash.center_key(geohash.encode(30.2672, -97.7431, precision))
+    north = geohash.tile_key(lat_max + (lat_max - lat_min) / 2, (lon_min + lon_max) / 2, precision)
+    east = geohash.tile_key((lat_min + lat_max) / 2, lon_max + (lon_max - lon_min) / 2, precision)
+    assert len({here, north, east}) == 3
+
+
+def test_key_decimals_keep_existing_keys_at_low_precision():
+    assert geohash.tile_key(30.2672, -97.7431, 5) == "30.256348,-97.756348"
+    assert geohash.key_decimals(12) == 8
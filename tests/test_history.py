@@ -0,0 +1,80 @@
+import datetime
+import os
+
+import numpy as np
+import pytest
+
+from utils.history import FORECAST, OBSERVATION, RECORD, HistoryStore
+from utils.models import DailyForecast, Observation
+
+# 2026-07-01 00:00 UTC
+MIDNIGHT = 1782864000.0
+
+
+def observation(ts, rainfall_1h=0.0, temp=80):
+    return Observation(temp=temp, humidity=50, conditions="Clear", wind_speed=3.0, location="Austin, US",
+                       timestamp=datetime.datetime.fromtimestamp(ts), rainfall_1h=rainfall_1h, rainfall_24h=0)
+
+
+@pytest.fixture
+def store(tmp_path):
+    return HistoryStore(str(tmp_path / "history"))
+
+
+def test_records_are_partitioned_by_utc_day(store):
+    for hours in (22, 23, 25):
+        store.record_observation("Austin, TX", observation(MIDNIGHT + hours * 3600))
+    files = sorted(os.listdir(os.path.join(store.root, "Austin%2C%20TX")))
+    assert files == ["2026-07-01.bin", "2026-07-02.bin"]
+    assert store.locations() == ["Austin, TX"]
+
+
+def test_query_returns_a_time_range_oldest_first(store):
+    times = [MIDNIGHT + hours * 3600 for hours in (30, 2, 20, 26)]
+    for ts in times:
+        store.record_observation("Austin, TX", observation(ts, temp=int(ts % 100)))
+
+    records = store.query("Austin, TX", MIDNIGHT + 2 * 3600, MIDNIGHT + 26 * 3600)
+    assert records['ts'].tolist() == [MIDNIGHT + 2 * 3600, MIDNIGHT + 20 * 3600]
+    assert records.dtype == RECORD
+    assert len(store.query("Elsewhere", MIDNIGHT, MIDNIGHT + 86400)) == 0
+
+
+def test_forecasts_are_kept_apart_from_observations(store):
+    store.record_observation("Austin, TX", observation(MIDNIGHT + 3600))
+    day = datetime.date.fromtimestamp(MIDNIGHT + 3600)
+    store.record_forecast("Austin, TX", [DailyForecast(day, 90, 70, 80, "Rain", 0.4, 60)], issued=MIDNIGHT)
+
+    start, end = MIDNIGHT - 86400, MIDNIGHT + 2 * 86400
+    assert store.query("Austin, TX", start, end, kind=OBSERVATION)['temp'].tolist() == [80]
+    forecasts = store.query("Austin, TX", start, end, kind=FORECAST)
+    assert forecasts['rainfall'].tolist() == pytest.approx([0.4])
+    assert np.isnan(forecasts['wind_speed'][0]) and forecasts['issued'][0] == MIDNIGHT
+
+
+def test_rainfall_takes_the_largest_report_per_hour(store):
+    # Two samples in the first hour report overlapping windows of the same rain
+    for minutes, rainfall in ((5, 0.1), (40, 0.2), (70, 0.3), (190, 0.0)):
+        store.record_observation("Austin, TX", observation(MIDNIGHT + minutes * 60, rainfall))
+    total, hours = store.rainfall("Austin, TX", MIDNIGHT, MIDNIGHT + 4 * 3600)
+    assert total == pytest.approx(0.5) and hours == 3
+
+
+def test_rainfall_24h_needs_enough_coverage(store):
+    now = MIDNIGHT + 86400
+    for hour in range(10):
+        store.record_observation("Austin, TX", observation(MIDNIGHT + hour * 3600, 0.1))
+    assert store.rainfall_24h("Austin, TX", now) is None
+
+    for hour in range(10, 20):
+        store.record_observation("Austin, TX", observation(MIDNIGHT + hour * 3600, 0.0))
+    # 1.0 inch over 20 observed hours, scaled to the full day
+    assert store.rainfall_24h("Austin, TX", now) == pytest.approx(1.2)
+
+
+def test_partial_trailing_records_are_ignored(store):
+    store.record_observation("Austin, TX", observation(MIDNIGHT + 3600))
+    path = os.path.join(store.root, "Austin%2C%20TX", "2026-07-01.bin")
+    with open(path, "ab") as f:
+        f.write(b"\0" * (RECORD.itemsize // 2))
+    assert len(store.query("Austin, TX", MIDNIGHT, MIDNIGHT + 86400)) == 1
@@ -0,0 +1,94 @@
+import pytest
+
+from utils.cache import TieredCache
+from utils.memo import Memo, memoize
+
+
+@pytest.fixture
+def memo():
+    return Memo(maxsize=16)
+
+
+@pytest.fixture
+def tier(memo):
+    tier = TieredCache()
+    tier.configure("weather", ttl=60)
+    tier.subscribe(memo.on_store)
+    return tier
+
+
+@pytest.fixture
+def score(memo):
+    calls = []
+
+    @memoize("score", context=lambda: "today", memo=memo)
+    def score(weather_data, lawn_type):
+        calls.append(lawn_type)
+        return {'temp': weather_data['temp'], 'lawn_type': lawn_type}
+
+    score.calls = calls
+    return score
+
+
+def store(tier, temp):
+    tier.set("weather", "weather:austin", {'temp': temp, 'humidity': 50})
+    return tier.get("weather", "weather:austin")
+
+
+def test_same_snapshot_and_arguments_share_one_result(tier, memo, score):
+    snapshot = store(tier, 80)
+    assert score(snapshot, "Mixed Grass") is score(snapshot, "Mixed Grass")
+    score(snapshot, "Warm Season Grass")
+    assert score.calls == ["Mixed Grass", "Warm Season Grass"]
+    assert (memo.stats.hits, memo.stats.misses) == (1, 2)
+
+
+def test_replacing_a_snapshot_drops_results_computed_from_it(tier, memo, score):
+    old = store(tier, 80)
+    score(old, "Mixed Grass")
+    new = store(tier, 95)
+
+    assert score(new, "Mixed Grass")['temp'] == 95
+    assert memo.stats.invalidations == 1 and len(memo) == 1
+    # The replaced snapshot is no longer known, so calls on it are not memoized
+    score(old, "Mixed Grass")
+    assert memo.stats.bypassed == 1
+    assert score.calls == ["Mixed Grass"] * 3
+
+
+def test_refreshing_with_identical_content_keeps_results(tier, memo, score):
+    score(store(tier, 80), "Mixed Grass")
+    assert score(store(tier, 80), "Mixed Grass")['temp'] == 80
+    assert memo.stats.invalidations == 0
+    assert score.calls == ["Mixed Grass"]
+
+
+def test_deleting_an_entry_drops_its_results(tier, memo, score):
+    score(store(tier, 80), "Mixed Grass")
+    tier.delete("weather:austin")
+    assert memo.stats.invalidations == 1 and len(memo) == 0
+
+
+def test_values_not_from_the_cache_are_computed_directly(memo, score):
+    weather_data = {'temp': 70, 'humidity': 50}
+    score(weather_data, "Mixed Grass")
+    score(weather_data, "Mixed Grass")
+    assert score.calls == ["Mixed Grass"] * 2
+    assert memo.stats.bypassed == 2 and len(memo) == 0
+
+
+def test_context_is_part_of_the_key(tier, memo):
+    day = ["monday"]
+    calls = []
+
+    @memoize("daily", context=lambda: day[0], memo=memo)
+    def daily(weather_data):
+        calls.append(day[0])
+        return weather_data['temp']
+
+    snapshot = store(tier, 80)
+    daily(snapshot)
+    daily(snapshot)
+    day[0] = "tuesday"
+    daily(snapshot)
+    assert calls == ["monday", "tuesday"]
@@ -0,0 +1,97 @@
+import datetime
+
+import numpy as np
+import pytest
+
+from utils.batch import forecast_matrix, lawn_type_codes
+from utils.models import DailyForecast, Observation
+from utils.planner import MOW_INTERVAL, plan_schedule, plan_schedules
+
+TODAY = datetime.date(2026, 7, 1)
+
+
+def weather(temp=85, humidity=40, conditions="Clear", rainfall_24h=0.0):
+    return Observation(temp=temp, humidity=humidity, conditions=conditions, wind_speed=3.0,
+                       location="Austin, US", rainfall_1h=0, rainfall_24h=rainfall_24h)
+
+
+def forecast(days=5, temp_high=85, conditions="Clear", rainfall=0.0, **changes):
+    """
+    Forecast days from tomorrow; changes maps a day number (1-based) to (conditions, rainfall)
+    """
+    data = []
+    for day in range(1, days + 1):
+        day_conditions, day_rainfall = changes.get(f"day{day}", (conditions, rainfall))
+        data.append(DailyForecast(TODAY + datetime.timedelta(days=day), temp_high, temp_high - 20,
+                                  temp_high - 10, day_conditions, day_rainfall, 40))
+    return data
+
+
+def test_plan_covers_today_and_every_forecast_day():
+    plan = plan_schedule(weather(), forecast(), "Cool Season Grass", today=TODAY)
+    assert [day['date'] for day in plan] == [TODAY + datetime.timedelta(days=i) for i in range(6)]
+    for day in plan:
+        assert 0.0 <= day['moisture'] <= 1.0
+        assert (day['water_amount'] is None) == (not day['water'])
+
+
+def test_dry_lawn_in_hot_weather_is_watered_today():
+    plan = plan_schedule(weather(temp=98, humidity=20), forecast(temp_high=98), "Cool Season Grass",
+                         moisture=0.1, days_since_mow=1, today=TODAY)
+    assert plan[0]['water'] and plan[0]['water_amount'] > 0
+
+
+def test_wet_lawn_with_rain_coming_is_not_watered():
+    plan = plan_schedule(weather(temp=70, humidity=80), forecast(temp_high=72, conditions="Rain", rainfall=0.4),
+                         "Cool Season Grass", moisture=1.0, days_since_mow=1, today=TODAY)
+    assert not any(day['water'] for day in plan)
+
+
+def test_mowing_waits_out_the_rain():
+    plan = plan_schedule(weather(conditions="Rain", rainfall_24h=0.3), forecast(day1=("Rain", 0.3)),
+                         "Cool Season Grass", moisture=0.8, days_since_mow=MOW_INTERVAL[0] - 1, today=TODAY)
+    mowed = [day['date'] for day in plan if day['mow']]
+    assert mowed and mowed[0] >= TODAY + datetime.timedelta(days=2)
+
+
+def test_long_overdue_lawn_is_mowed_even_in_the_rain():
+    plan = plan_schedule(weather(conditions="Rain", rainfall_24h=0.3), forecast(day1=("Rain", 0.3)),
+                         "Cool Season Grass", moisture=0.8, days_since_mow=MOW_INTERVAL[0] + 2, today=TODAY)
+    assert plan[0]['mow']
+
+
+def test_a_recently_mowed_lawn_is_not_mowed_again_at_once():
+    plan = plan_schedule(weather(), forecast(), "Warm Season Grass", moisture=0.8, days_since_mow=0, today=TODAY)
+    assert not plan[0]['mow'] and not plan[1]['mow']
+
+
+def test_batch_plans_match_single_plans_and_share_solves():
+    weathers = [weather(), weather(temp=98, humidity=20), weather()]
+    forecasts = [forecast(), forecast(temp_high=98), forecast()]
+    lawn_types = ["Cool Season Grass", "Cool Season Grass", "Cool Season Grass"]
+    lawns = {
+        'temp': [w['temp'] for w in weathers],
+        'humidity': [w['humidity'] for w in weathers],
+        'rainfall_24h': [w['rainfall_24h'] for w in weathers],
+        'conditions': [w['conditions'] for w in weathers],
+        'lawn_type': lawn_type_codes(lawn_types),
+        'moisture': [0.4, 0.4, 0.9],
+        'days_since_mow': [3, 3, 6],
+    }
+    plans = plan_schedules(lawns, forecast_matrix(forecasts), today=TODAY)
+    # The first and last lawns share weather and type, so one solve serves both
+    assert plans['groups'] == 2
+
+    for i in range(3):
+        single = plan_schedule(weathers[i], forecasts[i], lawn_types[i], moisture=lawns['moisture'][i],
+                               days_since_mow=lawns['days_since_mow'][i], today=TODAY)
+        assert [day['water'] for day in single] == plans['water'][i].tolist()
+        assert [day['mow'] for day in single] == plans['mow'][i].tolist()
+        np.testing.assert_allclose([day['moisture'] for day in single], plans['moisture'][i], atol=0.01)
+
+
+@pytest.mark.parametrize("days_since_mow", [None, -1])
+def test_unknown_mowing_age_is_planned_as_due(days_since_mow):
+    plan = plan_schedule(weather(), forecast(), "Cool Season Grass", moisture=0.8,
+                         days_since_mow=days_since_mow, today=TODAY)
+    assert any(day['mow'] for day in plan[:2])
@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from utils import weather
+from utils.models import Observation
+from utils.prefetch import PrefetchScheduler
+from utils.weather import get_forecast, get_weather_data
+
+
+def wait_until(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError("timed out")
+        time.sleep(0.02)
+
+
+@pytest.fixture
+def scheduler():
+    scheduler = PrefetchScheduler(rate_per_minute=60000, lead=60, jitter=0)
+    yield scheduler
+    scheduler.stop(timeout=5)
+
+
+def test_unreachable_upstream_counts_failures_and_keeps_entries(monkeypatch, scheduler):
+    monkeypatch.setattr(weather, "API_KEY", "test_key")
+    monkeypatch.setattr(weather, "BASE_URL", "http://127.0.0.1:9")
+    tier = get_weather_data.get_cache()
+    key = get_weather_data.cache_key("Austin, TX")
+    real = Observation(temp=99, humidity=20, conditions="Clear", wind_speed=3.0, location="Austin, US")
+    tier.set(get_weather_data.endpoint, key, real)
+    # Due for refresh: within the lead time of expiring
+    tier.memory.get(key).stored_at = time.time() - 1800 + 30
+
+    scheduler.register("Austin, TX")
+    scheduler.start()
+    wait_until(lambda: scheduler.failed >= 2)
+
+    assert scheduler.refreshed == 0
+    entry, state = tier.lookup(get_weather_data.endpoint, key, record=False)
+    assert state == 'fresh' and entry.value['temp'] == 99
+    _, state = tier.lookup(get_forecast.endpoint, get_forecast.cache_key("Austin, TX"), record=False)
+    assert state == 'miss'
+
+
+def test_successful_prefetch_refreshes_due_entries(monkeypatch, scheduler, stub):
+    monkeypatch.setattr(weather, "API_KEY", "test_key")
+    monkeypatch.setattr(weather, "BASE_URL", stub.base_url)
+
+    scheduler.register("Austin, TX")
+    scheduler.start()
+    wait_until(lambda: scheduler.refreshed >= 2)
+
+    assert scheduler.failed == 0
+    assert stub.requests['weather'] == 1 and stub.requests['forecast'] == 1
+    _, state = get_forecast.get_cache().lookup(get_forecast.endpoint, get_forecast.cache_key("Austin, TX"),
+                                               record=False)
+    assert state == 'fresh'
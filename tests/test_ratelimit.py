@@ -0,0 +1,88 @@
+import multiprocessing
+import threading
+import time
+
+import pytest
+
+from utils.ratelimit import BACKGROUND, BULK, INTERACTIVE, QuotaExceeded, RateLimited, RateLimiter, priority
+
+
+@pytest.fixture
+def state_path(tmp_path):
+    return str(tmp_path / "ratelimit")
+
+
+def limiter(state_path, rate_per_minute=60, burst=4, daily_quota=0):
+    return RateLimiter(rate_per_minute, burst=burst, daily_quota=daily_quota, state_path=state_path)
+
+
+def _take(state_path, count):
+    bucket = limiter(state_path)
+    for _ in range(count):
+        bucket.acquire(INTERACTIVE, max_wait=0)
+
+
+def test_processes_draw_from_one_bucket(state_path):
+    child = multiprocessing.get_context("fork").Process(target=_take, args=(state_path, 3))
+    child.start()
+    child.join(10)
+    assert child.exitcode == 0
+
+    bucket = limiter(state_path)
+    bucket.acquire(INTERACTIVE, max_wait=0)
+    with pytest.raises(RateLimited) as raised:
+        bucket.acquire(INTERACTIVE, max_wait=0)
+    assert 0 < raised.value.retry_after <= 1.0
+    assert bucket.usage()['used_today'] == 4
+
+
+def test_429_blocks_every_limiter_on_the_host(state_path):
+    first, second = limiter(state_path), limiter(state_path)
+    first.block(30)
+
+    with pytest.raises(RateLimited) as raised:
+        second.acquire(INTERACTIVE, max_wait=1)
+    assert raised.value.retry_after == pytest.approx(30, abs=1)
+    assert second.usage()['blocked_for_s'] == pytest.approx(30, abs=1)
+    assert first.upstream_429 == 1 and second.rejected[INTERACTIVE] == 1
+
+
+def test_background_and_bulk_leave_the_reserve_to_interactive(state_path):
+    bucket = limiter(state_path)
+    with priority(BACKGROUND):
+        for _ in range(3):
+            bucket.acquire(max_wait=0)
+        with pytest.raises(RateLimited):
+            bucket.acquire(max_wait=0)
+    with pytest.raises(RateLimited):
+        bucket.acquire(BULK, max_wait=0)
+    bucket.acquire(INTERACTIVE, max_wait=0)
+    assert bucket.acquired == {INTERACTIVE: 1, BULK: 0, BACKGROUND: 3}
+
+
+def test_waiting_callers_are_served_in_priority_order(state_path):
+    bucket = limiter(state_path, rate_per_minute=120, burst=1)
+    bucket.acquire(INTERACTIVE, max_wait=0)
+    served = []
+
+    def wait(level):
+        bucket.acquire(level, max_wait=None)
+        served.append(level)
+
+    threads = [threading.Thread(target=wait, args=(level,)) for level in (BACKGROUND, BULK, INTERACTIVE)]
+    for thread in threads:
+        thread.start()
+        # Lower priorities queue up first
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(10)
+    assert served == [INTERACTIVE, BULK, BACKGROUND]
+
+
+def test_daily_quota_is_shared_and_enforced(state_path):
+    first, second = limiter(state_path, daily_quota=2), limiter(state_path, daily_quota=2)
+    first.acquire(INTERACTIVE, max_wait=0)
+    second.acquire(INTERACTIVE, max_wait=0)
+    with pytest.raises(QuotaExceeded):
+        first.acquire(INTERACTIVE, max_wait=0)
+    assert second.usage()['quota_remaining'] == 0
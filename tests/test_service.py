@@ -0,0 +1,147 @@
+import http.client
+import json
+import threading
+from urllib.parse import urlencode
+
+import pytest
+
+import service
+from stub_server import FixtureServer
+from utils.async_weather import SharedClient
+
+
+class PartialServer(FixtureServer):
+    """
+    Answers 404 for free-text queries starting with "nowhere"
+    """
+
+    def respond(self, endpoint, params):
+        if params.get('q', '').startswith("nowhere"):
+            return 404, {'cod': '404', 'message': "city not found"}
+        return super().respond(endpoint, params)
+
+
+def use_client(monkeypatch, base_url):
+    client = SharedClient(base_url=base_url, retries=0, backoff=0)
+    monkeypatch.setattr(service, "get_client", lambda: client)
+    return client
+
+
+@pytest.fixture
+def upstream(monkeypatch):
+    with PartialServer() as server:
+        client = use_client(monkeypatch, server.base_url)
+        yield server
+        client.close()
+
+
+@pytest.fixture
+def unreachable(monkeypatch):
+    client = use_client(monkeypatch, "http://127.0.0.1:9")
+    yield
+    client.close()
+
+
+def test_single_lawn_routes_fail_instead_of_using_mock_weather(unreachable):
+    for route in (service.recommendations_route, service.schedule_route, service.sync_route):
+        with pytest.raises(service.HTTPError) as raised:
+            route({'location': "Austin, TX"})
+        assert raised.value.status == 503
+
+
+def test_api_errors_are_bad_gateway(upstream):
+    with pytest.raises(service.HTTPError) as raised:
+        service.recommendations_route({'location': "nowhere special"})
+    assert raised.value.status == 502
+
+
+def test_batch_reports_failed_lawns_and_scores_the_rest(upstream):
+    body = {'lawns': [{'location': "Austin, TX"}, {'location': "nowhere special"}, {'lat': 47.6, 'lon': -122.3}]}
+    for route in (service.batch_recommendations_route, service.batch_schedule_route):
+        results = route(body)['results']
+        assert [result['location'] for result in results] == ["Austin, TX", "nowhere special", None]
+        assert 'error' not in results[0] and 'error' not in results[2]
+        assert results[1]['error'].startswith("Weather API error")
+
+    synced = service.batch_sync_route({'lawns': [{'location': "Austin, TX"}, {'location': "nowhere special"}]})
+    assert 'version' in synced['results'][0]
+    assert 'error' in synced['results'][1] and 'version' not in synced['results'][1]
+
+
+def test_batch_fails_when_no_weather_could_be_fetched(unreachable):
+    with pytest.raises(service.HTTPError) as raised:
+        service.batch_recommendations_route({'lawns': [{'location': "Austin, TX"}]})
+    assert raised.value.status == 503
+
+
+@pytest.mark.parametrize("lawn", [
+    {'lat': True, 'lon': -97.7},
+    {'lat': float('nan'), 'lon': -97.7},
+    {'lat': 30.3, 'lon': float('inf')},
+    {'lat': 1000, 'lon': -97.7},
+    {'lat': 30.3, 'lon': -181},
+    {'lat': "30.3", 'lon': -97.7},
+    {'location': 42},
+    {'location': ["Austin, TX"]},
+    {'location': "   "},
+    {'location': "Austin, TX", 'lawn_type': ["Mixed Grass"]},
+])
+def test_invalid_batch_lawns_are_rejected(lawn):
+    for route in (service.batch_recommendations_route, service.batch_schedule_route):
+        with pytest.raises(service.HTTPError) as raised:
+            route({'lawns': [lawn]})
+        assert raised.value.status == 400
+
+
+@pytest.mark.parametrize("lawn", [{'location': 42}, {'location': "Austin, TX", 'since': 7}, {'lawn_type': "x"}])
+def test_invalid_sync_lawns_are_rejected(lawn):
+    with pytest.raises(service.HTTPError) as raised:
+        service.batch_sync_route({'lawns': [lawn]})
+    assert raised.value.status == 400
+
+
+def test_edge_coordinates_are_accepted(upstream):
+    results = service.batch_recommendations_route({'lawns': [{'lat': 90, 'lon': -180}, {'lat': -90.0, 'lon': 180.0}]})
+    assert all('error' not in result for result in results['results'])
+
+
+def test_non_finite_query_numbers_are_rejected():
+    with pytest.raises(service.HTTPError) as raised:
+        service.schedule_route({'location': "Austin, TX", 'moisture': "nan"})
+    assert raised.value.status == 400
+
+
+@pytest.fixture
+def server(upstream):
+    httpd = service.make_server("127.0.0.1", 0)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd.server_address
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def get(address, path, headers=None):
+    connection = http.client.HTTPConnection(*address, timeout=10)
+    try:
+        connection.request("GET", path, headers=headers or {})
+        response = connection.getresponse()
+        return response.status, response.getheader('ETag'), response.read()
+    finally:
+        connection.close()
+
+
+def test_sync_answers_304_when_the_etag_still_matches(server):
+    path = "/sync?" + urlencode({'location': "Austin, TX", 'lawn_type': "Mixed Grass"})
+    status, etag, body = get(server, path)
+    assert status == 200 and etag == f'"{json.loads(body)["version"]}"'
+
+    for if_none_match in (etag, f"W/{etag}", f'"0123456789abcdef", {etag}'):
+        status, same_etag, body = get(server, path, {'If-None-Match': if_none_match})
+        assert (status, same_etag, body) == (304, etag, b"")
+
+    status, _, body = get(server, path, {'If-None-Match': '"0123456789abcdef"'})
+    assert status == 200 and json.loads(body)['snapshot']['location'] == "Austin, TX"
+
+    status, _, body = get(server, path + "&" + urlencode({'since': etag.strip('"')}))
+    assert status == 200 and json.loads(body)['changes'] == {}
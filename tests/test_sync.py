@@ -0,0 +1,87 @@
+import datetime
+
+import pytest
+
+from utils.cache import TieredCache
+from utils.models import DailyForecast, Observation
+from utils.sync import SyncStore, apply_changes, build_snapshot, diff, version_of
+
+
+def snapshot(temp=80, rainfall=(0.0, 0.1, 0.0), humidity=50, lawn_type="Mixed Grass", watering=None):
+    start = datetime.date(2026, 7, 1)
+    weather_data = Observation(temp=temp, humidity=humidity, conditions="Clear", wind_speed=3.0,
+                               location="Austin, US", timestamp=datetime.datetime(2026, 7, 1, 9),
+                               rainfall_1h=0, rainfall_24h=float('nan'))
+    forecast_data = [DailyForecast(start + datetime.timedelta(days=i), 90, 70, 80, "Clear", rain, 40)
+                     for i, rain in enumerate(rainfall, 1)]
+    watering = watering or {'should_water': False, 'next_water_date': start + datetime.timedelta(days=2)}
+    mowing = {'should_mow': True, 'message': "Good day to mow"}
+    return build_snapshot("Austin, TX", lawn_type, weather_data, forecast_data, watering, mowing)
+
+
+@pytest.fixture
+def store():
+    return SyncStore(cache=TieredCache())
+
+
+def test_snapshots_are_plain_json():
+    data = snapshot()
+    assert data['weather']['timestamp'] == "2026-07-01T09:00:00"
+    assert data['weather']['rainfall_24h'] is None
+    assert data['forecast'][0]['date'] == "2026-07-02"
+
+
+@pytest.mark.parametrize("new", [
+    snapshot(),
+    snapshot(temp=95),
+    snapshot(rainfall=(0.0, 0.5, 0.0)),
+    snapshot(rainfall=(0.0, 0.1)),
+    snapshot(rainfall=(0.0, 0.1, 0.0, 0.3)),
+    snapshot(watering={'should_water': True, 'water_amount': 0.5}),
+])
+def test_applying_a_diff_reproduces_the_new_snapshot(new):
+    old = snapshot()
+    changes = diff(old, new)
+    assert apply_changes(old, changes) == new
+    assert version_of(apply_changes(old, changes)) == version_of(new)
+    if new == old:
+        assert changes == {}
+
+
+def test_diffs_carry_only_what_changed():
+    changes = diff(snapshot(), snapshot(temp=95, rainfall=(0.0, 0.5)))
+    assert changes['weather'] == {'set': {'temp': 95}}
+    assert changes['forecast'] == {'days': [snapshot(rainfall=(0.0, 0.5))['forecast'][1]],
+                                   'removed': ["2026-07-04"]}
+    assert set(changes) == {'weather', 'forecast'}
+
+    changes = diff(snapshot(), snapshot(watering={'should_water': True, 'water_amount': 0.5}))
+    assert changes['watering'] == {'set': {'should_water': True, 'water_amount': 0.5},
+                                   'unset': ['next_water_date']}
+
+
+def test_sync_sends_changes_since_the_clients_version(store):
+    first = store.sync(snapshot())
+    assert first['base'] is None and first['snapshot'] == snapshot()
+
+    assert store.sync(snapshot(), first['version']) == {'version': first['version'], 'base': first['version'],
+                                                       'changes': {}}
+
+    second = store.sync(snapshot(temp=95), first['version'])
+    assert second['base'] == first['version'] and second['version'] == version_of(snapshot(temp=95))
+    assert apply_changes(snapshot(), second['changes']) == snapshot(temp=95)
+
+
+def test_unknown_versions_and_other_lawns_get_the_full_snapshot(store):
+    assert 'snapshot' in store.sync(snapshot(), "0123456789abcdef")
+
+    other_lawn = store.sync(snapshot(lawn_type="Warm Season Grass"))['version']
+    response = store.sync(snapshot(), other_lawn)
+    assert response['base'] is None and response['snapshot'] == snapshot()
+
+
+def test_expired_versions_get_the_full_snapshot():
+    store = SyncStore(cache=TieredCache(), ttl=0)
+    version = store.sync(snapshot())['version']
+    assert store.snapshot(version) is None
+    assert 'snapshot' in store.sync(snapshot(temp=95), version)
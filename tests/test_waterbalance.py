@@ -0,0 +1,47 @@
+import time
+
+import pytest
+
+from utils.waterbalance import ROOT_ZONE_CAPACITY, LawnStore, WaterBalance
+from utils.weather import get_mock_weather_data
+
+
+@pytest.fixture
+def weather():
+    observation = get_mock_weather_data("Austin, TX")
+    observation['temp'], observation['humidity'] = 70, 60
+    observation['rainfall_1h'] = observation['rainfall_24h'] = 0
+    return observation
+
+
+def test_rain_is_counted_at_the_daily_rate(weather):
+    model = WaterBalance()
+    start = time.time()
+    lawn = model.add_lawn("Cool Season Grass", moisture=0.3, now=start)
+    # A heavy last hour used to be multiplied by every hour since the last update
+    weather['rainfall_1h'], weather['rainfall_24h'] = 0.5, 0.6
+    model.observe(lawn, weather, now=start + 12 * 3600)
+
+    used = 1.0 / 7 / 2
+    assert model.moisture[lawn] == pytest.approx(0.3 - used + 0.3, abs=1e-6)
+
+
+def test_lawns_persist_across_stores_and_record_watering(tmp_path, weather):
+    path = str(tmp_path / "balance.npz")
+    start = time.time()
+    first = LawnStore(path)
+    full = first.observe("Austin, TX", "Cool Season Grass", weather, now=start)['soil_moisture']
+    dry = first.observe("austin,tx", "Cool Season Grass", weather, now=start + 5 * 86400)['soil_moisture']
+    assert dry < full
+    assert len(first.model) == 1
+
+    # Another process (or a restart) picks up the same lawn, and sees watering logged here
+    second = LawnStore(path)
+    second.irrigate("Austin TX", "Cool Season Grass", 0.5, now=start + 5 * 86400)
+    watered = first.observe("Austin, TX", "Cool Season Grass", weather, now=start + 5 * 86400)['soil_moisture']
+    assert watered == pytest.approx(dry + 0.5 / ROOT_ZONE_CAPACITY[0], abs=0.01)
+    assert len(first.model) == 1
+
+    other = first.observe("Austin, TX", "Warm Season Grass", weather, now=start + 5 * 86400)
+    assert other['soil_moisture'] == 1.0
+    assert LawnStore(path).locations == first.locations == [first.locations[0]] * 2
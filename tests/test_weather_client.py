@@ -0,0 +1,119 @@
+import asyncio
+import time
+
+import pytest
+
+from stub_server import FixtureServer
+from utils.async_weather import SharedClient, WeatherAPIError, WeatherClient
+from utils.cache import CacheEntry
+from utils.ratelimit import RateLimited, RateLimiter
+from utils.weather import get_mock_weather_data, get_weather_data
+
+LOCATIONS = ["Austin, TX", "Denver, CO", "Seattle, WA", "Miami, FL", "Boston, MA", "Chicago, IL"]
+
+
+class FailingServer(FixtureServer):
+    """
+    Answers every request with one HTTP status
+    """
+
+    def __init__(self, status, **options):
+        super().__init__(**options)
+        self.status = status
+
+    def respond(self, endpoint, params):
+        return self.status, {'cod': self.status, 'message': "stub failure"}
+
+
+def own_limiter():
+    # Keeps Retry-After blocks from leaking into the process-wide limiter
+    return RateLimiter(rate_per_minute=1000000, state_path="")
+
+
+def run_client(coroutine_of, **options):
+    async def main():
+        async with WeatherClient(**options) as client:
+            return await coroutine_of(client)
+    return asyncio.run(main())
+
+
+def test_connections_are_pooled_and_limited_per_host(stub):
+    results = run_client(lambda client: client.fetch_many(LOCATIONS),
+                         base_url=stub.base_url, limit_per_host=2, use_cache=False)
+
+    assert set(results) == set(LOCATIONS)
+    assert stub.requests['weather'] == stub.requests['forecast'] == len(LOCATIONS)
+    assert stub.max_in_flight <= 2
+    assert len(stub.connections) <= 2
+
+
+def test_shared_client_keeps_connections_between_calls(stub):
+    client = SharedClient(base_url=stub.base_url, use_cache=False)
+    try:
+        for location in LOCATIONS[:3]:
+            client.fetch(location)
+    finally:
+        client.close()
+
+    assert stub.requests['weather'] == 3
+    # Sequential calls reuse the pool instead of opening connections per call
+    assert len(stub.connections) <= 2
+
+
+def test_timeouts_are_retried_then_raised():
+    with FixtureServer(latency=1.0) as slow:
+        with pytest.raises(asyncio.TimeoutError):
+            run_client(lambda client: client.get_weather("Austin, TX"),
+                       base_url=slow.base_url, timeout=0.1, retries=1, backoff=0)
+        assert slow.requests['weather'] == 2
+
+
+def test_429_raises_rate_limited_with_retry_after():
+    with FixtureServer(limit_per_minute=1) as limited:
+        limiter = own_limiter()
+        with pytest.raises(RateLimited) as raised:
+            run_client(lambda client: client.fetch("Austin, TX"),
+                       base_url=limited.base_url, limiter=limiter, max_wait=0, retries=1)
+
+    assert limited.requests['429'] >= 1
+    assert raised.value.retry_after > 0
+    # Every caller sharing the limiter now waits out Retry-After
+    assert limiter.upstream_429 >= 1
+
+
+def test_client_errors_are_not_retried():
+    with FailingServer(404) as failing:
+        with pytest.raises(WeatherAPIError):
+            run_client(lambda client: client.get_weather("Austin, TX"), base_url=failing.base_url, backoff=0)
+        assert failing.requests['weather'] == 1
+
+
+def test_fetch_falls_back_to_mock_data_on_errors():
+    with FailingServer(503) as failing:
+        weather_data, forecast_data = run_client(lambda client: client.fetch("Austin, TX"),
+                                                 base_url=failing.base_url, retries=1, backoff=0)
+        assert failing.requests['weather'] == 2
+
+    mock = get_mock_weather_data("Austin, TX")
+    assert (weather_data['temp'], weather_data['conditions']) == (mock['temp'], mock['conditions'])
+    assert len(forecast_data) == 5
+
+
+def test_stale_entries_are_served_then_refreshed(stub):
+    key = get_weather_data.cache_key("Austin, TX")
+    stale = get_mock_weather_data("Austin, TX")
+    cache = get_weather_data.get_cache()
+    ttl, stale_ttl = cache._ttls[get_weather_data.endpoint]
+    cache.memory.set(key, CacheEntry(stale, time.time() - ttl - stale_ttl / 2))
+
+    async def main():
+        async with WeatherClient(base_url=stub.base_url) as client:
+            served = await client.get_weather("Austin, TX")
+            # Answered from the stale entry before the refresh reached the API
+            assert stub.requests['weather'] == 0
+            return served
+
+    assert asyncio.run(main()) is stale
+    assert stub.requests['weather'] == 1
+    entry, state = cache.lookup(get_weather_data.endpoint, key, record=False)
+    assert state == 'fresh' and entry.value is not stale
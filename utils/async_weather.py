@@ -0,0 +1,351 @@
+import asyncio
+import atexit
+import logging
+import os
+import random
+import threading
+
+import aiohttp
+
+from utils.cache import COALESCE
+from utils.config import getenv
+from utils import metrics, weather
+from utils.ratelimit import BACKGROUND, BULK, RateLimited, get_limiter, parse_retry_after, priority
+from utils.singleflight import AsyncProcessSingleFlight, AsyncSingleFlight
+from utils.weather import (
+    get_weather_data, get_forecast, get_mock_weather_data, get_mock_forecast,
+    parse_weather, parse_forecast, record_weather, record_forecast, api_params, normalize_location,
+)
+
+logger = logging.getLogger(__name__)
+
+# Maximum concurrent connections to the weather API host
+MAX_CONNECTIONS_PER_HOST = int(getenv("OPENWEATHER_MAX_CONNECTIONS", "8"))
+
+# Retry transient failures (timeouts, 5xx) with exponential backoff; 429s wait for Retry-After instead
+MAX_RETRIES = 3
+BACKOFF_BASE = 0.5
+
+RETRY_STATUSES = {500, 502, 503, 504}
+
+# In-flight loads per coalesce mode, shared by every client and event loop in the
+# process, so concurrent renders of one location cost one upstream request
+_flights = {"thread": AsyncSingleFlight(), "process": AsyncProcessSingleFlight()}
+
+
+class WeatherAPIError(Exception):
+    """
+    Raised when the weather API returns an error that retrying will not fix
+    """
+
+
+# What a fetch with fallback=False raises when the API fails, besides RateLimited
+FETCH_ERRORS = (WeatherAPIError, aiohttp.ClientError, asyncio.TimeoutError)
+
+
+class WeatherClient:
+    """
+    Async OpenWeatherMap client with a pooled, per-host limited connector
+
+    Use as an async context manager so the connection pool is closed:
+
+        async with WeatherClient() as client:
+            results = await client.fetch_many(["Austin, TX", "Denver, CO"])
+
+    Results are read from and written to the same cache entries as
+    get_weather_data and get_forecast, so bulk refreshes warm the dashboard.
+    As there, stale entries are returned at once and refreshed in the
+    background; the client waits for those refreshes when it closes.
+    Concurrent misses for the same entry share one request across all
+    clients in the process ("thread"), optionally serialized across
+    processes with a file lock ("process"), as with cached().
+    """
+
+    def __init__(self, base_url=None, api_key=None, limit_per_host=MAX_CONNECTIONS_PER_HOST,
+                 timeout=None, retries=MAX_RETRIES, backoff=BACKOFF_BASE, use_cache=True, limiter=None,
+                 max_wait=-1, coalesce=None):
+        self.base_url = base_url or weather.BASE_URL
+        self.api_key = api_key or weather.API_KEY
+        self.limit_per_host = limit_per_host
+        self.timeout = aiohttp.ClientTimeout(total=timeout or weather.REQUEST_TIMEOUT)
+        self.retries = retries
+        self.backoff = backoff
+        self.use_cache = use_cache
+        self.limiter = limiter or get_limiter()
+        # Longest wait for a rate-limit token; -1 uses the default for the request's priority
+        self.max_wait = max_wait
+        self.coalesce = coalesce or COALESCE
+        self._session = None
+        self._flight = _flights.get(self.coalesce)
+        self._refreshing = {}
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(limit_per_host=self.limit_per_host)
+        self._session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        # Let stale-entry refreshes finish rather than drop them with the session
+        while self._refreshing:
+            await asyncio.gather(*self._refreshing.values(), return_exceptions=True)
+        await self._session.close()
+        self._session = None
+
+    async def _get_json(self, endpoint, location):
+        params = dict(api_params(location), appid=self.api_key)
+        url = f"{self.base_url}/{endpoint}"
+
+        for attempt in range(self.retries + 1):
+            # Waits its turn by priority; raises RateLimited if the wait would be too long
+            await self.limiter.acquire_async(max_wait=self.max_wait)
+            try:
+                with metrics.span("upstream", endpoint=endpoint):
+                    async with self._session.get(url, params=params) as response:
+                        metrics.incr("upstream_requests", endpoint=endpoint, status=response.status)
+                        if response.status == 200:
+                            return await response.json()
+                        if response.status == 429:
+                            retry_after = parse_retry_after(response.headers.get('Retry-After'))
+                            # Pause every caller; the next acquire waits out Retry-After or gives up
+                            self.limiter.block(retry_after)
+                            error = RateLimited("Weather API rate limit exceeded", retry_after)
+                            continue
+                        if response.status not in RETRY_STATUSES:
+                            raise WeatherAPIError(f"API error: {response.status}")
+                        error = WeatherAPIError(f"API error: {response.status}")
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                metrics.incr("upstream_requests", endpoint=endpoint, status="error")
+                error = e
+
+            if attempt < self.retries:
+                # Full jitter keeps many clients from retrying in lockstep
+                await asyncio.sleep(random.uniform(0, self.backoff * 2 ** attempt))
+
+        raise error
+
+    async def _cached(self, func, parse, record, endpoint, location, *args):
+        tier = func.get_cache()
+        key = func.cache_key(location, *args)
+
+        async def load():
+            canonical = func.normalize(location)
+            data = await self._get_json(endpoint, canonical)
+            with metrics.span(f"parse_{endpoint}"):
+                value = parse(data, *args)
+            value = record(canonical, value)
+            tier.set(func.endpoint, key, value)
+            return value
+
+        if self.use_cache:
+            entry, state = tier.lookup(func.endpoint, key)
+            metrics.incr("cache_requests", endpoint=func.endpoint, result=state)
+            if state == 'fresh':
+                return entry.value
+            if state == 'stale':
+                self._refresh_in_background(tier, func.endpoint, key, load)
+                return entry.value
+        return await self._load(tier, func.endpoint, key, load)
+
+    async def _load(self, tier, endpoint, key, load):
+        if self._flight is None:
+            return await load()
+        if self.coalesce == "process" and self.use_cache:
+            def recheck():
+                # Another process may have stored it while this one waited for the lock
+                entry, state = tier.lookup(endpoint, key, record=False)
+                return entry.value if state == 'fresh' else None
+            return await self._flight.do(key, load, recheck=recheck)
+        # Concurrent lookups of the same normalized location share one request
+        return await self._flight.do(key, load)
+
+    def _refresh_in_background(self, tier, endpoint, key, load):
+        if key in self._refreshing:
+            return
+
+        async def refresh():
+            try:
+                with priority(BACKGROUND):
+                    await self._load(tier, endpoint, key, load)
+            except Exception as e:
+                # The stale entry keeps being served; the next stale hit tries again
+                logger.warning("Background refresh of %s failed: %s", key, e)
+
+        task = asyncio.ensure_future(refresh())
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    async def get_weather(self, location):
+        """
+        Get current weather data for a location
+        """
+        if self.api_key == "demo_key":
+            return get_mock_weather_data(location)
+        return await self._cached(get_weather_data, parse_weather, record_weather, "weather", location)
+
+    async def get_forecast(self, location, days=5):
+        """
+        Get the daily forecast for a location
+        """
+        if self.api_key == "demo_key":
+            return get_mock_forecast(location, days)
+        return await self._cached(get_forecast, parse_forecast, record_forecast, "forecast",
+                                  location, days)
+
+    async def fetch(self, location, days=5, fallback=True):
+        """
+        Fetch current weather and forecast for a location concurrently
+
+        Returns:
+            Tuple of (weather_data, forecast_data); falls back to mock data on
+            errors other than rate limiting, unless fallback is False
+
+        Raises:
+            RateLimited: If the API or the shared rate limiter refused a request
+            WeatherAPIError, aiohttp.ClientError, asyncio.TimeoutError: With
+                fallback=False, if a request failed after its retries
+        """
+        weather_data, forecast_data = await asyncio.gather(
+            self.get_weather(location), self.get_forecast(location, days), return_exceptions=True
+        )
+
+        for result in (weather_data, forecast_data):
+            if isinstance(result, RateLimited):
+                raise result
+        for result in (weather_data, forecast_data):
+            if not fallback and isinstance(result, Exception):
+                raise result
+        if isinstance(weather_data, Exception):
+            logger.error("Error getting weather data for %s: %s", location, weather_data)
+            weather_data = get_mock_weather_data(location)
+        if isinstance(forecast_data, Exception):
+            logger.error("Error getting forecast data for %s: %s", location, forecast_data)
+            forecast_data = get_mock_forecast(location, days)
+
+        return weather_data, forecast_data
+
+    async def fetch_many(self, locations, days=5, fallback=True):
+        """
+        Fetch weather and forecasts for many locations concurrently
+
+        Locations are grouped by canonical key first, so lawns sharing a
+        weather tile cost one fetch between them.
+
+        Returns:
+            Dictionary mapping each location to (weather_data, forecast_data);
+            with fallback=False, locations that failed map to the exception
+            instead
+
+        Raises:
+            RateLimited: If the API or the shared rate limiter refused a request
+        """
+        keys = {location: normalize_location(location) for location in locations}
+        unique = list(dict.fromkeys(keys.values()))
+        fetched = await asyncio.gather(*(self.fetch(key, days, fallback) for key in unique), return_exceptions=True)
+        for result in fetched:
+            # Rate limits and unexpected errors fail the whole call; API failures are per location
+            if isinstance(result, BaseException) and (
+                    fallback or isinstance(result, RateLimited) or not isinstance(result, FETCH_ERRORS)):
+                raise result
+        results = dict(zip(unique, fetched))
+        return {location: results[key] for location, key in keys.items()}
+
+
+async def fetch_weather(location, days=5, **client_options):
+    """
+    Fetch current weather and forecast for one location concurrently
+    """
+    async with WeatherClient(**client_options) as client:
+        return await client.fetch(location, days)
+
+
+async def fetch_weather_many(locations, days=5, **client_options):
+    """
+    Fetch current weather and forecasts for many locations over one connection pool
+
+    Requests run at bulk priority, so they queue behind interactive ones.
+    """
+    with priority(BULK):
+        async with WeatherClient(**client_options) as client:
+            return await client.fetch_many(locations, days)
+
+
+class SharedClient:
+    """
+    One long-lived WeatherClient on a background event loop, for synchronous callers
+
+    Dashboard renders and service handlers run on plain threads. Rather than
+    open a connection pool per call under asyncio.run, they submit work to
+    this client and block for the result, so connections to the API stay
+    open between requests and stale-entry refreshes run after the caller
+    has its answer.
+
+        weather_data, forecast_data = get_client().fetch("Austin, TX")
+    """
+
+    def __init__(self, **client_options):
+        self.client_options = client_options
+        self._loop = None
+        self._client = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def client(self):
+        """
+        The WeatherClient on the loop thread, starting both on first use
+        """
+        # A loop thread does not survive fork, so a child process starts its own
+        with self._lock:
+            if self._pid != os.getpid():
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="weather-client", daemon=True).start()
+                client = WeatherClient(**self.client_options)
+                asyncio.run_coroutine_threadsafe(client.__aenter__(), loop).result()
+                self._loop, self._client, self._pid = loop, client, os.getpid()
+            return self._client
+
+    def run(self, coroutine):
+        """
+        Run a coroutine using self.client on the client's loop and return its result
+
+        The task starts in a copy of the caller's context, so the request
+        priority and metrics trace carry over.
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self._loop).result()
+
+    def fetch(self, location, days=5, fallback=True):
+        """
+        Fetch current weather and forecast for one location; see WeatherClient.fetch
+        """
+        return self.run(self.client.fetch(location, days, fallback))
+
+    def fetch_many(self, locations, days=5, fallback=True):
+        """
+        Fetch weather and forecasts for many locations at bulk priority; see WeatherClient.fetch_many
+        """
+        with priority(BULK):
+            return self.run(self.client.fetch_many(locations, days, fallback))
+
+    def close(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                asyncio.run_coroutine_threadsafe(self._client.__aexit__(None, None, None), self._loop).result()
+                self._loop.call_soon_threadsafe(self._loop.stop)
+            self._loop = self._client = self._pid = None
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Return the process-wide shared client
+    """
+    global _client
+    if _client is None:
+        with _client_lock:
+            if _client is None:
+                _client = SharedClient()
+                atexit.register(_client.close)
+    return _client
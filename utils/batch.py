@@ -0,0 +1,369 @@
+import datetime
+
+import numpy as np
+
+from utils import codec
+from utils.models import EPOCH_ORDINAL, DailyForecast
+
+# Integer codes used for the lawn_type column in batch inputs
+LAWN_TYPES = ["Cool Season Grass", "Warm Season Grass", "Mixed Grass"]
+COOL_SEASON, WARM_SEASON, MIXED = 0, 1, 2
+
+# Per-code weekly water need (inches) and ideal temperature range, indexed by lawn type code
+WEEKLY_WATER_NEED = np.array([1.0, 0.75, 0.85])
+IDEAL_TEMP_LOW = np.array([60, 80, 65])
+IDEAL_TEMP_HIGH = np.array([75, 95, 85])
+
+
+def lawn_type_codes(lawn_types):
+    """
+    Convert lawn type names into the integer codes used by the batch functions
+
+    Unknown names map to Mixed Grass, matching the fallback in the scalar functions.
+    """
+    lookup = {name: code for code, name in enumerate(LAWN_TYPES)}
+    return np.array([lookup.get(name, MIXED) for name in lawn_types], dtype=np.int8)
+
+
+def forecast_matrix(forecasts):
+    """
+    Pack a list of per-lawn forecasts (as returned by get_forecast) into arrays
+
+    Args:
+        forecasts: List of forecast lists, all with the same number of days
+
+    Returns:
+        Dictionary of (lawns x days) arrays: date, rainfall, temp_high, humidity
+        (NaN where a day has none) and rain
+    """
+    days = [day for forecast in forecasts for day in forecast]
+    shape = (len(forecasts), len(forecasts[0]) if forecasts else 0)
+
+    # Build flat lists first; a single np.array call is much cheaper than per-cell assignment
+    return {
+        'date': (np.array([day['date'].toordinal() for day in days], dtype=np.int64)
+                 - EPOCH_ORDINAL).astype('datetime64[D]').reshape(shape),
+        'rainfall': np.array([day['rainfall'] for day in days], dtype=float).reshape(shape),
+        'temp_high': np.array([day['temp_high'] for day in days], dtype=float).reshape(shape),
+        'humidity': np.array([day.get('humidity', np.nan) for day in days], dtype=float).reshape(shape),
+        'rain': np.array(["rain" in day['conditions'].lower() for day in days], dtype=bool).reshape(shape),
+    }
+
+
+class ForecastBlock:
+    """
+    Struct-of-arrays daily forecasts for many locations
+
+    Each field is one (locations x days) array: dates as datetime64[D],
+    temperatures, humidity and rainfall as float32, and conditions as
+    uint8 codes into a shared label list. A block of 100k 5-day forecasts
+    takes a few MB, where the equivalent lists of dicts take hundreds.
+    Blocks feed the batch engines directly (as_matrix) and hand out
+    DailyForecast records for code that wants per-day values.
+    """
+    FIELDS = ('date', 'temp_high', 'temp_low', 'temp_avg', 'humidity', 'rainfall', 'conditions')
+
+    def __init__(self, date, temp_high, temp_low, temp_avg, humidity, rainfall, conditions, labels):
+        self.date = date
+        self.temp_high = temp_high
+        self.temp_low = temp_low
+        self.temp_avg = temp_avg
+        self.humidity = humidity
+        self.rainfall = rainfall
+        self.conditions = conditions
+        self.labels = labels
+
+    @classmethod
+    def from_forecasts(cls, forecasts):
+        """
+        Pack per-location forecasts (lists of days, as returned by get_forecast)
+
+        Raises:
+            ValueError: If the forecasts do not all have the same number of days
+        """
+        shape = (len(forecasts), len(forecasts[0]) if forecasts else 0)
+        if any(len(forecast) != shape[1] for forecast in forecasts):
+            raise ValueError("Forecasts must all cover the same number of days; truncate them first")
+        days = [day for forecast in forecasts for day in forecast]
+
+        labels = {}
+        codes = [labels.setdefault(day['conditions'], len(labels)) for day in days]
+        if len(labels) > 256:
+            raise ValueError("More than 256 distinct forecast conditions")
+
+        def column(name):
+            return np.array([day[name] for day in days], dtype=np.float32).reshape(shape)
+
+        return cls(
+            date=(np.array([day['date'].toordinal() for day in days], dtype=np.int64)
+                  - EPOCH_ORDINAL).astype('datetime64[D]').reshape(shape),
+            temp_high=column('temp_high'),
+            temp_low=column('temp_low'),
+            temp_avg=column('temp_avg'),
+            humidity=column('humidity'),
+            rainfall=column('rainfall'),
+            conditions=np.array(codes, dtype=np.uint8).reshape(shape),
+            labels=list(labels),
+        )
+
+    @classmethod
+    def from_encoded(cls, payloads):
+        """
+        Pack forecasts straight from their utils.codec encoding, e.g. disk cache rows
+
+        The payloads' days are viewed as one NumPy array (codec.read_forecasts),
+        so no per-day records are built: the bulk path for reading many
+        cached forecasts, e.g. rows straight from the disk cache.
+
+        Raises:
+            ValueError: If the forecasts do not all have the same number of days
+            codec.CodecError: If a payload is not an encoded forecast
+        """
+        records, counts, labels = codec.read_forecasts(payloads)
+        shape = (len(counts), counts[0] if counts else 0)
+        if any(count != shape[1] for count in counts):
+            raise ValueError("Forecasts must all cover the same number of days; truncate them first")
+        if len(labels) > 256:
+            raise ValueError("More than 256 distinct forecast conditions")
+
+        def column(name):
+            return records[name].astype(np.float32).reshape(shape)
+
+        return cls(
+            date=records['date'].astype('datetime64[D]').reshape(shape),
+            temp_high=column('temp_high'),
+            temp_low=column('temp_low'),
+            temp_avg=column('temp_avg'),
+            humidity=column('humidity'),
+            rainfall=column('rainfall'),
+            conditions=records['conditions'].astype(np.uint8).reshape(shape),
+            labels=labels,
+        )
+
+    def __len__(self):
+        return self.date.shape[0]
+
+    @property
+    def days(self):
+        return self.date.shape[1]
+
+    @property
+    def nbytes(self):
+        return sum(getattr(self, name).nbytes for name in self.FIELDS)
+
+    @property
+    def rain(self):
+        """
+        (locations x days) bool: whether each day's conditions mention rain
+        """
+        rainy = np.array(["rain" in label.lower() for label in self.labels], dtype=bool)
+        return rainy[self.conditions] if len(rainy) else np.zeros(self.conditions.shape, dtype=bool)
+
+    def take(self, index):
+        """
+        Block of the given locations, e.g. block.take(tile_of) to broadcast tiles to lawns
+        """
+        return ForecastBlock(*(getattr(self, name)[index] for name in self.FIELDS), self.labels)
+
+    def as_matrix(self):
+        """
+        Arrays in the layout forecast_matrix builds, for the batch engines
+        """
+        return {
+            'date': self.date,
+            'rainfall': self.rainfall,
+            'temp_high': self.temp_high,
+            'humidity': self.humidity,
+            'rain': self.rain,
+        }
+
+    def forecast(self, location):
+        """
+        One location's forecast as a list of DailyForecast records
+        """
+        dates = self.date[location].astype(datetime.date).tolist()
+        return [
+            DailyForecast(
+                date=dates[day],
+                temp_high=round(float(self.temp_high[location, day])),
+                temp_low=round(float(self.temp_low[location, day])),
+                temp_avg=round(float(self.temp_avg[location, day]), 1),
+                conditions=self.labels[self.conditions[location, day]],
+                rainfall=round(float(self.rainfall[location, day]), 2),
+                humidity=round(float(self.humidity[location, day])),
+            )
+            for day in range(self.days)
+        ]
+
+
+def pack_lawns(lawns, tile_of, weather, forecasts, default_lawn_type=LAWN_TYPES[0]):
+    """
+    Pack per-tile weather and per-lawn settings into the batch engines' inputs
+
+    Args:
+        lawns: Lawn dicts with an optional lawn_type
+        tile_of: Tile number of each lawn
+        weather: Current weather of each tile
+        forecasts: Forecast (list of days) of each tile
+
+    Returns:
+        Tuple of (lawn columns, forecast arrays), broadcast from tiles to lawns
+
+    Raises:
+        ValueError: If no forecast days are available
+    """
+    # The engines need a rectangular forecast; use the days every tile has
+    days = min(len(forecast) for forecast in forecasts)
+    if days == 0:
+        raise ValueError("Forecast data unavailable")
+
+    # Pack per tile, then broadcast to lawns by indexing with each lawn's tile number
+    tile_of = np.asarray(tile_of)
+    columns = {
+        'temp': np.array([w['temp'] for w in weather])[tile_of],
+        'humidity': np.array([w['humidity'] for w in weather])[tile_of],
+        'rainfall_24h': np.array([w.get('rainfall_24h', 0) for w in weather])[tile_of],
+        'conditions': np.array([w['conditions'] for w in weather])[tile_of],
+        'lawn_type': lawn_type_codes(lawn.get('lawn_type', default_lawn_type) for lawn in lawns),
+    }
+    matrix = ForecastBlock.from_forecasts([f[:days] for f in forecasts]).take(tile_of).as_matrix()
+    return columns, matrix
+
+
+def get_watering_recommendations(lawns, forecast, today=None, current_hour=None):
+    """
+    Vectorized version of get_watering_recommendation for many lawns at once
+
+    Args:
+        lawns: DataFrame or dict of arrays with temp, humidity, rainfall_24h and lawn_type codes
+        forecast: Dictionary of (lawns x days) arrays as built by forecast_matrix
+        today: Date to plan from (defaults to today)
+        current_hour: Hour of day used for the time-of-day advice (defaults to now)
+
+    Returns:
+        Dictionary of arrays: should_water, water_amount (NaN when not watering)
+        and next_water_date (datetime64[D])
+    """
+    now = datetime.datetime.now()
+    today = np.datetime64(now.date() if today is None else today, 'D')
+    if current_hour is None:
+        current_hour = now.hour
+
+    temp = np.asarray(lawns['temp'], dtype=float)
+    humidity = np.asarray(lawns['humidity'], dtype=float)
+    recent_rainfall = np.asarray(_column(lawns, 'rainfall_24h', len(temp)), dtype=float)
+    codes = np.asarray(lawns['lawn_type'], dtype=np.intp)
+    codes = np.where((codes >= 0) & (codes < len(LAWN_TYPES)), codes, MIXED)
+
+    rainfall = np.asarray(forecast['rainfall'], dtype=float)
+    dates = np.broadcast_to(np.asarray(forecast['date'], dtype='datetime64[D]'), rainfall.shape)
+
+    # Base water needs on grass type, then adjust in the same order as the scalar path
+    weekly_water_need = WEEKLY_WATER_NEED[codes]
+    weekly_water_need = np.where(temp > IDEAL_TEMP_HIGH[codes] + 10, weekly_water_need * 1.3,
+                                 np.where(temp < IDEAL_TEMP_LOW[codes] - 10, weekly_water_need * 0.7,
+                                          weekly_water_need))
+    weekly_water_need = np.where(humidity < 40, weekly_water_need * 1.2,
+                                 np.where(humidity > 80, weekly_water_need * 0.8, weekly_water_need))
+    daily_water_need = weekly_water_need / 3
+
+    enough_rain = recent_rainfall > daily_water_need
+    rain_coming = (rainfall[:, :2] > 0.25).any(axis=1) & ~enough_rain
+    should_water = ~enough_rain & ~rain_coming
+
+    # Day after the first forecast day with any rain, or tomorrow if none
+    wet = rainfall > 0
+    after_rain = np.full(len(temp), today + np.timedelta64(1, 'D'))
+    if wet.shape[1]:
+        first_wet = dates[np.arange(len(temp)), wet.argmax(axis=1)] + np.timedelta64(1, 'D')
+        after_rain = np.where(wet.any(axis=1), first_wet, after_rain)
+
+    ideal_hour = current_hour < 10 or current_hour > 16
+    watered_next = today + np.timedelta64(2, 'D') if ideal_hour else today
+
+    next_water_date = np.where(
+        enough_rain, today + np.timedelta64(2, 'D'),
+        np.where(rain_coming, after_rain, watered_next),
+    ).astype('datetime64[D]')
+
+    return {
+        'should_water': should_water,
+        'water_amount': np.where(should_water, daily_water_need, np.nan),
+        'next_water_date': next_water_date,
+    }
+
+
+def mow_day_quality(rain, temp_high):
+    """
+    Score days for mowing from 0 to 100, same penalties as get_mowing_recommendation
+
+    Args:
+        rain: Whether rain is expected each day (bool array)
+        temp_high: Each day's high temperature, same shape
+    """
+    day_quality = np.full(np.shape(temp_high), 100)
+    day_quality -= np.where(rain, 80, 0)
+    day_quality -= np.where(temp_high > 95, 40, np.where(temp_high > 90, 20, 0))
+    day_quality -= np.where(temp_high < 50, 30, 0)
+    return day_quality
+
+
+def get_mowing_recommendations(lawns, forecast, today=None):
+    """
+    Vectorized version of get_mowing_recommendation for many lawns at once
+
+    Args:
+        lawns: DataFrame or dict of arrays with a conditions column (strings)
+        forecast: Dictionary of (lawns x days) arrays as built by forecast_matrix
+        today: Date to plan from (defaults to today)
+
+    Returns:
+        Dictionary of arrays: should_mow and next_mow_date (datetime64[D])
+    """
+    today = np.datetime64(datetime.datetime.now().date() if today is None else today, 'D')
+
+    conditions = np.char.lower(np.asarray(lawns['conditions'], dtype=str))
+    rain_today = np.char.find(conditions, "rain") >= 0
+
+    forecast_rain = np.asarray(forecast['rain'], dtype=bool)
+    temp_high = np.asarray(forecast['temp_high'], dtype=float)
+    dates = np.broadcast_to(np.asarray(forecast['date'], dtype='datetime64[D]'), temp_high.shape)
+    rain_tomorrow = forecast_rain[:, 0]
+
+    day_quality = mow_day_quality(forecast_rain, temp_high)
+
+    # argmax keeps the earliest of equally good days, like the stable sort in the scalar path
+    best_day = dates[np.arange(len(conditions)), day_quality.argmax(axis=1)]
+
+    should_mow = ~rain_today & (rain_tomorrow | (best_day == today))
+    next_mow_date = np.where(
+        rain_today, today + np.timedelta64(1, 'D'),
+        np.where(rain_tomorrow, today, best_day),
+    ).astype('datetime64[D]')
+
+    return {
+        'should_mow': should_mow,
+        'next_mow_date': next_mow_date,
+    }
+
+
+def get_recommendations(lawns, forecast, today=None, current_hour=None):
+    """
+    Compute watering and mowing recommendations for many lawns at once
+
+    Returns:
+        Dictionary of arrays: should_water, water_amount, next_water_date,
+        should_mow and next_mow_date
+    """
+    recommendations = get_watering_recommendations(lawns, forecast, today, current_hour)
+    recommendations.update(get_mowing_recommendations(lawns, forecast, today))
+    return recommendations
+
+
+def _column(lawns, name, size, default=0):
+    """
+    Return a column from a DataFrame or dict of arrays, or a filled default
+    """
+    if name in lawns:
+        return lawns[name]
+    return np.full(size, default)
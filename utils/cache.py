@@ -0,0 +1,445 @@
+import functools
+import inspect
+import logging
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+from utils.config import getenv
+from utils import codec, metrics
+from utils.memo import get_memo
+from utils.ratelimit import BACKGROUND, RateLimited, priority
+from utils.singleflight import SingleFlight, ProcessSingleFlight
+
+logger = logging.getLogger(__name__)
+
+# Disk tier location, shared by every process on the host; set to "" to disable it
+CACHE_DB = getenv("TURBOLAWN_CACHE_DB", os.path.join(tempfile.gettempdir(), "turbolawn-cache.sqlite3"))
+# Number of entries kept in the in-process LRU tier
+CACHE_SIZE = int(getenv("TURBOLAWN_CACHE_SIZE", "1024"))
+
+# How concurrent misses for the same key are coalesced: "thread", "process" or "off"
+COALESCE = getenv("TURBOLAWN_COALESCE", "thread")
+
+# How long past its TTL an entry may still be served while it is refreshed in the background
+DEFAULT_STALE_TTL = 600
+
+
+class CacheStats:
+    """
+    Hit/miss/eviction counters for one cache endpoint
+    """
+    __slots__ = ('hits', 'stale_hits', 'misses', 'evictions')
+
+    def __init__(self):
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class CacheEntry:
+    """
+    A cached value and the wall-clock time it was stored
+    """
+    __slots__ = ('value', 'stored_at')
+
+    def __init__(self, value, stored_at):
+        self.value = value
+        self.stored_at = stored_at
+
+    def age(self, now=None):
+        return (now or time.time()) - self.stored_at
+
+
+class LRUCache:
+    """
+    Thread-safe in-process LRU tier holding CacheEntry objects
+    """
+
+    def __init__(self, maxsize=CACHE_SIZE):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        """
+        Store an entry and return the number of entries evicted to make room
+        """
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            evicted = 0
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                evicted += 1
+            return evicted
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SQLiteCache:
+    """
+    On-disk tier backed by SQLite, shared between worker processes
+
+    Each thread gets its own connection; WAL mode lets readers in other
+    processes proceed while one process writes. Values are stored with
+    utils.codec, which writes weather records in a compact binary format
+    and pickles everything else.
+    """
+
+    def __init__(self, path=CACHE_DB, serializer=codec):
+        self.path = path
+        self.serializer = serializer
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                "key TEXT PRIMARY KEY, stored_at REAL NOT NULL, value BLOB NOT NULL)"
+            )
+            self._local.conn = conn
+        return conn
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT value, stored_at FROM cache WHERE key = ?", (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        try:
+            return CacheEntry(self.serializer.loads(row[0]), row[1])
+        except Exception:
+            # Written by an incompatible version; treat as a miss
+            self.delete(key)
+            return None
+
+    def set(self, key, entry):
+        self._connection().execute(
+            "INSERT OR REPLACE INTO cache (key, stored_at, value) VALUES (?, ?, ?)",
+            (key, entry.stored_at, self.serializer.dumps(entry.value)),
+        )
+
+    def delete(self, key):
+        self._connection().execute("DELETE FROM cache WHERE key = ?", (key,))
+
+    def prune(self, older_than):
+        """
+        Delete entries stored before the given timestamp and return how many were removed
+        """
+        cursor = self._connection().execute("DELETE FROM cache WHERE stored_at < ?", (older_than,))
+        return cursor.rowcount
+
+    def clear(self):
+        self._connection().execute("DELETE FROM cache")
+
+
+class TieredCache:
+    """
+    Two-tier cache: an in-process LRU in front of an optional shared disk tier
+
+    Entries are stored with their timestamp and freshness is decided on read,
+    so each endpoint can use its own TTL and stale window. Listeners added
+    with subscribe() hear about every value the memory tier takes in.
+    """
+
+    # Prune expired rows from the disk tier once every this many writes
+    PRUNE_EVERY = 256
+
+    def __init__(self, memory=None, disk=None):
+        self.memory = memory if memory is not None else LRUCache()
+        self.disk = disk
+        self.stats = {}
+        self._ttls = {}
+        self._writes = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+
+    def configure(self, endpoint, ttl, stale_ttl=DEFAULT_STALE_TTL):
+        """
+        Set the TTL and stale-while-revalidate window for an endpoint
+        """
+        self._ttls[endpoint] = (ttl, stale_ttl)
+        self.stats.setdefault(endpoint, CacheStats())
+
+    def ttl(self, endpoint):
+        return self._ttls[endpoint]
+
+    def subscribe(self, listener):
+        """
+        Call listener(endpoint, key, old_value, new_value) whenever a value is
+        stored, replaced (including by a newer copy from the shared tier) or
+        deleted; old_value and new_value are None when absent
+        """
+        self._listeners.append(listener)
+
+    def _stored(self, endpoint, key, old, new):
+        for listener in self._listeners:
+            try:
+                listener(endpoint, key, old.value if old is not None else None,
+                         new.value if new is not None else None)
+            except Exception:
+                logger.exception("Cache listener failed for %s", key)
+
+    def lookup(self, endpoint, key, record=True):
+        """
+        Look up a key and classify it
+
+        Pass record=False to leave the hit/miss counters untouched.
+
+        Returns:
+            Tuple of (entry, state) where state is 'fresh', 'stale' or 'miss'
+        """
+        ttl, stale_ttl = self._ttls[endpoint]
+        stats = self.stats[endpoint] if record else CacheStats()
+        now = time.time()
+
+        entry = self.memory.get(key)
+        if (entry is None or entry.age(now) >= ttl) and self.disk is not None:
+            # Another process may have stored a newer copy in the shared tier
+            try:
+                newer = self.disk.get(key)
+            except sqlite3.Error:
+                newer = None
+            if newer is not None and (entry is None or newer.stored_at > entry.stored_at):
+                self._stored(endpoint, key, entry, newer)
+                entry = newer
+                stats.evictions += self.memory.set(key, entry)
+
+        if entry is not None:
+            age = entry.age(now)
+            if age < ttl:
+                stats.hits += 1
+                return entry, 'fresh'
+            if age < ttl + stale_ttl:
+                stats.stale_hits += 1
+                return entry, 'stale'
+
+        stats.misses += 1
+        return None, 'miss'
+
+    def newest(self, key):
+        """
+        Return the most recently stored entry for a key across both tiers, or None
+
+        Unlike lookup this always reads the shared tier, so it sees refreshes
+        made by other processes even while the local copy is still fresh.
+        """
+        entry = self.memory.get(key)
+        if self.disk is not None:
+            try:
+                newer = self.disk.get(key)
+            except sqlite3.Error:
+                newer = None
+            if newer is not None and (entry is None or newer.stored_at > entry.stored_at):
+                self._stored(None, key, entry, newer)
+                entry = newer
+                self.memory.set(key, entry)
+        return entry
+
+    def get(self, endpoint, key):
+        """
+        Return a fresh cached value, or None
+        """
+        entry, state = self.lookup(endpoint, key)
+        return entry.value if state == 'fresh' else None
+
+    def set(self, endpoint, key, value, stored_at=None):
+        entry = CacheEntry(value, stored_at or time.time())
+        if self._listeners:
+            self._stored(endpoint, key, self.memory.get(key), entry)
+        self.stats[endpoint].evictions += self.memory.set(key, entry)
+
+        if self.disk is not None:
+            try:
+                self.disk.set(key, entry)
+                self._maybe_prune()
+            except sqlite3.Error:
+                pass
+
+    def delete(self, key):
+        if self._listeners:
+            self._stored(None, key, self.memory.get(key), None)
+        self.memory.delete(key)
+        if self.disk is not None:
+            self.disk.delete(key)
+
+    def clear(self):
+        self.memory.clear()
+        if self.disk is not None:
+            self.disk.clear()
+
+    def _maybe_prune(self):
+        with self._lock:
+            self._writes += 1
+            if self._writes % self.PRUNE_EVERY:
+                return
+        longest = max(ttl + stale for ttl, stale in self._ttls.values())
+        self.disk.prune(time.time() - longest)
+
+
+_default_cache = None
+_default_lock = threading.Lock()
+
+
+def get_cache():
+    """
+    Return the process-wide default cache, creating it on first use
+    """
+    global _default_cache
+    if _default_cache is None:
+        with _default_lock:
+            if _default_cache is None:
+                disk = SQLiteCache(CACHE_DB) if CACHE_DB else None
+                cache = TieredCache(disk=disk)
+                # Fingerprint every weather snapshot as it is stored, so results computed
+                # from it can be memoized (see utils.memo)
+                cache.subscribe(get_memo().on_store)
+                _default_cache = cache
+    return _default_cache
+
+
+def cached(endpoint, ttl, stale_ttl=DEFAULT_STALE_TTL, cache=None, normalize=None, coalesce=None, fallback=None):
+    """
+    Cache a function's results under an endpoint name
+
+    Fresh hits return immediately. Entries within the stale window are
+    returned as-is while a background thread refreshes them. Misses call
+    the function and store the result; concurrent misses for the same key
+    share one call ("thread"), optionally serialized across processes with
+    a file lock ("process").
+
+    normalize, if given, is applied to the first argument before keying and
+    calling, so equivalent inputs share one entry.
+
+    fallback, if given, is called with the original arguments when a miss
+    fails with anything but RateLimited, and its result is returned without
+    being stored. Failed refreshes of stale entries keep the old entry.
+
+    The wrapper exposes cache_key(*args, **kwargs), refresh(*args, **kwargs)
+    and the underlying cache so other fetch paths can share its entries.
+    """
+    def decorator(func):
+        signature = inspect.signature(func)
+        first_param = next(iter(signature.parameters))
+        refreshing = set()
+        refreshing_lock = threading.Lock()
+
+        mode = coalesce or COALESCE
+        flight = None
+        if mode == "thread":
+            flight = SingleFlight()
+        elif mode == "process":
+            flight = ProcessSingleFlight()
+
+        def get_tier():
+            tier = cache or get_cache()
+            if endpoint not in tier.stats:
+                tier.configure(endpoint, ttl, stale_ttl)
+            return tier
+
+        def bind(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            if normalize is not None:
+                bound.arguments[first_param] = normalize(bound.arguments[first_param])
+            return bound
+
+        def key_of(bound):
+            return f"{endpoint}:{tuple(bound.arguments.values())!r}"
+
+        def cache_key(*args, **kwargs):
+            return key_of(bind(args, kwargs))
+
+        def refresh(*args, **kwargs):
+            bound = bind(args, kwargs)
+            value = func(*bound.args, **bound.kwargs)
+            get_tier().set(endpoint, key_of(bound), value)
+            return value
+
+        def load(key, args, kwargs):
+            if flight is None:
+                return refresh(*args, **kwargs)
+            if mode == "process":
+                def recheck():
+                    entry, state = get_tier().lookup(endpoint, key, record=False)
+                    return entry.value if state == 'fresh' else None
+                return flight.do(key, refresh, *args, recheck=recheck, **kwargs)
+            return flight.do(key, refresh, *args, **kwargs)
+
+        def refresh_in_background(key, args, kwargs):
+            with refreshing_lock:
+                if key in refreshing:
+                    return
+                refreshing.add(key)
+
+            def run():
+                try:
+                    with priority(BACKGROUND):
+                        load(key, args, kwargs)
+                except Exception as e:
+                    # The stale entry keeps being served; the next stale hit tries again
+                    logger.warning("Background refresh of %s failed: %s", key, e)
+                finally:
+                    with refreshing_lock:
+                        refreshing.discard(key)
+
+            threading.Thread(target=run, name=f"refresh-{endpoint}", daemon=True).start()
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            key = cache_key(*args, **kwargs)
+            entry, state = get_tier().lookup(endpoint, key)
+            metrics.incr("cache_requests", endpoint=endpoint, result=state)
+
+            if state == 'fresh':
+                return entry.value
+            if state == 'stale':
+                refresh_in_background(key, args, kwargs)
+                return entry.value
+            if fallback is None:
+                return load(key, args, kwargs)
+            try:
+                return load(key, args, kwargs)
+            except RateLimited:
+                raise
+            except Exception as e:
+                logger.error("Error getting %s data for %s: %s", endpoint, args[0] if args else kwargs, e)
+                return fallback(*args, **kwargs)
+
+        wrapper.endpoint = endpoint
+        wrapper.normalize = normalize
+        wrapper.cache_key = cache_key
+        wrapper.refresh = refresh
+        wrapper.fallback = fallback
+        wrapper.get_cache = get_tier
+        return wrapper
+
+    return decorator
@@ -0,0 +1,307 @@
+"""
+Compact binary encoding for cached weather records
+
+A payload is a fixed header, then fixed-width records, then a string table:
+
+    header   <2sBBHI   magic b"TL", schema version, kind, record count, string table bytes
+    records  one RECORD struct per Observation (1) or DailyForecast (forecast list)
+    strings  NUL-separated UTF-8, indexed by the records' string fields
+
+Dates are epoch days, timestamps epoch microseconds of the wall-clock time,
+numbers float64 with NaN for None; a per-record bit mask marks the fields
+that were ints so they decode as ints. Records sit at a fixed offset with a
+fixed layout, so bulk readers can view them in place with NumPy
+(forecast_array) instead of decoding each one.
+
+dumps/loads make this a drop-in serializer for SQLiteCache: anything that
+is not a weather record (or list of forecast days) is pickled, and pickles
+written by older versions still load. So are records the format cannot hold
+exactly (NaN, huge ints, aware timestamps, missing text, datetimes as
+forecast dates), so loads(dumps(value)) == value for every value.
+"""
+import datetime
+import functools
+import pickle
+import struct
+
+from utils.models import EPOCH_ORDINAL, DailyForecast, Observation
+
+MAGIC = b"TL"
+# Bump when a record layout changes; payloads with another version fail to decode
+SCHEMA_VERSION = 1
+
+OBSERVATION, FORECAST = 1, 2
+
+HEADER = struct.Struct("<2sBBHI")
+# temp, humidity, wind_speed, rainfall_1h, rainfall_24h, timestamp (us), conditions, location, int mask
+OBSERVATION_RECORD = struct.Struct("<dddddqHHB")
+# date (epoch day), temp_high, temp_low, temp_avg, rainfall, humidity, conditions, int mask
+FORECAST_RECORD = struct.Struct("<idddddHB")
+
+_OBSERVATION_NUMBERS = ('temp', 'humidity', 'wind_speed', 'rainfall_1h', 'rainfall_24h')
+_FORECAST_NUMBERS = ('temp_high', 'temp_low', 'temp_avg', 'rainfall', 'humidity')
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_NAN = float('nan')
+_NO_TIMESTAMP = -(1 << 63)
+# Ints beyond this do not survive the float64 round trip
+_MAX_EXACT_INT = 1 << 53
+
+
+class CodecError(ValueError):
+    """
+    Raised for payloads that are truncated, corrupt or from another schema version
+    """
+
+
+def _number(value):
+    return _NAN if value is None else float(value)
+
+
+def _int_mask(values):
+    mask = 0
+    for bit, value in enumerate(values):
+        if type(value) is int:
+            mask |= 1 << bit
+    return mask
+
+
+def _exact_number(value):
+    if value is None:
+        return True
+    if type(value) is float:
+        return value == value
+    return type(value) is int and -_MAX_EXACT_INT <= value <= _MAX_EXACT_INT
+
+
+def _exact_text(value):
+    return type(value) is str and "\0" not in value
+
+
+def _encodable_observation(observation):
+    timestamp = observation.get('timestamp')
+    return (all(_exact_number(observation.get(name)) for name in _OBSERVATION_NUMBERS)
+            and _exact_text(observation.get('conditions')) and _exact_text(observation.get('location'))
+            and (timestamp is None or type(timestamp) is datetime.datetime and timestamp.tzinfo is None))
+
+
+def _encodable_forecast(forecast_data):
+    return 0 < len(forecast_data) <= 0xFFFF and all(
+        isinstance(day, DailyForecast) and type(day.get('date')) is datetime.date
+        and _exact_text(day.get('conditions'))
+        and all(_exact_number(day.get(name)) for name in _FORECAST_NUMBERS)
+        for day in forecast_data
+    )
+
+
+def _restore(value, integral):
+    if value != value:
+        return None
+    return int(value) if integral else value
+
+
+def _date(day, _dates={}):
+    # A cache holds a few weeks of distinct dates; share the objects
+    date = _dates.get(day)
+    if date is None:
+        date = _dates[day] = datetime.date.fromordinal(day + EPOCH_ORDINAL)
+    return date
+
+
+def _intern(strings, index, value):
+    position = index.get(value)
+    if position is None:
+        position = index[value] = len(strings)
+        strings.append(value)
+    return position
+
+
+def _payload(kind, count, records, strings):
+    table = "\0".join(strings).encode("utf-8")
+    return HEADER.pack(MAGIC, SCHEMA_VERSION, kind, count, len(table)) + records + table
+
+
+def _timestamp_us(value):
+    if value is None:
+        return _NO_TIMESTAMP
+    if value.tzinfo is not None:
+        value = value.astimezone().replace(tzinfo=None)
+    return (value - _EPOCH) // datetime.timedelta(microseconds=1)
+
+
+def encode_observation(observation):
+    strings, index = [], {}
+    numbers = [observation.get(name) for name in _OBSERVATION_NUMBERS]
+    record = OBSERVATION_RECORD.pack(
+        *(_number(value) for value in numbers),
+        _timestamp_us(observation.get('timestamp')),
+        _intern(strings, index, observation.get('conditions') or ""),
+        _intern(strings, index, observation.get('location') or ""),
+        _int_mask(numbers),
+    )
+    return _payload(OBSERVATION, 1, record, strings)
+
+
+def encode_forecast(forecast_data):
+    strings, index = [], {}
+    records = bytearray()
+    for day in forecast_data:
+        numbers = [day.get(name) for name in _FORECAST_NUMBERS]
+        records += FORECAST_RECORD.pack(
+            day['date'].toordinal() - EPOCH_ORDINAL,
+            *(_number(value) for value in numbers),
+            _intern(strings, index, day.get('conditions') or ""),
+            _int_mask(numbers),
+        )
+    return _payload(FORECAST, len(forecast_data), bytes(records), strings)
+
+
+def _header(data, kind=None):
+    """
+    Validate a payload header; returns (kind, count, string table)
+    """
+    if len(data) < HEADER.size:
+        raise CodecError("Payload too short")
+    magic, version, found, count, table_size = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise CodecError("Not a weather record payload")
+    if version != SCHEMA_VERSION:
+        raise CodecError(f"Unsupported schema version {version} (expected {SCHEMA_VERSION})")
+    if kind is not None and found != kind:
+        raise CodecError(f"Expected record kind {kind}, got {found}")
+    record = OBSERVATION_RECORD if found == OBSERVATION else FORECAST_RECORD
+    end = HEADER.size + count * record.size
+    if len(data) != end + table_size:
+        raise CodecError("Payload length does not match its header")
+    strings = bytes(data[end:]).decode("utf-8").split("\0")
+    return found, count, strings
+
+
+def decode_observation(data):
+    _, _, strings = _header(data, OBSERVATION)
+    (temp, humidity, wind_speed, rainfall_1h, rainfall_24h,
+     timestamp, conditions, location, mask) = OBSERVATION_RECORD.unpack_from(data, HEADER.size)
+    return Observation(
+        _restore(temp, mask & 1),
+        _restore(humidity, mask & 2),
+        strings[conditions],
+        _restore(wind_speed, mask & 4),
+        strings[location],
+        None if timestamp == _NO_TIMESTAMP else _EPOCH + datetime.timedelta(microseconds=timestamp),
+        _restore(rainfall_1h, mask & 8),
+        _restore(rainfall_24h, mask & 16),
+    )
+
+
+def decode_forecast(data):
+    _, count, strings = _header(data, FORECAST)
+    end = HEADER.size + count * FORECAST_RECORD.size
+    forecast_data = []
+    # Unrolled rather than going through _restore per field: this is the hot disk-tier path
+    for day, high, low, avg, rainfall, humidity, conditions, mask in \
+            FORECAST_RECORD.iter_unpack(memoryview(data)[HEADER.size:end]):
+        if mask:
+            if mask & 1: high = int(high)
+            if mask & 2: low = int(low)
+            if mask & 4: avg = int(avg)
+            if mask & 8: rainfall = int(rainfall)
+            if mask & 16: humidity = int(humidity)
+        forecast_data.append(DailyForecast(
+            _date(day),
+            None if high != high else high,
+            None if low != low else low,
+            None if avg != avg else avg,
+            strings[conditions],
+            None if rainfall != rainfall else rainfall,
+            None if humidity != humidity else humidity,
+        ))
+    return forecast_data
+
+
+@functools.lru_cache(maxsize=None)
+def forecast_dtype():
+    """
+    NumPy structured dtype matching FORECAST_RECORD
+    """
+    import numpy as np
+
+    return np.dtype([('date', '<i4'), ('temp_high', '<f8'), ('temp_low', '<f8'), ('temp_avg', '<f8'),
+                     ('rainfall', '<f8'), ('humidity', '<f8'), ('conditions', '<u2'), ('int_mask', 'u1')])
+
+
+def forecast_array(data):
+    """
+    View an encoded forecast's days as a NumPy structured array without copying
+
+    Returns:
+        Tuple of (structured array over the payload's buffer, condition labels)
+    """
+    import numpy as np
+
+    _, count, strings = _header(data, FORECAST)
+    return np.frombuffer(data, dtype=forecast_dtype(), count=count, offset=HEADER.size), strings
+
+
+def read_forecasts(payloads):
+    """
+    Read many encoded forecasts into one NumPy structured array
+
+    The record bytes are gathered with a single join and viewed with a
+    single frombuffer, so the cost per payload is little more than
+    checking its header.
+
+    Returns:
+        Tuple of (records of every payload back to back, days per payload,
+        condition labels); records['conditions'] index into the labels
+    """
+    import numpy as np
+
+    chunks, counts, remap, bases, labels = [], [], [], [], {}
+    for payload in payloads:
+        _, count, strings = _header(payload, FORECAST)
+        chunks.append(memoryview(payload)[HEADER.size:HEADER.size + count * FORECAST_RECORD.size])
+        counts.append(count)
+        bases.append(len(remap))
+        remap.extend(labels.setdefault(name, len(labels)) for name in strings)
+
+    records = np.frombuffer(bytearray().join(chunks), dtype=forecast_dtype())
+    if len(records):
+        # Payload-local string indexes -> indexes into the shared labels
+        records['conditions'] = np.array(remap, dtype=np.uint16)[np.repeat(bases, counts) + records['conditions']]
+    return records, counts, list(labels)
+
+
+def encode(value):
+    """
+    Encode an Observation or a forecast list; returns None for anything else,
+    and for records the format cannot round-trip exactly
+    """
+    if isinstance(value, Observation):
+        return encode_observation(value) if _encodable_observation(value) else None
+    if isinstance(value, list) and _encodable_forecast(value):
+        return encode_forecast(value)
+    return None
+
+
+def decode(data):
+    kind = HEADER.unpack_from(data)[2] if len(data) >= HEADER.size else None
+    if kind == OBSERVATION:
+        return decode_observation(data)
+    if kind == FORECAST:
+        return decode_forecast(data)
+    _header(data)
+    raise CodecError(f"Unknown record kind {kind}")
+
+
+def dumps(value):
+    """
+    Serialize a cache value: weather records in the binary format, anything else pickled
+    """
+    data = encode(value)
+    return data if data is not None else pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def loads(data):
+    if bytes(data[:2]) == MAGIC:
+        return decode(data)
+    return pickle.loads(data)
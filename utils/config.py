@@ -0,0 +1,26 @@
+import os
+
+_loaded = False
+
+
+def load_config():
+    """
+    Load the .env file into the environment, once per process
+    """
+    global _loaded
+    if _loaded:
+        return
+    _loaded = True
+    try:
+        from dotenv import load_dotenv
+    except ImportError:  # python-dotenv is optional outside development
+        return
+    load_dotenv()
+
+
+def getenv(name, default=None):
+    """
+    Read a setting from the environment, loading .env first if needed
+    """
+    load_config()
+    return os.getenv(name, default)
@@ -0,0 +1,227 @@
+import bisect
+import csv
+import difflib
+import os
+import re
+from array import array
+from collections import namedtuple
+
+from utils.config import getenv
+from utils.geohash import tile_key
+
+# Offline gazetteer (name, state, country, lat, lon), ordered so the most
+# populous place wins when a bare city name is ambiguous
+GAZETTEER_PATH = getenv(
+    "TURBOLAWN_GAZETTEER", os.path.join(os.path.dirname(__file__), "data", "gazetteer.csv")
+)
+
+Place = namedtuple('Place', ['name', 'state', 'country', 'lat', 'lon'])
+
+US_STATES = {
+    'alabama': 'al', 'alaska': 'ak', 'arizona': 'az', 'arkansas': 'ar', 'california': 'ca',
+    'colorado': 'co', 'connecticut': 'ct', 'delaware': 'de', 'district of columbia': 'dc',
+    'florida': 'fl', 'georgia': 'ga', 'hawaii': 'hi', 'idaho': 'id', 'illinois': 'il',
+    'indiana': 'in', 'iowa': 'ia', 'kansas': 'ks', 'kentucky': 'ky', 'louisiana': 'la',
+    'maine': 'me', 'maryland': 'md', 'massachusetts': 'ma', 'michigan': 'mi', 'minnesota': 'mn',
+    'mississippi': 'ms', 'missouri': 'mo', 'montana': 'mt', 'nebraska': 'ne', 'nevada': 'nv',
+    'new hampshire': 'nh', 'new jersey': 'nj', 'new mexico': 'nm', 'new york': 'ny',
+    'north carolina': 'nc', 'north dakota': 'nd', 'ohio': 'oh', 'oklahoma': 'ok', 'oregon': 'or',
+    'pennsylvania': 'pa', 'rhode island': 'ri', 'south carolina': 'sc', 'south dakota': 'sd',
+    'tennessee': 'tn', 'texas': 'tx', 'utah': 'ut', 'vermont': 'vt', 'virginia': 'va',
+    'washington': 'wa', 'west virginia': 'wv', 'wisconsin': 'wi', 'wyoming': 'wy',
+}
+
+_STATE_CODES = frozenset(US_STATES.values())
+
+# Trailing country names that add nothing for US places
+_US_SUFFIXES = [('united', 'states', 'of', 'america'), ('united', 'states'), ('usa',), ('us',)]
+
+_COORDINATES = re.compile(r"^\s*(-?\d+(?:\.\d+)?)\s*,\s*(-?\d+(?:\.\d+)?)\s*$")
+
+
+def tokenize(location):
+    """
+    Split a free-text location into lowercase tokens with state names abbreviated
+
+    "Austin, Texas, USA", "austin,tx" and "Austin TX " all become ['austin', 'tx'].
+    """
+    tokens = re.sub(r"[^\w\s]", " ", location.casefold()).split()
+    tokens = ['st' if token == 'saint' else token for token in tokens]
+
+    for suffix in _US_SUFFIXES:
+        if len(tokens) > len(suffix) and tuple(tokens[-len(suffix):]) == suffix:
+            tokens = tokens[:-len(suffix)]
+            break
+
+    # Only treat a trailing state name as a state when a city name precedes it
+    for size in (3, 2, 1):
+        if len(tokens) > size:
+            abbreviation = US_STATES.get(" ".join(tokens[-size:]))
+            if abbreviation:
+                tokens = tokens[:-size] + [abbreviation]
+                break
+
+    return tokens
+
+
+def parse_coordinates(location):
+    """
+    Return (lat, lon) if the location is a "lat,lon" string, else None
+    """
+    match = _COORDINATES.match(location)
+    if match is None:
+        return None
+    lat, lon = float(match.group(1)), float(match.group(2))
+    if -90 <= lat <= 90 and -180 <= lon <= 180:
+        return lat, lon
+    return None
+
+
+def coordinate_key(lat, lon):
+    """
+    Snap coordinates to their weather tile and return its canonical "lat,lon" key
+
+    See utils.geohash; nearby lawns share a key and so one cache entry.
+    """
+    return tile_key(lat, lon)
+
+
+class GeocodeIndex:
+    """
+    Compact in-memory index over an offline gazetteer
+
+    Lookup keys ("austin tx", "austin") are kept in one sorted list so exact
+    matches and prefix searches are a binary search; coordinates live in
+    flat arrays indexed by place number.
+    """
+
+    def __init__(self, places):
+        self.names = []
+        self.lats = array('d')
+        self.lons = array('d')
+
+        entries = {}
+        for number, place in enumerate(places):
+            self.names.append((place.name, place.state, place.country))
+            self.lats.append(place.lat)
+            self.lons.append(place.lon)
+
+            name = " ".join(tokenize(place.name))
+            state, country = place.state.casefold(), place.country.casefold()
+            # Earlier (more populous) places keep ambiguous keys
+            for key in (name, f"{name} {state}", f"{name} {country}", f"{name} {state} {country}"):
+                entries.setdefault(" ".join(key.split()), number)
+
+        self.keys = sorted(entries)
+        self.places = array('I', (entries[key] for key in self.keys))
+
+    @classmethod
+    def from_csv(cls, path=GAZETTEER_PATH):
+        with open(path, newline="", encoding="utf-8") as f:
+            places = [
+                Place(row['name'], row['state'], row['country'], float(row['lat']), float(row['lon']))
+                for row in csv.DictReader(f)
+            ]
+        return cls(places)
+
+    def place(self, number):
+        name, state, country = self.names[number]
+        return Place(name, state, country, self.lats[number], self.lons[number])
+
+    def lookup(self, location):
+        """
+        Return the Place matching a location exactly (after normalization), or None
+        """
+        key = " ".join(tokenize(location))
+        i = bisect.bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key:
+            return self.place(self.places[i])
+        return None
+
+    def search(self, text, limit=5):
+        """
+        Fuzzy search for autocomplete: prefix matches first, then close spellings
+        """
+        key = " ".join(tokenize(text))
+        if not key:
+            return []
+
+        found = []
+        i = bisect.bisect_left(self.keys, key)
+        while i < len(self.keys) and self.keys[i].startswith(key) and len(found) < limit:
+            if self.places[i] not in found:
+                found.append(self.places[i])
+            i += 1
+
+        if not found:
+            # Only compare against keys sharing the first letter to keep this cheap
+            lo = bisect.bisect_left(self.keys, key[0])
+            hi = bisect.bisect_left(self.keys, chr(ord(key[0]) + 1))
+            for match in difflib.get_close_matches(key, self.keys[lo:hi], n=limit, cutoff=0.8):
+                number = self.places[bisect.bisect_left(self.keys, match)]
+                if number not in found:
+                    found.append(number)
+
+        return [self.place(number) for number in found]
+
+
+_index = None
+
+
+def get_index():
+    """
+    Return the gazetteer index, loading it on first use
+    """
+    global _index
+    if _index is None:
+        _index = GeocodeIndex.from_csv()
+    return _index
+
+
+def canonical_location(location):
+    """
+    Map a free-text location to a canonical key
+
+    Coordinates and places found in the gazetteer are snapped to a weather
+    tile and become its "lat,lon" key, so "Austin, TX", "austin,tx",
+    "Austin TX " and coordinates a few blocks away share one key. Anything else
+    falls back to a whitespace- and case-normalized string.
+    """
+    coordinates = parse_coordinates(location)
+    if coordinates is not None:
+        return coordinate_key(*coordinates)
+
+    place = get_index().lookup(location)
+    if place is not None:
+        return coordinate_key(place.lat, place.lon)
+
+    location = " ".join(location.split())
+    return re.sub(r"\s*,\s*", ", ", location).strip(", ").casefold()
+
+
+def place_label(place):
+    """
+    Display form of a place, e.g. "Austin, TX" or "Toronto, ON, CA"
+    """
+    parts = [place.name, place.state] + ([place.country] if place.country != "US" else [])
+    return ", ".join(part for part in parts if part)
+
+
+def suggest_locations(text, limit=5):
+    """
+    Gazetteer places for a partial or misspelled location, for location entry
+
+    Returns an empty list for coordinates and for text that already names a
+    known place exactly. When the text ends in a US state, only places in
+    that state are suggested, so "Columbus, GA" is never offered Columbus, OH.
+    """
+    if not text or parse_coordinates(text) is not None:
+        return []
+    index = get_index()
+    if index.lookup(text) is not None:
+        return []
+    places = index.search(text, limit)
+    tokens = tokenize(text)
+    if len(tokens) > 1 and tokens[-1] in _STATE_CODES:
+        places = [place for place in places if place.state.casefold() == tokens[-1]]
+    return places
\ No newline at end of file
@@ -0,0 +1,174 @@
+import math
+
+from utils.config import getenv
+
+MAX_PRECISION = 12
+
+
+def _tile_precision(value):
+    """
+    Parse TURBOLAWN_TILE_PRECISION, failing at startup rather than on the first tile lookup
+    """
+    try:
+        precision = int(value)
+    except (TypeError, ValueError):
+        precision = None
+    if precision is None or not 1 <= precision <= MAX_PRECISION:
+        raise ValueError(f"TURBOLAWN_TILE_PRECISION must be an integer from 1 to {MAX_PRECISION}, got {value!r}")
+    return precision
+
+
+# Geohash length of the weather tiles lawns are snapped to; every lawn in a
+# tile shares one cache entry and one upstream fetch. 5 is about 4.9 x 4.9 km,
+# 6 about 1.2 x 0.6 km (see CELL_SIZES_KM)
+TILE_PRECISION = _tile_precision(getenv("TURBOLAWN_TILE_PRECISION", "5"))
+
+# Approximate tile width x height at the equator, by precision
+CELL_SIZES_KM = {
+    1: (5000, 5000), 2: (1250, 625), 3: (156, 156), 4: (39.1, 19.5), 5: (4.89, 4.89),
+    6: (1.22, 0.61), 7: (0.153, 0.153), 8: (0.038, 0.019),
+}
+
+BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: value for value, char in enumerate(BASE32)}
+
+
+def bit_split(precision):
+    """
+    Return (longitude bits, latitude bits) for a geohash of this length
+    """
+    if not 1 <= precision <= MAX_PRECISION:
+        raise ValueError(f"Geohash precision must be between 1 and {MAX_PRECISION}, got {precision}")
+    bits = 5 * precision
+    return (bits + 1) // 2, bits // 2
+
+
+def key_decimals(precision):
+    """
+    Decimal places in tile-center keys of this precision
+
+    At least 6 (about 0.1 m), and enough that rounding a center moves it by
+    far less than half a tile, so a key always snaps back to its own tile
+    and neighbouring tiles never share a key (8 at precision 12).
+    """
+    lon_bits, lat_bits = bit_split(precision)
+    smallest = min(180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits))
+    return max(6, math.ceil(-math.log10(smallest)) + 1)
+
+
+def _quantize(value, low, high, bits):
+    cell = int((value - low) / (high - low) * (1 << bits))
+    return min(max(cell, 0), (1 << bits) - 1)
+
+
+def _spread(x):
+    """
+    Move bit k of a 32-bit integer to bit 2k (works on ints and NumPy int64 arrays)
+    """
+    x = (x | (x << 16)) & 0x0000FFFF0000FFFF
+    x = (x | (x << 8)) & 0x00FF00FF00FF00FF
+    x = (x | (x << 4)) & 0x0F0F0F0F0F0F0F0F
+    x = (x | (x << 2)) & 0x3333333333333333
+    return (x | (x << 1)) & 0x5555555555555555
+
+
+def _squash(x):
+    """
+    Inverse of _spread: gather bits 0, 2, 4, ... into the low 32 bits
+    """
+    x &= 0x5555555555555555
+    x = (x | (x >> 1)) & 0x3333333333333333
+    x = (x | (x >> 2)) & 0x0F0F0F0F0F0F0F0F
+    x = (x | (x >> 4)) & 0x00FF00FF00FF00FF
+    x = (x | (x >> 8)) & 0x0000FFFF0000FFFF
+    return (x | (x >> 16)) & 0x00000000FFFFFFFF
+
+
+def interleave(lon_cell, lat_cell, lon_bits, lat_bits):
+    """
+    Interleave cell bits, longitude first, as geohash does
+    """
+    if lon_bits == lat_bits:
+        return (_spread(lon_cell) << 1) | _spread(lat_cell)
+    return _spread(lon_cell) | (_spread(lat_cell) << 1)
+
+
+def _deinterleave(code, lon_bits, lat_bits):
+    if lon_bits == lat_bits:
+        return _squash(code >> 1), _squash(code)
+    return _squash(code), _squash(code >> 1)
+
+
+def encode_int(lat, lon, precision=TILE_PRECISION):
+    """
+    Encode coordinates as an integer geohash (5 bits per character)
+
+    Integer codes sort like their string forms, and tiles of a coarser
+    precision are a right shift away.
+    """
+    lon_bits, lat_bits = bit_split(precision)
+    return interleave(_quantize(lon, -180.0, 180.0, lon_bits), _quantize(lat, -90.0, 90.0, lat_bits),
+                       lon_bits, lat_bits)
+
+
+def to_string(code, precision=TILE_PRECISION):
+    chars = []
+    for _ in range(precision):
+        chars.append(BASE32[code & 31])
+        code >>= 5
+    return "".join(reversed(chars))
+
+
+def from_string(geohash):
+    code = 0
+    for char in geohash.casefold():
+        try:
+            code = (code << 5) | _DECODE[char]
+        except KeyError:
+            raise ValueError(f"Invalid geohash: {geohash!r}") from None
+    return code
+
+
+def encode(lat, lon, precision=TILE_PRECISION):
+    """
+    Encode coordinates as a geohash string, e.g. (30.2672, -97.7431) -> "9v6kp"
+    """
+    return to_string(encode_int(lat, lon, precision), precision)
+
+
+def bounds(geohash):
+    """
+    Return the (lat_min, lat_max, lon_min, lon_max) of a geohash tile
+    """
+    lon_bits, lat_bits = bit_split(len(geohash))
+    lon_cell, lat_cell = _deinterleave(from_string(geohash), lon_bits, lat_bits)
+    lat_size, lon_size = 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+    lat_min, lon_min = -90.0 + lat_cell * lat_size, -180.0 + lon_cell * lon_size
+    return lat_min, lat_min + lat_size, lon_min, lon_min + lon_size
+
+
+def center(geohash):
+    """
+    Return the (lat, lon) at the middle of a geohash tile
+    """
+    lat_min, lat_max, lon_min, lon_max = bounds(geohash)
+    return (lat_min + lat_max) / 2, (lon_min + lon_max) / 2
+
+
+def center_key(geohash):
+    """
+    Return the center of a geohash tile as a "lat,lon" location key
+    """
+    lat, lon = center(geohash)
+    decimals = key_decimals(len(geohash))
+    return f"{lat:.{decimals}f},{lon:.{decimals}f}"
+
+
+def tile_key(lat, lon, precision=TILE_PRECISION):
+    """
+    Snap coordinates to their tile and return the tile center as a "lat,lon" key
+
+    Every point in a tile maps to the same key, and the key is still a
+    coordinate pair, so it can be sent to the weather API as-is.
+    """
+    return center_key(encode(lat, lon, precision))
@@ -0,0 +1,166 @@
+import datetime
+import os
+import tempfile
+import time
+from urllib.parse import quote, unquote
+
+import numpy as np
+
+from utils.config import getenv
+
+# Root of the on-disk history store; set to "" to disable recording
+HISTORY_DIR = getenv("TURBOLAWN_HISTORY_DIR", os.path.join(tempfile.gettempdir(), "turbolawn-history"))
+
+# Hours of observations needed in a window before measured rainfall replaces the estimate
+MIN_COVERAGE_HOURS = 18
+
+OBSERVATION, FORECAST = 0, 1
+
+# One fixed-width record per sample; files are plain arrays of these, so they can be memory-mapped
+RECORD = np.dtype([
+    ('ts', '<f8'),         # Observation time, or the forecast day (local midnight)
+    ('issued', '<f8'),     # When the sample was fetched
+    ('kind', 'u1'),        # OBSERVATION or FORECAST
+    ('temp', '<f4'),       # Current temperature, or forecast high
+    ('temp_low', '<f4'),   # Forecast low (NaN for observations)
+    ('humidity', '<f4'),
+    ('rainfall', '<f4'),   # Last hour's rain for observations, daily total for forecasts
+    ('wind_speed', '<f4'),
+])
+
+
+class HistoryStore:
+    """
+    Append-only time-series store partitioned by location and day
+
+    Each location gets a directory and each UTC day a file of RECORD rows:
+
+        <root>/<location>/<YYYY-MM-DD>.bin
+
+    Appends are single O_APPEND writes, so several processes can record into
+    the same store. Reads memory-map only the day files a query touches.
+    """
+
+    def __init__(self, root=HISTORY_DIR):
+        self.root = root
+
+    def _location_dir(self, location):
+        return os.path.join(self.root, quote(location, safe=''))
+
+    def _day_path(self, location, day):
+        return os.path.join(self._location_dir(location), f"{day.isoformat()}.bin")
+
+    def append(self, location, records):
+        """
+        Append an array of RECORD rows, splitting them into their day partitions
+        """
+        records = np.asarray(records, dtype=RECORD)
+        days = (records['ts'] // 86400).astype(np.int64)
+        os.makedirs(self._location_dir(location), exist_ok=True)
+
+        for day in np.unique(days):
+            path = self._day_path(location, datetime.date(1970, 1, 1) + datetime.timedelta(days=int(day)))
+            fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, records[days == day].tobytes())
+            finally:
+                os.close(fd)
+
+    def record_observation(self, location, weather_data):
+        """
+        Persist one current-weather sample as returned by get_weather_data
+        """
+        timestamp = weather_data['timestamp'].timestamp()
+        record = np.array([(
+            timestamp, timestamp, OBSERVATION, weather_data['temp'], np.nan, weather_data['humidity'],
+            weather_data.get('rainfall_1h', 0), weather_data.get('wind_speed', np.nan),
+        )], dtype=RECORD)
+        self.append(location, record)
+
+    def record_forecast(self, location, forecast_data, issued=None):
+        """
+        Persist daily forecast summaries as returned by get_forecast
+        """
+        issued = issued or time.time()
+        records = np.array([(
+            time.mktime(day['date'].timetuple()), issued, FORECAST, day['temp_high'], day['temp_low'],
+            day['humidity'], day['rainfall'], np.nan,
+        ) for day in forecast_data], dtype=RECORD)
+        if len(records):
+            self.append(location, records)
+
+    def query(self, location, start, end, kind=None):
+        """
+        Return all records with start <= ts < end (Unix timestamps), oldest first
+        """
+        first = datetime.date.fromtimestamp(start) - datetime.timedelta(days=1)
+        last = datetime.date.fromtimestamp(end) + datetime.timedelta(days=1)
+        parts = []
+
+        day = first
+        while day <= last:
+            path = self._day_path(location, day)
+            # Ignore a trailing partial record from a writer that is mid-append
+            size = os.path.getsize(path) // RECORD.itemsize if os.path.exists(path) else 0
+            if size:
+                records = np.memmap(path, dtype=RECORD, mode='r', shape=(size,))
+                mask = (records['ts'] >= start) & (records['ts'] < end)
+                if kind is not None:
+                    mask &= records['kind'] == kind
+                parts.append(np.array(records[mask]))
+            day += datetime.timedelta(days=1)
+
+        if not parts:
+            return np.empty(0, dtype=RECORD)
+        records = np.concatenate(parts)
+        return records[np.argsort(records['ts'], kind='stable')]
+
+    def rainfall(self, location, start, end):
+        """
+        Measured rainfall between two timestamps from recorded observations
+
+        Each observation reports the last hour's rain, and several samples can
+        fall in the same hour, so this takes the largest report per hour and
+        sums over hours.
+
+        Returns:
+            Tuple of (total rainfall, number of hours with observations)
+        """
+        observations = self.query(location, start, end, kind=OBSERVATION)
+        if not len(observations):
+            return 0.0, 0
+        hours = (observations['ts'] // 3600).astype(np.int64)
+        unique_hours, index = np.unique(hours, return_inverse=True)
+        per_hour = np.zeros(len(unique_hours))
+        np.maximum.at(per_hour, index.ravel(), observations['rainfall'].astype(float))
+        return float(per_hour.sum()), len(unique_hours)
+
+    def rainfall_24h(self, location, now=None):
+        """
+        Rainfall over the last 24 hours, or None if there is too little history
+
+        Hours without observations are assumed to rain at the observed average.
+        """
+        now = now or time.time()
+        total, hours = self.rainfall(location, now - 24 * 3600, now)
+        if hours < MIN_COVERAGE_HOURS:
+            return None
+        return round(total * 24 / hours, 2)
+
+    def locations(self):
+        if not os.path.isdir(self.root):
+            return []
+        return [unquote(name) for name in os.listdir(self.root)]
+
+
+_store = None
+
+
+def get_history_store():
+    """
+    Return the default history store, or None if recording is disabled
+    """
+    global _store
+    if _store is None and HISTORY_DIR:
+        _store = HistoryStore(HISTORY_DIR)
+    return _store
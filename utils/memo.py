@@ -0,0 +1,229 @@
+import functools
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from collections.abc import Mapping
+
+from utils import metrics
+from utils.config import getenv
+
+# Memoized results kept per process (and cached weather snapshots fingerprinted)
+MEMO_SIZE = int(getenv("TURBOLAWN_MEMO_SIZE", "4096"))
+
+_SCALARS = (str, int, float, bool, type(None))
+
+
+def _jsonable(value):
+    # Records (utils.models) hash like the dicts they replace
+    if isinstance(value, Mapping):
+        return dict(value)
+    return str(value)
+
+
+def fingerprint(value):
+    """
+    Content hash of JSON-like data (dicts, records, lists, strings, numbers, dates)
+    """
+    data = json.dumps(value, sort_keys=True, default=_jsonable, separators=(",", ":"))
+    return hashlib.blake2b(data.encode("utf-8"), digest_size=16).digest()
+
+
+class MemoStats:
+    """
+    Hit/miss counters for a Memo
+
+    bypassed counts calls made with inputs that did not come from the
+    weather cache, which are computed directly rather than hashed.
+    """
+    __slots__ = ('hits', 'misses', 'bypassed', 'evictions', 'invalidations')
+
+    def __init__(self):
+        self.hits = 0
+        self.misses = 0
+        self.bypassed = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+
+class Memo:
+    """
+    Content-addressed LRU of results computed from cached weather snapshots
+
+    Every value the weather cache stores is fingerprinted once, when it is
+    stored, and remembered by identity; the cache hands the same objects to
+    every later reader, so looking up a snapshot's fingerprint is a dict
+    lookup. A memoized call is keyed by the fingerprints of its arguments
+    plus a context (such as today's date), so identical inputs share one
+    result across reruns, sessions and requests. When a cache entry is
+    replaced with different content, results computed from the old content
+    are dropped.
+
+    Arguments that are neither scalars nor known snapshots would cost more
+    to hash than most of these functions cost to run, so such calls are
+    computed without memoizing.
+    """
+
+    def __init__(self, maxsize=MEMO_SIZE):
+        self.maxsize = maxsize
+        self.stats = MemoStats()
+        # key -> (result, fingerprints it depends on)
+        self._results = OrderedDict()
+        # fingerprint -> keys of the results computed from it
+        self._dependents = {}
+        # id(snapshot) -> (snapshot, fingerprint); holding the object keeps its id unique
+        self._snapshots = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _known(self, value):
+        entry = self._snapshots.get(id(value))
+        if entry is not None and entry[0] is value:
+            return entry[1]
+        return None
+
+    def remember(self, value):
+        """
+        Fingerprint a cached snapshot so calls on it can be memoized
+
+        Returns:
+            The snapshot's fingerprint
+        """
+        digest = fingerprint(value)
+        with self._lock:
+            self._snapshots[id(value)] = (value, digest)
+            self._snapshots.move_to_end(id(value))
+            while len(self._snapshots) > self.maxsize:
+                self._snapshots.popitem(last=False)
+        return digest
+
+    def invalidate(self, digest):
+        """
+        Drop every result computed from the snapshot with this fingerprint
+        """
+        with self._lock:
+            for key in self._dependents.pop(digest, ()):
+                if self._results.pop(key, None) is not None:
+                    self.stats.invalidations += 1
+
+    def on_store(self, endpoint, key, old_value, new_value):
+        """
+        TieredCache listener: fingerprint new snapshots and invalidate replaced ones
+        """
+        new_digest = self.remember(new_value) if isinstance(new_value, (Mapping, list)) else None
+        if isinstance(old_value, (Mapping, list)):
+            with self._lock:
+                old_digest = self._known(old_value)
+                self._snapshots.pop(id(old_value), None)
+            old_digest = old_digest or fingerprint(old_value)
+            if old_digest != new_digest:
+                self.invalidate(old_digest)
+
+    def _key(self, name, args, kwargs, context):
+        """
+        Return (key, snapshot fingerprints) for a call, or (None, None) if an
+        argument is neither a scalar nor a known snapshot
+        """
+        parts = [name, context]
+        if kwargs:
+            parts.append(tuple(sorted(kwargs)))
+            args = (*args, *(kwargs[keyword] for keyword in sorted(kwargs)))
+        digests = []
+        snapshots = self._snapshots
+        for value in args:
+            if isinstance(value, _SCALARS):
+                parts.append(value)
+                continue
+            entry = snapshots.get(id(value))
+            if entry is None or entry[0] is not value:
+                return None, None
+            parts.append(entry[1])
+            digests.append(entry[1])
+        return tuple(parts), digests
+
+    def call(self, name, func, args, kwargs, context=()):
+        """
+        Return func(*args, **kwargs), reusing the result for identical inputs
+        """
+        with self._lock:
+            key, digests = self._key(name, args, kwargs, context)
+            if key is None:
+                self.stats.bypassed += 1
+            else:
+                result = self._results.get(key, self)
+                if result is not self:
+                    self._results.move_to_end(key)
+                    self.stats.hits += 1
+                    metrics.incr("memo_requests", function=name, result="hit")
+                    return result[0]
+                self.stats.misses += 1
+
+        value = func(*args, **kwargs)
+        if key is None:
+            return value
+        metrics.incr("memo_requests", function=name, result="miss")
+
+        with self._lock:
+            self._results[key] = (value, digests)
+            for digest in digests:
+                self._dependents.setdefault(digest, set()).add(key)
+            while len(self._results) > self.maxsize:
+                evicted, (_, evicted_digests) = self._results.popitem(last=False)
+                for digest in evicted_digests:
+                    dependents = self._dependents.get(digest)
+                    if dependents is not None:
+                        dependents.discard(evicted)
+                        if not dependents:
+                            del self._dependents[digest]
+                self.stats.evictions += 1
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._results.clear()
+            self._dependents.clear()
+            self._snapshots.clear()
+
+    def __len__(self):
+        return len(self._results)
+
+
+_memo = None
+_memo_lock = threading.Lock()
+
+
+def get_memo():
+    """
+    Return the process-wide memo (the default cache subscribes it when created)
+    """
+    global _memo
+    if _memo is None:
+        with _memo_lock:
+            if _memo is None:
+                _memo = Memo()
+    return _memo
+
+
+def memoize(name, context=None, memo=None):
+    """
+    Memoize a pure function of weather snapshots and scalars
+
+    context, if given, returns extra key parts for inputs the function
+    reads implicitly, such as the current date. Results are shared between
+    callers, so treat them as read-only.
+
+    The wrapper exposes the original function as uncached.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            # Not `memo or ...`: an empty Memo is falsy
+            target = memo if memo is not None else get_memo()
+            return target.call(name, func, args, kwargs, context() if context else ())
+
+        wrapper.uncached = func
+        return wrapper
+
+    return decorator
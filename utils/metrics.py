@@ -0,0 +1,366 @@
+import contextvars
+import functools
+import logging
+import threading
+import time
+from collections import deque
+
+from utils.config import getenv
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated sinks that receive finished traces: "ring", "log", or "off" to disable
+# instrumentation entirely (counters, histograms and the Prometheus endpoint included)
+METRICS = getenv("TURBOLAWN_METRICS", "off")
+# Number of traces (Dashboard renders, service requests) kept by the ring buffer sink
+METRICS_RING_SIZE = int(getenv("TURBOLAWN_METRICS_RING_SIZE", "50"))
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+_current_trace = contextvars.ContextVar('turbolawn_trace', default=None)
+
+
+class Histogram:
+    """
+    Cumulative bucket counts plus sum and count, Prometheus-style
+    """
+    __slots__ = ('counts', 'sum', 'count')
+
+    def __init__(self):
+        self.counts = [0] * len(BUCKETS)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(BUCKETS):
+            if value <= bound:
+                self.counts[i] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(BUCKETS, self.counts):
+            total += count
+            yield bound, total
+
+
+class Trace:
+    """
+    Spans recorded while handling one unit of work (a render or a request)
+    """
+    __slots__ = ('name', 'started_at', 'start', 'duration', 'spans')
+
+    def __init__(self, name):
+        self.name = name
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.spans = []
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            'started_at': self.started_at,
+            'duration_ms': round(self.duration * 1000, 3),
+            'spans': [
+                {'name': name, 'labels': labels, 'offset_ms': round(offset * 1000, 3),
+                 'duration_ms': round(duration * 1000, 3)}
+                for name, labels, offset, duration in self.spans
+            ],
+        }
+
+
+class RingBufferSink:
+    """
+    Keeps the most recent traces in memory, newest last
+    """
+
+    def __init__(self, size=METRICS_RING_SIZE):
+        self.traces = deque(maxlen=size)
+
+    def emit(self, trace):
+        self.traces.append(trace)
+
+    def recent(self, limit=None):
+        traces = list(self.traces)
+        return traces[-limit:] if limit else traces
+
+
+class LogSink:
+    """
+    Writes one log line per trace with the duration of each span
+    """
+
+    def __init__(self, log=logger, level=logging.INFO):
+        self.log = log
+        self.level = level
+
+    def emit(self, trace):
+        spans = ", ".join(
+            f"{name}{'(' + ','.join(map(str, labels.values())) + ')' if labels else ''} {duration * 1000:.1f}ms"
+            for name, labels, _, duration in trace.spans
+        )
+        self.log.log(self.level, "%s %.1fms: %s", trace.name, trace.duration * 1000, spans or "-")
+
+
+class _NoOp:
+    """
+    Shared stand-in for spans and traces while instrumentation is disabled
+    """
+    __slots__ = ()
+
+    def __enter__(self):
+        return None
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP = _NoOp()
+
+
+class _Span:
+    __slots__ = ('registry', 'name', 'labels', 'start')
+
+    def __init__(self, registry, name, labels):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = time.perf_counter()
+        self.registry.observe(self.name, end - self.start, **self.labels)
+        trace = _current_trace.get()
+        if trace is not None:
+            trace.spans.append((self.name, self.labels, self.start - trace.start, end - self.start))
+        return False
+
+
+class _TraceScope:
+    __slots__ = ('registry', 'trace', 'token')
+
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.trace = Trace(name)
+
+    def __enter__(self):
+        self.token = _current_trace.set(self.trace)
+        return self.trace
+
+    def __exit__(self, *exc_info):
+        _current_trace.reset(self.token)
+        self.trace.duration = time.perf_counter() - self.trace.start
+        self.registry.finish(self.trace)
+        return False
+
+
+class Registry:
+    """
+    Process-wide counters, span latency histograms and trace sinks
+
+    While disabled, span() and trace() return a shared no-op context manager
+    and incr() returns immediately, so instrumented code pays one attribute
+    check per call.
+    """
+
+    def __init__(self, sinks=(), strict=True):
+        self.enabled = False
+        self.sinks = []
+        self.counters = {}
+        self.histograms = {}
+        self._lock = threading.Lock()
+        self.configure(sinks, strict)
+
+    def configure(self, sinks, strict=True):
+        """
+        Replace the active sinks; a list of sink objects or names ("ring", "log")
+
+        An empty list or "off" disables instrumentation.
+
+        Raises:
+            ValueError: For an unknown sink name; with strict=False unknown
+                names are logged and skipped instead
+        """
+        if isinstance(sinks, str):
+            sinks = [name.strip() for name in sinks.split(",") if name.strip() and name.strip() != "off"]
+        active = []
+        for sink in sinks:
+            if isinstance(sink, str):
+                try:
+                    sink = _sink_type(sink)()
+                except ValueError as e:
+                    if strict:
+                        raise
+                    logger.warning("Ignoring metrics sink: %s", e)
+                    continue
+            active.append(sink)
+        self.sinks = active
+        self.enabled = bool(self.sinks)
+
+    def enable(self, sink):
+        """
+        Add a sink (by name or object) unless one of the same type is active; return the active one
+        """
+        sink = _sink_type(sink)() if isinstance(sink, str) else sink
+        for active in self.sinks:
+            if type(active) is type(sink):
+                return active
+        self.sinks.append(sink)
+        self.enabled = True
+        return sink
+
+    def disable(self, sink):
+        """
+        Remove active sinks of a type (given by name or class)
+        """
+        sink_type = _sink_type(sink) if isinstance(sink, str) else sink
+        self.sinks = [active for active in self.sinks if not isinstance(active, sink_type)]
+        self.enabled = bool(self.sinks)
+
+    def sink(self, sink_type):
+        """
+        Return the active sink of a type, or None
+        """
+        for active in self.sinks:
+            if isinstance(active, sink_type):
+                return active
+        return None
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+    def incr(self, name, value=1, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def observe(self, name, seconds, **labels):
+        if not self.enabled:
+            return
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(seconds)
+
+    def span(self, name, **labels):
+        """
+        Time a block, recording it in the span histogram and the current trace
+        """
+        if not self.enabled:
+            return _NOOP
+        return _Span(self, name, labels)
+
+    def trace(self, name):
+        """
+        Collect the spans of one unit of work and hand the trace to the sinks when it ends
+        """
+        if not self.enabled:
+            return _NOOP
+        return _TraceScope(self, name)
+
+    def finish(self, trace):
+        self.observe("trace", trace.duration, trace=trace.name)
+        for sink in self.sinks:
+            try:
+                sink.emit(trace)
+            except Exception as e:
+                logger.warning("Metrics sink %s failed: %s", type(sink).__name__, e)
+
+    def snapshot(self):
+        """
+        Counters and histogram summaries as plain data, for JSON endpoints
+        """
+        with self._lock:
+            counters = [(name, dict(labels), value) for (name, labels), value in self.counters.items()]
+            histograms = [(name, dict(labels), h.count, h.sum) for (name, labels), h in self.histograms.items()]
+        return {
+            'counters': [{'name': name, 'labels': labels, 'value': value}
+                         for name, labels, value in counters],
+            'histograms': [{'name': name, 'labels': labels, 'count': count, 'sum_s': round(total, 6)}
+                           for name, labels, count, total in histograms],
+        }
+
+    def render_prometheus(self, prefix="turbolawn"):
+        """
+        Render counters and histograms in the Prometheus text exposition format
+        """
+        with self._lock:
+            counters = sorted(self.counters.items())
+            histograms = sorted(
+                (key, (list(h.cumulative()), h.sum, h.count)) for key, h in self.histograms.items()
+            )
+
+        lines = []
+        declared = set()
+        for (name, labels), value in counters:
+            metric = f"{prefix}_{name}_total"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric}{_labels(labels)} {value}")
+
+        for (name, labels), (buckets, total, count) in histograms:
+            metric = f"{prefix}_{name}_seconds"
+            if metric not in declared:
+                declared.add(metric)
+                lines.append(f"# TYPE {metric} histogram")
+            for bound, cumulative in buckets:
+                lines.append(f"{metric}_bucket{_labels(labels + (('le', repr(bound)),))} {cumulative}")
+            lines.append(f"{metric}_bucket{_labels(labels + (('le', '+Inf'),))} {count}")
+            lines.append(f"{metric}_sum{_labels(labels)} {total}")
+            lines.append(f"{metric}_count{_labels(labels)} {count}")
+
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(labels, escaped)) + "}"
+
+
+_SINK_TYPES = {'ring': RingBufferSink, 'log': LogSink}
+
+
+def _sink_type(name):
+    try:
+        return _SINK_TYPES[name]
+    except KeyError:
+        raise ValueError(f"unknown sink {name!r}; valid sinks are {', '.join(sorted(_SINK_TYPES))} or off") from None
+
+
+# A typo in TURBOLAWN_METRICS is logged rather than failing every import of this module
+registry = Registry(METRICS, strict=False)
+
+span = registry.span
+trace = registry.trace
+incr = registry.incr
+
+
+def timed(name, **labels):
+    """
+    Decorator recording each call of a function as a span
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not registry.enabled:
+                return func(*args, **kwargs)
+            with _Span(registry, name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,104 @@
+import datetime
+from collections.abc import Mapping
+
+# Ordinal of 1970-01-01: date.toordinal() - EPOCH_ORDINAL is a date's epoch day,
+# the day number used by datetime64[D] and the binary cache format
+EPOCH_ORDINAL = datetime.date(1970, 1, 1).toordinal()
+
+
+class Record(Mapping):
+    """
+    Compact fixed-field record that still reads like the dict it replaces
+
+    Fields live in __slots__, so a record has no per-instance __dict__ and
+    costs a fraction of the equivalent dict. Records implement the Mapping
+    protocol (record['temp'], .get(), 'temp' in record, dict(record),
+    equality with dicts), so code written against the old dicts keeps
+    working. Fields can be reassigned with record['name'] = value, but
+    unknown keys cannot be added.
+    """
+    __slots__ = ()
+    _fields = ()
+
+    @classmethod
+    def from_dict(cls, data):
+        """
+        Build a record from a dict (or another mapping), ignoring unknown keys
+        """
+        if isinstance(data, cls):
+            return data
+        return cls(**{name: data[name] for name in cls._fields if name in data})
+
+    def as_dict(self):
+        return {name: getattr(self, name) for name in self._fields}
+
+    def __getitem__(self, key):
+        if key in self._fields:
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key not in self._fields:
+            raise KeyError(key)
+        setattr(self, key, value)
+
+    def __contains__(self, key):
+        return key in self._fields
+
+    def __iter__(self):
+        return iter(self._fields)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __reduce__(self):
+        # Positional values pickle smaller than the default slot-state dict
+        return _rebuild, (type(self), tuple(getattr(self, name) for name in self._fields))
+
+    def __repr__(self):
+        fields = ", ".join(f"{name}={getattr(self, name)!r}" for name in self._fields)
+        return f"{type(self).__name__}({fields})"
+
+
+def _rebuild(cls, values):
+    record = cls.__new__(cls)
+    for name, value in zip(cls._fields, values):
+        setattr(record, name, value)
+    return record
+
+
+class Observation(Record):
+    """
+    Current weather at a location, as returned by get_weather_data
+    """
+    __slots__ = ('temp', 'humidity', 'conditions', 'wind_speed', 'location', 'timestamp',
+                 'rainfall_1h', 'rainfall_24h')
+    _fields = __slots__
+
+    def __init__(self, temp, humidity, conditions, wind_speed=0.0, location=None, timestamp=None,
+                 rainfall_1h=0, rainfall_24h=0):
+        self.temp = temp
+        self.humidity = humidity
+        self.conditions = conditions
+        self.wind_speed = wind_speed
+        self.location = location
+        self.timestamp = timestamp
+        self.rainfall_1h = rainfall_1h
+        self.rainfall_24h = rainfall_24h
+
+
+class DailyForecast(Record):
+    """
+    One day's forecast summary, as returned in lists by get_forecast
+    """
+    __slots__ = ('date', 'temp_high', 'temp_low', 'temp_avg', 'conditions', 'rainfall', 'humidity')
+    _fields = __slots__
+
+    def __init__(self, date, temp_high, temp_low, temp_avg, conditions, rainfall=0, humidity=None):
+        self.date = date
+        self.temp_high = temp_high
+        self.temp_low = temp_low
+        self.temp_avg = temp_avg
+        self.conditions = conditions
+        self.rainfall = rainfall
+        self.humidity = humidity
@@ -0,0 +1,266 @@
+import datetime
+
+import numpy as np
+
+from utils.batch import LAWN_TYPES, MIXED, _column, forecast_matrix, lawn_type_codes, mow_day_quality
+from utils.waterbalance import REFILL_POINT, ROOT_ZONE_CAPACITY, daily_water_use
+
+# Days between mowings each lawn type is planned around, indexed by lawn type code
+MOW_INTERVAL = np.array([7, 5, 6])
+
+# Costs the planner trades off, in arbitrary "lawn care" units:
+# per day, scaled by how far end-of-day moisture is below REFILL_POINT (full cost when bone dry)
+STRESS_COST = 8.0
+# per watering session, per inch applied, and per inch running off a full root zone
+WATERING_COST = 0.5
+WATER_COST = 1.0
+RUNOFF_COST = 4.0
+# per mowing, plus up to MOW_WEATHER_COST on the worst mowing weather (see _mow_weather_cost)
+MOW_COST = 1.0
+MOW_WEATHER_COST = 5.0
+# mowing a lawn that was watered or rained on the day before
+WET_MOW_COST = 3.0
+# for every day a lawn is past its MOW_INTERVAL, per day overdue
+OVERDUE_COST = 1.5
+
+# State grid: moisture as a fraction of root-zone capacity in MOISTURE_LEVELS steps,
+# days since mowing (capped at MAX_MOW_AGE) and whether the lawn was watered yesterday
+MOISTURE_LEVELS = 21
+MAX_MOW_AGE = 14
+# Distinct weather/lawn-type groups solved at once; bounds solver memory to tens of MB
+CHUNK_GROUPS = 2048
+
+# Action codes in a plan: water + 2 * mow
+NONE, WATER, MOW, WATER_AND_MOW = 0, 1, 2, 3
+
+_LEVELS = np.linspace(0.0, 1.0, MOISTURE_LEVELS)
+_AGES = np.arange(MAX_MOW_AGE + 1)
+# Days since mowing tomorrow, by today's value and whether the lawn is mowed today
+_NEXT_AGE = np.stack([np.minimum(_AGES + 1, MAX_MOW_AGE), np.ones_like(_AGES)], axis=1)
+_WATERED = np.array([0.0, 1.0])
+
+
+def _mow_weather_cost(rain, temp_high):
+    """
+    Cost of mowing in given weather, from the day score the mowing recommendations use
+    """
+    return MOW_WEATHER_COST * (100 - mow_day_quality(rain, temp_high)) / 100
+
+
+def _stress(fraction):
+    return STRESS_COST * np.maximum(REFILL_POINT - fraction, 0) / REFILL_POINT
+
+
+def _daily_inputs(lawns, forecast, codes):
+    """
+    Per-lawn (lawns x horizon) rainfall, water use and mowing cost
+
+    Day 0 is today under current conditions, with no further rain counted
+    (the last 24 hours' rain is part of the starting moisture); days 1..
+    are the forecast days.
+    """
+    size = len(codes)
+    temp = np.asarray(lawns['temp'], dtype=float)
+    humidity = np.asarray(lawns['humidity'], dtype=float)
+    recent_rainfall = np.asarray(_column(lawns, 'rainfall_24h', size), dtype=float)
+    conditions = np.char.lower(np.asarray(_column(lawns, 'conditions', size, ""), dtype=str))
+
+    rainfall = np.asarray(forecast['rainfall'], dtype=float)
+    temp_high = np.asarray(forecast['temp_high'], dtype=float)
+    rain = np.asarray(forecast['rain'], dtype=bool)
+    # Days forecast without humidity are planned at today's humidity
+    forecast_humidity = np.asarray(_column(forecast, 'humidity', rainfall.shape, np.nan), dtype=float)
+    forecast_humidity = np.where(np.isnan(forecast_humidity), humidity[:, None], forecast_humidity)
+
+    rain_today = np.char.find(conditions, "rain") >= 0
+    rainfall = np.concatenate([np.zeros((size, 1)), rainfall], axis=1)
+    use = np.concatenate([daily_water_use(codes, temp, humidity)[:, None],
+                          daily_water_use(codes[:, None], temp_high, forecast_humidity)], axis=1)
+
+    wet_day = np.concatenate([rain_today[:, None], rainfall[:, 1:] > 0], axis=1)
+    wet_before = np.concatenate([(recent_rainfall > 0)[:, None], wet_day[:, :-1]], axis=1)
+    mow_cost = (_mow_weather_cost(np.concatenate([rain_today[:, None], rain], axis=1),
+                                  np.concatenate([temp[:, None], temp_high], axis=1))
+                + WET_MOW_COST * wet_before)
+    return rainfall, use, mow_cost
+
+
+def _solve(codes, rainfall, use, mow_cost):
+    """
+    Backward induction over the whole state grid for a chunk of groups
+
+    Returns:
+        (horizon x groups x levels x ages x watered) action codes, and the
+        (groups x levels x ages x watered) optimal cost from the first day
+    """
+    groups, horizon = rainfall.shape
+    capacity = ROOT_ZONE_CAPACITY[codes][:, None, None]
+    # Cost of tomorrow's days since mowing: (groups x ages x mowed)
+    overdue = OVERDUE_COST * np.maximum(_NEXT_AGE[None] - MOW_INTERVAL[codes][:, None, None], 0)
+
+    # Left undone at the end of the horizon: another day of stress and of overdue mowing
+    value = np.broadcast_to((_stress(_LEVELS)[None, :, None] + overdue[:, None, :, 0])[..., None],
+                            (groups, MOISTURE_LEVELS, len(_AGES), 2))
+    policy = np.empty((horizon, groups, MOISTURE_LEVELS, len(_AGES), 2), dtype=np.int8)
+    rows = np.arange(groups)[:, None]
+
+    for day in range(horizon - 1, -1, -1):
+        # Moisture after the day without and with watering: (groups x levels x watered)
+        dose = use[:, day, None, None] * 7 / 3
+        total = _LEVELS[None, :, None] + (rainfall[:, day, None, None] - use[:, day, None, None]
+                                          + _WATERED * dose) / capacity
+        after = np.clip(total, 0.0, 1.0)
+        moisture_cost = (_stress(after) + RUNOFF_COST * np.maximum(total - 1.0, 0) * capacity
+                         + _WATERED * (WATERING_COST + WATER_COST * dose))
+        next_level = np.rint(after * (MOISTURE_LEVELS - 1)).astype(np.intp)
+
+        # Tomorrow's value after watering or not (watering today is tomorrow's "watered
+        # yesterday"), by today's level: (groups x levels x ages of tomorrow)
+        future = [value[rows, next_level[:, :, watered], :, watered] for watered in (0, 1)]
+
+        # Cost of each (watered, mowed) choice from every (group, level, age); the
+        # choices are only two-way, so compare pairs rather than argmin over tiny axes
+        best = []
+        for mowed in (0, 1):
+            # Mowing resets tomorrow's age to 1 whatever today's is
+            ages = _NEXT_AGE[:, 0] if not mowed else slice(1, 2)
+            extra = overdue[:, None, :, mowed] + (MOW_COST + mow_cost[:, day, None, None]) * mowed
+            choices = [future[watered][:, :, ages] + (moisture_cost[:, :, watered, None] + extra)
+                       for watered in (0, 1)]
+            best.append((choices[1] < choices[0], np.minimum(choices[0], choices[1])))
+
+        (water_only, skip_mow), (water_too, mow) = best
+        value = np.empty_like(value)
+        for watered_yesterday in (0, 1):
+            mow_wet = mow + WET_MOW_COST * watered_yesterday
+            mow_now = mow_wet < skip_mow
+            value[..., watered_yesterday] = np.where(mow_now, mow_wet, skip_mow)
+            policy[day, ..., watered_yesterday] = np.where(mow_now, MOW + water_too, water_only)
+    return policy, value
+
+
+def plan_schedules(lawns, forecast, today=None):
+    """
+    Plan jointly optimal watering and mowing for many lawns over the forecast
+
+    Each day a lawn can be watered (one session of a third of the week's
+    need), mowed, both (mowed first) or left alone. A backward dynamic
+    program over (soil moisture, days since mowing, watered yesterday)
+    picks the schedule that minimizes drought stress, water and runoff,
+    mowing in bad or wet weather and overdue mowing. Lawns with identical
+    inputs (every lawn of one type in one weather tile) are solved once;
+    distinct groups are solved side by side in NumPy, CHUNK_GROUPS at a
+    time, and each lawn then follows its group's policy from its own state.
+
+    Args:
+        lawns: DataFrame or dict of arrays with temp, humidity, rainfall_24h,
+            conditions and lawn_type codes; optionally moisture (fraction of
+            root-zone capacity, e.g. from WaterBalance; NaN if unknown) and
+            days_since_mow (negative if unknown, planned as due today)
+        forecast: Dictionary of (lawns x days) arrays as built by forecast_matrix
+        today: Date of the first planned day (defaults to today)
+
+    Returns:
+        Dictionary of (lawns x 1 + days) arrays: date, water, water_amount
+        (NaN when not watering), mow and moisture (projected at the end of
+        each day); cost per lawn; and groups, the number of distinct plans solved
+    """
+    today = np.datetime64(datetime.datetime.now().date() if today is None else today, 'D')
+    codes = np.asarray(lawns['lawn_type'], dtype=np.intp)
+    codes = np.where((codes >= 0) & (codes < len(LAWN_TYPES)), codes, MIXED)
+    size = len(codes)
+    rainfall, use, mow_cost = _daily_inputs(lawns, forecast, codes)
+    horizon = rainfall.shape[1]
+
+    capacity = ROOT_ZONE_CAPACITY[codes]
+    # Unknown (missing or NaN) moisture: assume the refill point plus the last day's rain
+    moisture = np.asarray(_column(lawns, 'moisture', size, np.nan), dtype=float)
+    moisture = np.where(np.isnan(moisture),
+                        REFILL_POINT + np.asarray(_column(lawns, 'rainfall_24h', size), dtype=float) / capacity,
+                        moisture)
+    moisture = np.clip(moisture, 0.0, 1.0)
+    age = np.asarray(_column(lawns, 'days_since_mow', size, -1), dtype=np.intp)
+    age = np.clip(np.where(age < 0, MOW_INTERVAL[codes], age), 0, MAX_MOW_AGE)
+    watered = np.zeros(size, dtype=np.intp)
+
+    # Memoize across lawns: one solve per distinct (lawn type, daily weather)
+    features = np.column_stack([codes, rainfall, use, mow_cost])
+    _, first, group_of = np.unique(features, axis=0, return_index=True, return_inverse=True)
+    group_of = group_of.ravel()
+    order = np.argsort(group_of, kind='stable')
+    starts = np.searchsorted(group_of[order], np.arange(0, len(first) + CHUNK_GROUPS, CHUNK_GROUPS))
+
+    water = np.zeros((size, horizon), dtype=bool)
+    mow = np.zeros((size, horizon), dtype=bool)
+    levels = np.zeros((size, horizon), dtype=np.float32)
+    cost = np.zeros(size)
+
+    for chunk, (start, end) in enumerate(zip(starts[:-1], starts[1:])):
+        if start == end:
+            continue
+        groups = first[chunk * CHUNK_GROUPS:(chunk + 1) * CHUNK_GROUPS]
+        policy, value = _solve(codes[groups], rainfall[groups], use[groups], mow_cost[groups])
+
+        # Follow the policy forward from each lawn's own (continuous) moisture
+        members = order[start:end]
+        group = group_of[members] - chunk * CHUNK_GROUPS
+        level, lawn_age, lawn_watered = moisture[members], age[members], watered[members]
+        cost[members] = value[group, np.rint(level * (MOISTURE_LEVELS - 1)).astype(np.intp), lawn_age, 0]
+        for day in range(horizon):
+            action = policy[day, group, np.rint(level * (MOISTURE_LEVELS - 1)).astype(np.intp), lawn_age, lawn_watered]
+            lawn_watered, mowed = action & 1, action >> 1
+            level = np.clip(level + (rainfall[members, day] - use[members, day]
+                                     + lawn_watered * use[members, day] * 7 / 3) / capacity[members], 0.0, 1.0)
+            lawn_age = _NEXT_AGE[lawn_age, mowed]
+            water[members, day], mow[members, day], levels[members, day] = lawn_watered, mowed, level
+
+    forecast_dates = np.broadcast_to(np.asarray(forecast['date'], dtype='datetime64[D]'), (size, horizon - 1))
+    return {
+        'date': np.concatenate([np.full((size, 1), today), forecast_dates], axis=1),
+        'water': water,
+        'water_amount': np.where(water, use * 7 / 3, np.nan),
+        'mow': mow,
+        'moisture': levels,
+        'cost': cost,
+        'groups': len(first),
+    }
+
+
+def plan_schedule(weather_data, forecast_data, lawn_type, moisture=None, days_since_mow=None, today=None):
+    """
+    Plan one lawn's watering and mowing for today and each forecast day
+
+    Args:
+        weather_data: Current weather conditions
+        forecast_data: Daily forecast (as returned by get_forecast)
+        lawn_type: Type of grass (Cool Season, Warm Season, Mixed)
+        moisture: Soil moisture as a fraction of capacity, if known
+        days_since_mow: Days since the lawn was last mowed, if known
+
+    Returns:
+        List of dictionaries per day: date, water, water_amount (None when
+        not watering), mow and moisture
+    """
+    lawns = {
+        'temp': [weather_data['temp']],
+        'humidity': [weather_data['humidity']],
+        'rainfall_24h': [weather_data.get('rainfall_24h', 0)],
+        'conditions': [weather_data['conditions']],
+        'lawn_type': lawn_type_codes([lawn_type]),
+    }
+    if moisture is not None:
+        lawns['moisture'] = [moisture]
+    if days_since_mow is not None:
+        lawns['days_since_mow'] = [days_since_mow]
+    plan = plan_schedules(lawns, forecast_matrix([forecast_data]), today)
+
+    return [
+        {
+            'date': plan['date'][0, day].astype(datetime.date),
+            'water': bool(plan['water'][0, day]),
+            'water_amount': round(float(plan['water_amount'][0, day]), 2) if plan['water'][0, day] else None,
+            'mow': bool(plan['mow'][0, day]),
+            'moisture': round(float(plan['moisture'][0, day]), 2),
+        }
+        for day in range(plan['date'].shape[1])
+    ]
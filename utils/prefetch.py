@@ -0,0 +1,200 @@
+import heapq
+import logging
+import random
+import threading
+import time
+
+from utils.config import getenv
+from utils.ratelimit import BACKGROUND, RateLimited, priority
+from utils.weather import get_weather_data, get_forecast
+
+logger = logging.getLogger(__name__)
+
+# Upstream requests per minute the scheduler may spend on background refreshes
+PREFETCH_RATE = float(getenv("TURBOLAWN_PREFETCH_RATE", "30"))
+# Refresh this many seconds before an entry expires...
+PREFETCH_LEAD = float(getenv("TURBOLAWN_PREFETCH_LEAD", "120"))
+# ...plus up to this many seconds of random jitter, so refreshes do not bunch up
+PREFETCH_JITTER = float(getenv("TURBOLAWN_PREFETCH_JITTER", "60"))
+# Stop refreshing locations nobody has looked at for this long
+PREFETCH_IDLE_TIMEOUT = float(getenv("TURBOLAWN_PREFETCH_IDLE_TIMEOUT", str(24 * 3600)))
+
+
+class TokenBucket:
+    """
+    Simple thread-safe token bucket refilled at a fixed rate
+    """
+
+    def __init__(self, rate_per_minute, burst=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, rate_per_minute / 6)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def try_acquire(self, tokens=1):
+        """
+        Take tokens if available; otherwise return seconds until they will be
+        """
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0.0
+            return (tokens - self.tokens) / self.rate
+
+
+class PrefetchScheduler:
+    """
+    Background thread that refreshes cached weather shortly before it expires
+
+    Registered locations are kept in a heap ordered by when their current
+    weather or forecast entry is due for refresh (TTL minus lead time minus
+    jitter). Refreshes draw from a token bucket so background traffic stays
+    within the configured API budget, and run at background priority on the
+    shared rate limiter, so they back off whenever the dashboard needs the
+    quota. Dashboard renders then hit a warm cache.
+    """
+
+    def __init__(self, endpoints=(get_weather_data, get_forecast), rate_per_minute=PREFETCH_RATE,
+                 lead=PREFETCH_LEAD, jitter=PREFETCH_JITTER, idle_timeout=PREFETCH_IDLE_TIMEOUT):
+        self.endpoints = {func.endpoint: func for func in endpoints}
+        self.lead = lead
+        self.jitter = jitter
+        self.idle_timeout = idle_timeout
+        self.bucket = TokenBucket(rate_per_minute)
+        self.refreshed = 0
+        self.failed = 0
+        self.throttled = 0
+
+        self._heap = []
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def register(self, location):
+        """
+        Start (or keep) refreshing a location; call again whenever it is viewed
+        """
+        key = get_weather_data.normalize(location)
+        with self._lock:
+            known = key in self._last_seen
+            self._last_seen[key] = time.time()
+            if not known:
+                for endpoint in self.endpoints:
+                    heapq.heappush(self._heap, (0.0, endpoint, key))
+        if not known:
+            self._wake.set()
+
+    def unregister(self, location):
+        with self._lock:
+            self._last_seen.pop(get_weather_data.normalize(location), None)
+
+    def locations(self):
+        with self._lock:
+            return list(self._last_seen)
+
+    def due_at(self, endpoint, location):
+        """
+        Return when a location's cache entry for an endpoint should be refreshed
+        """
+        func = self.endpoints[endpoint]
+        tier = func.get_cache()
+        entry = tier.newest(func.cache_key(location))
+        if entry is None:
+            return 0.0
+        ttl, _ = tier.ttl(endpoint)
+        # Stable per-entry jitter, so every process computes the same due time
+        jitter = random.Random(f"{endpoint}:{location}:{entry.stored_at}").uniform(0, self.jitter)
+        return entry.stored_at + ttl - self.lead - jitter
+
+    def start(self):
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="prefetch", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=None):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def _next(self):
+        """
+        Pop the next (due_at, endpoint, location) that is still registered, or None
+        """
+        with self._lock:
+            while self._heap:
+                due, endpoint, location = heapq.heappop(self._heap)
+                last_seen = self._last_seen.get(location)
+                if last_seen is None:
+                    continue
+                if time.time() - last_seen > self.idle_timeout:
+                    del self._last_seen[location]
+                    continue
+                return due, endpoint, location
+        return None
+
+    def _push(self, due, endpoint, location):
+        with self._lock:
+            heapq.heappush(self._heap, (due, endpoint, location))
+
+    def _run(self):
+        while not self._stop.is_set():
+            item = self._next()
+            if item is None:
+                self._wake.wait(60)
+                self._wake.clear()
+                continue
+
+            _, endpoint, location = item
+            # The entry may have been refreshed since it was queued (by a render or another process)
+            due = self.due_at(endpoint, location)
+            wait = due - time.time()
+            if wait <= 0:
+                wait = self.bucket.try_acquire()
+            if wait > 0:
+                self._push(due, endpoint, location)
+                self._wake.wait(min(wait, 60))
+                self._wake.clear()
+                continue
+
+            try:
+                # Background priority: never waits for, or spends, the tokens kept for dashboard requests.
+                # refresh() raises rather than falling back to mock data, so a failing
+                # upstream leaves the cached entry alone
+                with priority(BACKGROUND):
+                    self.endpoints[endpoint].refresh(location)
+                self.refreshed += 1
+            except RateLimited as e:
+                self.throttled += 1
+                self._push(time.time() + e.retry_after, endpoint, location)
+                continue
+            except Exception as e:
+                self.failed += 1
+                logger.warning("Prefetch of %s for %s failed: %s", endpoint, location, e)
+                # Back off so a failing location does not eat the whole budget
+                self._push(time.time() + self.lead, endpoint, location)
+                continue
+            self._push(self.due_at(endpoint, location), endpoint, location)
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Return the process-wide prefetch scheduler, starting it on first use
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = PrefetchScheduler().start()
+    return _scheduler
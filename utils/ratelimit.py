@@ -0,0 +1,324 @@
+import contextlib
+import contextvars
+import datetime
+import email.utils
+import heapq
+import itertools
+import os
+import struct
+import tempfile
+import threading
+import time
+
+from utils import metrics
+from utils.config import getenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: the bucket is shared between threads only
+    fcntl = None
+
+# Upstream requests per minute allowed across every thread and process on the host
+RATE_PER_MINUTE = float(getenv("OPENWEATHER_RATE_PER_MINUTE", "60"))
+# Requests allowed per UTC day; 0 for no daily limit
+DAILY_QUOTA = int(getenv("OPENWEATHER_DAILY_QUOTA", "0"))
+# File holding the shared bucket state; set to "" to keep it per process
+RATE_LIMIT_STATE = getenv("TURBOLAWN_RATE_LIMIT_STATE", os.path.join(tempfile.gettempdir(), "turbolawn-ratelimit"))
+
+# Request priorities, most urgent first
+INTERACTIVE, BULK, BACKGROUND = 0, 1, 2
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BULK: "bulk", BACKGROUND: "background"}
+
+# Longest each priority waits for a token before giving up (None waits indefinitely)
+MAX_WAIT = {INTERACTIVE: 10.0, BULK: 60.0, BACKGROUND: 0.0}
+# Share of the burst capacity only interactive requests may use, so bulk and
+# background work in other processes cannot starve the dashboard
+INTERACTIVE_RESERVE = 0.25
+
+# tokens, updated (Unix time), quota day (ordinal), used today, blocked until (Unix time)
+_STATE = struct.Struct("<ddqqd")
+
+_priority = contextvars.ContextVar('turbolawn_request_priority', default=INTERACTIVE)
+
+
+class RateLimited(Exception):
+    """
+    Raised instead of calling the API when the rate limit or quota is exhausted
+
+    retry_after is the number of seconds until a request could go through.
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class QuotaExceeded(RateLimited):
+    """
+    Raised when the daily request quota is used up
+    """
+
+
+@contextlib.contextmanager
+def priority(level):
+    """
+    Run upstream requests made in this block (on this thread or task) at a priority
+    """
+    token = _priority.set(level)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def current_priority():
+    return _priority.get()
+
+
+def parse_retry_after(value, default=60.0):
+    """
+    Seconds to wait from a Retry-After header (delay-seconds or an HTTP date)
+    """
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        when = email.utils.parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return default
+    return max(0.0, when.timestamp() - time.time())
+
+
+class RateLimiter:
+    """
+    Token bucket shared by every thread and process, with a daily quota
+
+    The bucket state lives in a small file updated under an exclusive lock,
+    so all processes on the host draw from one budget. Within a process,
+    waiting callers are served in priority order (interactive, then bulk,
+    then background); across processes, only interactive requests may take
+    the last INTERACTIVE_RESERVE of the burst. A 429 from upstream blocks
+    everyone until its Retry-After has passed.
+    """
+
+    def __init__(self, rate_per_minute=RATE_PER_MINUTE, burst=None, daily_quota=DAILY_QUOTA,
+                 state_path=RATE_LIMIT_STATE):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = burst or max(1.0, rate_per_minute / 6)
+        self.daily_quota = daily_quota
+        self.state_path = state_path if fcntl is not None else ""
+        self.acquired = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.throttled = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.rejected = dict.fromkeys(PRIORITY_NAMES, 0)
+        self.upstream_429 = 0
+
+        self._state = (self.capacity, time.time(), 0, 0, 0.0)
+        self._fd = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self._changed = threading.Condition(self._lock)
+        self._waiting = []
+        self._tickets = itertools.count()
+
+    # Shared state
+
+    def _file(self):
+        # A descriptor inherited across fork shares its flock with the parent, so reopen
+        if self._pid != os.getpid():
+            os.makedirs(os.path.dirname(os.path.abspath(self.state_path)), exist_ok=True)
+            self._fd = os.open(self.state_path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = os.getpid()
+        return self._fd
+
+    def _update(self, change):
+        """
+        Apply change(state, now) -> (state, result) atomically; call with self._lock held
+        """
+        now = time.time()
+        if not self.state_path:
+            self._state, result = change(self._refill(self._state, now), now)
+            return result
+
+        fd = self._file()
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            data = os.pread(fd, _STATE.size, 0)
+            state = _STATE.unpack(data) if len(data) == _STATE.size else (self.capacity, now, 0, 0, 0.0)
+            state, result = change(self._refill(state, now), now)
+            os.pwrite(fd, _STATE.pack(*state), 0)
+        finally:
+            fcntl.flock(fd, fcntl.LOCK_UN)
+        self._state = state
+        return result
+
+    def _refill(self, state, now):
+        tokens, updated, day, used, blocked_until = state
+        tokens = min(self.capacity, tokens + max(0.0, now - updated) * self.rate)
+        today = datetime.datetime.fromtimestamp(now, datetime.timezone.utc).toordinal()
+        if day != today:
+            day, used = today, 0
+        return tokens, now, day, used, blocked_until
+
+    # Acquiring
+
+    def _take(self, level):
+        """
+        Try to take one token; return 0.0 on success or the seconds to wait
+
+        Raises QuotaExceeded when the daily quota is used up.
+        """
+        floor = 0.0 if level == INTERACTIVE else min(self.capacity * INTERACTIVE_RESERVE, self.capacity - 1)
+
+        def change(state, now):
+            tokens, updated, day, used, blocked_until = state
+            if blocked_until > now:
+                return state, blocked_until - now
+            if self.daily_quota and used >= self.daily_quota:
+                midnight = datetime.datetime.combine(
+                    datetime.date.fromordinal(day + 1), datetime.time(), datetime.timezone.utc)
+                raise QuotaExceeded(f"Daily quota of {self.daily_quota} requests used",
+                                    midnight.timestamp() - now)
+            if tokens - 1 >= floor:
+                return (tokens - 1, updated, day, used + 1, blocked_until), 0.0
+            return state, (floor + 1 - tokens) / self.rate
+
+        return self._update(change)
+
+    def _try(self, level, ticket):
+        """
+        Take a token if no more urgent caller in this process is waiting
+        """
+        with self._lock:
+            if self._waiting and self._waiting[0] < ticket:
+                return 1.0 / self.rate
+            return self._take(level)
+
+    def _enqueue(self, level):
+        with self._lock:
+            ticket = (level, next(self._tickets))
+            heapq.heappush(self._waiting, ticket)
+        return ticket
+
+    def _dequeue(self, ticket):
+        with self._lock:
+            self._waiting.remove(ticket)
+            heapq.heapify(self._waiting)
+            self._changed.notify_all()
+
+    def _give_up(self, level, wait):
+        self.rejected[level] += 1
+        metrics.incr("ratelimit_rejected", priority=PRIORITY_NAMES[level])
+        raise RateLimited(f"Rate limit reached; {PRIORITY_NAMES[level]} request not sent", wait)
+
+    def _granted(self, level, waited):
+        self.acquired[level] += 1
+        if waited:
+            self.throttled[level] += 1
+        metrics.incr("upstream_quota_used", priority=PRIORITY_NAMES[level])
+
+    def acquire(self, level=None, max_wait=-1):
+        """
+        Block until a request may be sent
+
+        Args:
+            level: Priority; defaults to the one set with priority() (interactive)
+            max_wait: Longest wait in seconds before raising RateLimited;
+                defaults to MAX_WAIT for the priority
+
+        Raises:
+            RateLimited: If no token is available in time
+            QuotaExceeded: If the daily quota is used up
+        """
+        level = current_priority() if level is None else level
+        max_wait = MAX_WAIT[level] if max_wait == -1 else max_wait
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        ticket = self._enqueue(level)
+        waited = False
+        try:
+            while True:
+                wait = self._try(level, ticket)
+                if wait <= 0:
+                    self._granted(level, waited)
+                    return
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    self._give_up(level, wait)
+                waited = True
+                with self._lock:
+                    self._changed.wait(min(wait, 1.0))
+        finally:
+            self._dequeue(ticket)
+
+    async def acquire_async(self, level=None, max_wait=-1):
+        """
+        Like acquire, but sleeps on the event loop instead of blocking the thread
+        """
+        import asyncio  # Deferred so synchronous callers do not pay for importing asyncio
+
+        level = current_priority() if level is None else level
+        max_wait = MAX_WAIT[level] if max_wait == -1 else max_wait
+        deadline = None if max_wait is None else time.monotonic() + max_wait
+        ticket = self._enqueue(level)
+        waited = False
+        try:
+            while True:
+                wait = self._try(level, ticket)
+                if wait <= 0:
+                    self._granted(level, waited)
+                    return
+                if deadline is not None and time.monotonic() + wait > deadline:
+                    self._give_up(level, wait)
+                waited = True
+                await asyncio.sleep(min(wait, 1.0))
+        finally:
+            self._dequeue(ticket)
+
+    def block(self, seconds):
+        """
+        Stop every process from sending requests for a while (after a 429)
+        """
+        self.upstream_429 += 1
+        metrics.incr("upstream_rate_limited")
+
+        def change(state, now):
+            tokens, updated, day, used, blocked_until = state
+            return (0.0, updated, day, used, max(blocked_until, now + seconds)), None
+
+        with self._lock:
+            self._update(change)
+
+    def usage(self):
+        """
+        Shared bucket and quota state plus this process's counters, for metrics
+        """
+        with self._lock:
+            tokens, _, _, used, blocked_until = self._update(lambda state, now: (state, state))
+        return {
+            'rate_per_minute': self.rate * 60,
+            'tokens': round(tokens, 3),
+            'used_today': used,
+            'daily_quota': self.daily_quota or None,
+            'quota_remaining': max(0, self.daily_quota - used) if self.daily_quota else None,
+            'blocked_for_s': round(max(0.0, blocked_until - time.time()), 3),
+            'acquired': {PRIORITY_NAMES[level]: count for level, count in self.acquired.items()},
+            'throttled': {PRIORITY_NAMES[level]: count for level, count in self.throttled.items()},
+            'rejected': {PRIORITY_NAMES[level]: count for level, count in self.rejected.items()},
+            'upstream_429': self.upstream_429,
+        }
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def get_limiter():
+    """
+    Return the process-wide rate limiter
+    """
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter()
+    return _limiter
@@ -1,10 +1,24 @@
 import datetime
 from datetime import timedelta
 
+from utils.memo import memoize
+
+def _this_hour():
+    # Watering advice depends on the date and the time of day
+    now = datetime.datetime.now()
+    return now.date(), now.hour
+
+def _today():
+    return datetime.datetime.now().date()
+
+@memoize("watering", context=_this_hour)
 def get_watering_recommendation(weather_data, forecast_data, lawn_type):
     """
     Generate watering recommendations based on weather data and forecast
     
+    Results for weather snapshots from the cache are memoized (see
+    utils.memo) and shared between callers, so do not modify them.
+    
     Args:
         weather_data: Current weather conditions
         forecast_data: 5-day forecast
@@ -83,10 +97,14 @@ def get_watering_recommendation(weather_data, forecast_data, lawn_type):
             
     return recommendation
 
+@memoize("mowing", context=_today)
 def get_mowing_recommendation(weather_data, forecast_data, lawn_type):
     """
     Generate mowing recommendations based on weather data and forecast
     
+    Results for weather snapshots from the cache are memoized (see
+    utils.memo) and shared between callers, so do not modify them.
+    
     Args:
         weather_data: Current weather conditions
         forecast_data: 5-day forecast
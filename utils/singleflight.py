@@ -0,0 +1,202 @@
+import hashlib
+import os
+import tempfile
+import threading
+
+from utils.config import getenv
+
+try:
+    import fcntl
+except ImportError:  # Windows: fall back to in-process coalescing only
+    fcntl = None
+
+# Directory holding the per-key lock files used for cross-process coalescing
+LOCK_DIR = getenv("TURBOLAWN_LOCK_DIR", os.path.join(tempfile.gettempdir(), "turbolawn-locks"))
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Deduplicate concurrent calls for the same key across threads
+
+    The first caller for a key runs the function; callers arriving while it
+    is in flight wait for it and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, func, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = func(*args, **kwargs)
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+class FileLock:
+    """
+    Exclusive advisory lock on a per-key file, held across processes
+
+    On platforms without fcntl the lock is a no-op.
+    """
+
+    def __init__(self, key, lock_dir=LOCK_DIR):
+        digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+        self.path = os.path.join(lock_dir, f"{digest}.lock")
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc_info):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
+
+
+class ProcessSingleFlight(SingleFlight):
+    """
+    Single-flight that also serializes the leader across processes
+
+    Threads in one process coalesce as with SingleFlight; the in-process
+    leader then takes a file lock for the key, so only one process at a time
+    runs the function. Pass a recheck function to return a result another
+    process produced while this one waited for the lock.
+    """
+
+    def __init__(self, lock_dir=LOCK_DIR):
+        super().__init__()
+        self.lock_dir = lock_dir
+
+    def do(self, key, func, *args, recheck=None, **kwargs):
+        def locked():
+            with FileLock(key, self.lock_dir):
+                if recheck is not None:
+                    found = recheck()
+                    if found is not None:
+                        return found
+                return func(*args, **kwargs)
+
+        return super().do(key, locked)
+
+
+class AsyncSingleFlight:
+    """
+    Deduplicate concurrent coroutine calls for the same key
+
+    The table is shared across threads and event loops: the first caller
+    runs the coroutine on its own loop and callers on any loop await its
+    result, so requests served by separate asyncio.run calls still share
+    one upstream fetch.
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    async def do(self, key, func, *args, **kwargs):
+        # Deferred so the thread-only paths do not pay for importing asyncio
+        import asyncio
+        import concurrent.futures
+
+        while True:
+            with self._lock:
+                shared = self._calls.get(key)
+                leader = shared is None
+                if leader:
+                    shared = self._calls[key] = concurrent.futures.Future()
+
+            if leader:
+                task = asyncio.ensure_future(self._run(key, shared, func, args, kwargs))
+                # Shield so one cancelled waiter does not cancel the shared fetch
+                return await asyncio.shield(task)
+            try:
+                return await asyncio.shield(asyncio.wrap_future(shared))
+            except asyncio.CancelledError:
+                if not shared.cancelled():
+                    raise
+                # The leader's loop shut down mid-call; take over
+
+    async def _run(self, key, shared, func, args, kwargs):
+        import asyncio
+
+        try:
+            result = await func(*args, **kwargs)
+        except BaseException as e:
+            with self._lock:
+                self._calls.pop(key, None)
+            if isinstance(e, asyncio.CancelledError):
+                shared.cancel()
+            else:
+                shared.set_exception(e)
+            raise
+        with self._lock:
+            self._calls.pop(key, None)
+        shared.set_result(result)
+        return result
+
+    def in_flight(self):
+        return len(self._calls)
+
+
+class AsyncProcessSingleFlight(AsyncSingleFlight):
+    """
+    AsyncSingleFlight whose leader also holds the key's file lock, as ProcessSingleFlight does
+    """
+
+    def __init__(self, lock_dir=LOCK_DIR):
+        super().__init__()
+        self.lock_dir = lock_dir
+
+    async def do(self, key, func, *args, recheck=None, **kwargs):
+        import asyncio
+
+        async def locked():
+            lock = FileLock(key, self.lock_dir)
+            # flock blocks; wait for it off the event loop
+            await asyncio.get_running_loop().run_in_executor(None, lock.__enter__)
+            try:
+                if recheck is not None:
+                    found = recheck()
+                    if found is not None:
+                        return found
+                return await func(*args, **kwargs)
+            finally:
+                lock.__exit__(None, None, None)
+
+        return await super().do(key, locked)
@@ -0,0 +1,206 @@
+import datetime
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections.abc import Mapping
+
+from utils.cache import LRUCache, SQLiteCache, TieredCache
+from utils.config import getenv
+
+# Seconds a snapshot is kept to diff against; clients that sync less often get a full snapshot
+SYNC_TTL = int(getenv("TURBOLAWN_SYNC_TTL", "86400"))
+# Snapshot store shared by every process on the host, separate from the weather cache; "" keeps them in memory only
+SYNC_DB = getenv("TURBOLAWN_SYNC_DB", os.path.join(tempfile.gettempdir(), "turbolawn-sync.sqlite3"))
+# Recently handed-out snapshots kept in memory per process
+SYNC_CACHE_SIZE = int(getenv("TURBOLAWN_SYNC_CACHE_SIZE", "256"))
+
+ENDPOINT = "sync"
+
+# Sections of a location snapshot that are diffed field by field
+FIELD_SECTIONS = ('weather', 'watering', 'mowing')
+
+
+def plain(value):
+    """
+    JSON-ready copy of weather data: records and mappings become dicts,
+    dates ISO strings and NaN None
+    """
+    if isinstance(value, Mapping):
+        return {key: plain(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [plain(item) for item in value]
+    if isinstance(value, (datetime.date, datetime.datetime)):
+        return value.isoformat()
+    if isinstance(value, float) and value != value:
+        return None
+    if hasattr(value, 'item'):
+        # NumPy scalars
+        return plain(value.item())
+    return value
+
+
+def build_snapshot(location, lawn_type, weather_data, forecast_data, watering, mowing):
+    """
+    Everything a client shows for one lawn, as plain JSON data
+    """
+    return plain({
+        'location': location,
+        'lawn_type': lawn_type,
+        'weather': weather_data,
+        'forecast': forecast_data,
+        'watering': watering,
+        'mowing': mowing,
+    })
+
+
+def _encode(snapshot):
+    return json.dumps(snapshot, sort_keys=True, separators=(",", ":"))
+
+
+def _version(text):
+    return hashlib.blake2b(text.encode("utf-8"), digest_size=8).hexdigest()
+
+
+def version_of(snapshot):
+    """
+    Content version of a snapshot, used as its ETag
+    """
+    return _version(_encode(snapshot))
+
+
+def diff(old, new):
+    """
+    Changes that turn snapshot old into new
+
+    weather, watering and mowing changes are {"set": {...}, "unset": [...]}
+    with only the fields that differ; forecast changes are {"days": [...],
+    "removed": [...]} with the new or changed days and the dates dropped.
+    Sections that did not change are left out.
+    """
+    changes = {}
+    for name in FIELD_SECTIONS:
+        before, after = old.get(name) or {}, new.get(name) or {}
+        change = {}
+        changed = {key: value for key, value in after.items() if key not in before or before[key] != value}
+        if changed:
+            change['set'] = changed
+        removed = [key for key in before if key not in after]
+        if removed:
+            change['unset'] = removed
+        if change:
+            changes[name] = change
+
+    before = {day['date']: day for day in old.get('forecast') or ()}
+    after = new.get('forecast') or []
+    change = {}
+    days = [day for day in after if before.get(day['date']) != day]
+    if days:
+        change['days'] = days
+    dates = {day['date'] for day in after}
+    removed = [date for date in before if date not in dates]
+    if removed:
+        change['removed'] = removed
+    if change:
+        changes['forecast'] = change
+    return changes
+
+
+def apply_changes(snapshot, changes):
+    """
+    Apply the output of diff to a snapshot, as a client does; returns a new snapshot
+    """
+    result = dict(snapshot)
+    for name in FIELD_SECTIONS:
+        change = changes.get(name)
+        if change:
+            section = dict(result.get(name) or {})
+            section.update(change.get('set', {}))
+            for key in change.get('unset', ()):
+                section.pop(key, None)
+            result[name] = section
+
+    change = changes.get('forecast')
+    if change:
+        removed = set(change.get('removed', ()))
+        days = {day['date']: day for day in result.get('forecast') or () if day['date'] not in removed}
+        days.update((day['date'], day) for day in change.get('days', ()))
+        result['forecast'] = [days[date] for date in sorted(days)]
+    return result
+
+
+class SyncStore:
+    """
+    Versioned per-lawn snapshots for offline-first clients
+
+    A snapshot's version is a hash of its content, so every process hands
+    out the same version for the same data and a client that is up to date
+    can be answered with 304 Not Modified. Each snapshot handed out is kept
+    under its version for SYNC_TTL, so when a client reports the version it
+    holds, only the changes since then are sent. Clients with an unknown or
+    expired version get the full snapshot.
+
+    Snapshots live in their own cache (a small LRU in front of SYNC_DB),
+    not the weather cache, so a large sync cannot evict hot weather entries.
+    """
+
+    def __init__(self, cache=None, ttl=SYNC_TTL):
+        if cache is None:
+            cache = TieredCache(memory=LRUCache(SYNC_CACHE_SIZE), disk=SQLiteCache(SYNC_DB) if SYNC_DB else None)
+        self.cache = cache
+        self.cache.configure(ENDPOINT, ttl, 0)
+
+    def _key(self, version):
+        return f"{ENDPOINT}:{version}"
+
+    def publish(self, snapshot):
+        """
+        Keep a snapshot to diff against later and return its version
+        """
+        text = _encode(snapshot)
+        version = _version(text)
+        # Stored as the encoded text, ready to compare and cheap to keep
+        if self.cache.get(ENDPOINT, self._key(version)) is None:
+            self.cache.set(ENDPOINT, self._key(version), text)
+        return version
+
+    def snapshot(self, version):
+        """
+        Return the snapshot with this version, or None if it is unknown or expired
+        """
+        text = self.cache.get(ENDPOINT, self._key(version))
+        return json.loads(text) if text is not None else None
+
+    def sync(self, snapshot, since=None):
+        """
+        Build the sync response for a client holding version since
+
+        Returns:
+            Dictionary with the current version and either changes (a diff
+            against base, the client's version; empty if it is current) or,
+            when there is nothing to diff against, the full snapshot
+        """
+        version = self.publish(snapshot)
+        if since == version:
+            return {'version': version, 'base': since, 'changes': {}}
+        base = self.snapshot(since) if since else None
+        if base is None or (base.get('location'), base.get('lawn_type')) != (snapshot['location'], snapshot['lawn_type']):
+            return {'version': version, 'base': None, 'snapshot': snapshot}
+        return {'version': version, 'base': since, 'changes': diff(base, snapshot)}
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_sync_store():
+    """
+    Return the process-wide sync store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = SyncStore()
+    return _store
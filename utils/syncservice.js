@@ -0,0 +1,94 @@
+import AsyncStorage from '@react-native-async-storage/async-storage';
+
+const SYNC_URL = 'http://localhost:8080/sync'; // TurboLawn service (python service.py)
+
+const FIELD_SECTIONS = ['weather', 'watering', 'mowing'];
+
+// Offline-first lawn data: the last synced snapshot lives in AsyncStorage and
+// only the changes since its version are downloaded (see utils/sync.py)
+export class SyncService {
+  static storageKey(location, lawnType) {
+    return `sync:${lawnType}:${location}`;
+  }
+
+  static async getLawnData(location, lawnType = 'Cool Season Grass') {
+    const key = this.storageKey(location, lawnType);
+    const cached = await this.getCachedSnapshot(key);
+    try {
+      const params = new URLSearchParams({ location, lawn_type: lawnType });
+      const headers = {};
+      if (cached) {
+        params.set('since', cached.version);
+        headers['If-None-Match'] = `"${cached.version}"`;
+      }
+
+      const response = await fetch(`${SYNC_URL}?${params}`, { headers });
+      if (response.status === 304) {
+        return cached.snapshot;
+      }
+      if (!response.ok) {
+        throw new Error(`Sync failed with status ${response.status}`);
+      }
+
+      const result = await response.json();
+      const snapshot = result.snapshot || this.applyChanges(cached.snapshot, result.changes);
+      await this.cacheSnapshot(key, result.version, snapshot);
+      return snapshot;
+    } catch (error) {
+      // Offline or server trouble: fall back to the last synced data
+      if (cached) {
+        return cached.snapshot;
+      }
+      console.error('Error syncing lawn data:', error);
+      throw error;
+    }
+  }
+
+  static applyChanges(snapshot, changes) {
+    const result = { ...snapshot };
+    for (const name of FIELD_SECTIONS) {
+      const change = changes[name];
+      if (change) {
+        const section = { ...(result[name] || {}), ...(change.set || {}) };
+        for (const field of change.unset || []) {
+          delete section[field];
+        }
+        result[name] = section;
+      }
+    }
+
+    const change = changes.forecast;
+    if (change) {
+      const removed = new Set(change.removed || []);
+      const days = new Map();
+      for (const day of result.forecast || []) {
+        if (!removed.has(day.date)) {
+          days.set(day.date, day);
+        }
+      }
+      for (const day of change.days || []) {
+        days.set(day.date, day);
+      }
+      result.forecast = [...days.keys()].sort().map((date) => days.get(date));
+    }
+    return result;
+  }
+
+  static async cacheSnapshot(key, version, snapshot) {
+    try {
+      await AsyncStorage.setItem(key, JSON.stringify({ version, snapshot }));
+    } catch (error) {
+      console.error('Error caching lawn data:', error);
+    }
+  }
+
+  static async getCachedSnapshot(key) {
+    try {
+      const cache = await AsyncStorage.getItem(key);
+      return cache ? JSON.parse(cache) : null;
+    } catch (error) {
+      console.error('Error reading cached lawn data:', error);
+      return null;
+    }
+  }
+}
@@ -0,0 +1,102 @@
+import numpy as np
+
+from utils.geocode import canonical_location
+from utils.geohash import TILE_PRECISION, bit_split, center, center_key, interleave, to_string
+
+
+def encode_many(lats, lons, precision=TILE_PRECISION):
+    """
+    Vectorized encode_int: integer geohashes for arrays of coordinates
+    """
+    lon_bits, lat_bits = bit_split(precision)
+    lats = np.asarray(lats, dtype=float)
+    lons = np.asarray(lons, dtype=float)
+    lon_cells = np.clip(((lons + 180.0) / 360.0 * (1 << lon_bits)).astype(np.int64), 0, (1 << lon_bits) - 1)
+    lat_cells = np.clip(((lats + 90.0) / 180.0 * (1 << lat_bits)).astype(np.int64), 0, (1 << lat_bits) - 1)
+
+    return interleave(lon_cells, lat_cells, lon_bits, lat_bits)
+
+
+class TileIndex:
+    """
+    Spatial index grouping lawns by the weather tile they fall in
+
+    Lawn coordinates are encoded to integer geohashes in one vectorized pass
+    and sorted, so the index holds each distinct tile once (tiles), the tile
+    number of every lawn (tile_of) and the lawns of each tile as a slice of
+    one sorted permutation (members). Fetch once per tile, then broadcast
+    results back to lawns with `values[index.tile_of]`.
+    """
+
+    def __init__(self, lats, lons, precision=TILE_PRECISION):
+        self.precision = precision
+        codes = encode_many(lats, lons, precision)
+        self.tiles, self.tile_of = np.unique(codes, return_inverse=True)
+        self.tile_of = self.tile_of.ravel()
+        self._order = np.argsort(self.tile_of, kind='stable')
+        self._starts = np.searchsorted(self.tile_of[self._order], np.arange(len(self.tiles) + 1))
+
+    def __len__(self):
+        return len(self.tiles)
+
+    def geohashes(self):
+        return [to_string(int(code), self.precision) for code in self.tiles]
+
+    def keys(self):
+        """
+        Canonical "lat,lon" location key of each tile (see utils.geohash.tile_key)
+        """
+        return [center_key(geohash) for geohash in self.geohashes()]
+
+    def members(self, tile):
+        """
+        Indices of the lawns in tile number `tile`
+        """
+        return self._order[self._starts[tile]:self._starts[tile + 1]]
+
+    def counts(self):
+        return np.diff(self._starts)
+
+    def find(self, lats, lons):
+        """
+        Tile numbers for new coordinates, or -1 where no indexed lawn shares the tile
+        """
+        codes = encode_many(lats, lons, self.precision)
+        positions = np.searchsorted(self.tiles, codes)
+        found = (positions < len(self.tiles)) & (self.tiles[np.minimum(positions, len(self.tiles) - 1)] == codes)
+        return np.where(found, positions, -1)
+
+    def within(self, lat_min, lat_max, lon_min, lon_max):
+        """
+        Tile numbers whose center lies inside a bounding box
+        """
+        centers = np.array([center(geohash) for geohash in self.geohashes()]).reshape(-1, 2)
+        return np.flatnonzero((centers[:, 0] >= lat_min) & (centers[:, 0] <= lat_max)
+                              & (centers[:, 1] >= lon_min) & (centers[:, 1] <= lon_max))
+
+
+def lawn_tile_keys(lawns):
+    """
+    Canonical location key of every lawn's weather tile
+
+    Lawns given as lat/lon are snapped in one vectorized pass with a
+    TileIndex; lawns given as a location string go through the geocoder,
+    once per distinct string.
+    """
+    keys = [None] * len(lawns)
+    located = [i for i, lawn in enumerate(lawns) if 'lat' in lawn and 'lon' in lawn]
+    if located:
+        index = TileIndex([lawns[i]['lat'] for i in located], [lawns[i]['lon'] for i in located])
+        tile_keys = index.keys()
+        for i, tile in zip(located, index.tile_of.tolist()):
+            keys[i] = tile_keys[tile]
+    # Lawns often repeat a location string; geocode each distinct one once
+    normalized = {}
+    for i, lawn in enumerate(lawns):
+        if keys[i] is None:
+            location = lawn['location']
+            key = normalized.get(location)
+            if key is None:
+                key = normalized[location] = canonical_location(location)
+            keys[i] = key
+    return keys
@@ -0,0 +1,320 @@
+import datetime
+import logging
+import os
+import tempfile
+import threading
+import time
+
+import numpy as np
+
+from utils.batch import IDEAL_TEMP_HIGH, IDEAL_TEMP_LOW, LAWN_TYPES, MIXED, WEEKLY_WATER_NEED, lawn_type_codes
+from utils.config import getenv
+from utils.geocode import canonical_location
+
+logger = logging.getLogger(__name__)
+
+# Where the Dashboard's per-lawn soil moisture is saved; set to "" to keep it in memory only
+WATER_BALANCE_PATH = getenv(
+    "TURBOLAWN_WATER_BALANCE", os.path.join(tempfile.gettempdir(), "turbolawn-waterbalance.npz")
+)
+
+# Plant-available water the root zone holds when full (inches), indexed by lawn type code
+ROOT_ZONE_CAPACITY = np.array([1.5, 1.2, 1.35])
+
+# Water once moisture falls to this fraction of capacity
+REFILL_POINT = 0.5
+# Never let one tick account for more than this many days (e.g. after a long outage)
+MAX_TICK_DAYS = 7.0
+
+_STATE_FIELDS = ('lawn_type', 'moisture', 'daily_use', 'updated')
+
+
+class WaterBalance:
+    """
+    Incremental daily water-balance model for many lawns
+
+    Each lawn's state is a handful of numbers held in parallel NumPy arrays
+    (lawn type, root-zone moisture, current daily water use and last update
+    time). Every tick advances all lawns at once: rain and irrigation add
+    water, evapotranspiration removes it in proportion to the time elapsed,
+    and moisture is clipped to the root-zone capacity. Nothing is replayed,
+    so a recommendation is a constant-time read of the current state.
+    """
+
+    def __init__(self, size=0):
+        self._size = 0
+        self.lawn_type = np.zeros(size, dtype=np.int8)
+        self.moisture = np.zeros(size, dtype=np.float32)
+        self.daily_use = np.zeros(size, dtype=np.float32)
+        self.updated = np.zeros(size, dtype=np.float64)
+
+    def __len__(self):
+        return self._size
+
+    def _grow(self, needed):
+        capacity = len(self.moisture)
+        if needed <= capacity:
+            return
+        capacity = max(needed, capacity * 2, 16)
+        for field in _STATE_FIELDS:
+            old = getattr(self, field)
+            new = np.zeros(capacity, dtype=old.dtype)
+            new[:self._size] = old[:self._size]
+            setattr(self, field, new)
+
+    def add_lawns(self, lawn_types, moisture=None, now=None):
+        """
+        Add lawns (starting at field capacity unless moisture is given)
+
+        Returns:
+            Array of the new lawns' indexes
+        """
+        codes = lawn_type_codes(lawn_types)
+        start, end = self._size, self._size + len(codes)
+        self._grow(end)
+
+        self.lawn_type[start:end] = codes
+        capacity = ROOT_ZONE_CAPACITY[codes]
+        self.moisture[start:end] = capacity if moisture is None else np.minimum(moisture, capacity)
+        self.daily_use[start:end] = WEEKLY_WATER_NEED[codes] / 7
+        self.updated[start:end] = now or time.time()
+        self._size = end
+        return np.arange(start, end)
+
+    def add_lawn(self, lawn_type, moisture=None, now=None):
+        return int(self.add_lawns([lawn_type], None if moisture is None else [moisture], now)[0])
+
+    def _select(self, index):
+        return slice(0, self._size) if index is None else np.asarray(index)
+
+    def advance(self, temp, humidity, rainfall=0.0, irrigation=0.0, now=None, index=None):
+        """
+        Advance lawns to `now` using their latest conditions
+
+        Args:
+            temp, humidity: Current conditions (scalars or arrays aligned with index)
+            rainfall: Rain since each lawn's last update (inches)
+            irrigation: Water applied since the last update (inches)
+            now: Timestamp to advance to (defaults to now)
+            index: Lawn indexes to advance (defaults to all lawns)
+        """
+        now = now or time.time()
+        lawns = self._select(index)
+        codes = self.lawn_type[lawns].astype(np.intp)
+
+        elapsed = np.clip((now - self.updated[lawns]) / 86400, 0, MAX_TICK_DAYS)
+        # Water used since the last tick at the previously estimated rate
+        moisture = self.moisture[lawns] - self.daily_use[lawns] * elapsed + rainfall + irrigation
+        self.moisture[lawns] = np.clip(moisture, 0, ROOT_ZONE_CAPACITY[codes])
+        self.daily_use[lawns] = daily_water_use(codes, temp, humidity)
+        self.updated[lawns] = now
+
+    def observe(self, index, weather_data, now=None):
+        """
+        Advance one lawn from a get_weather_data result
+
+        Rain since the last update is taken at the rate of the last 24 hours'
+        rainfall (measured from the history store when there is enough of it),
+        so frequent updates neither miss a shower nor count it twice.
+        """
+        now = now or time.time()
+        hours = min(max(now - self.updated[index], 0) / 3600, 24)
+        rainfall = (weather_data.get('rainfall_24h') or 0) * hours / 24
+        self.advance(weather_data['temp'], weather_data['humidity'], rainfall, now=now, index=[index])
+
+    def irrigate(self, index, amount):
+        """
+        Record water applied to lawns without advancing time
+        """
+        lawns = self._select(index)
+        capacity = ROOT_ZONE_CAPACITY[self.lawn_type[lawns].astype(np.intp)]
+        self.moisture[lawns] = np.minimum(self.moisture[lawns] + amount, capacity)
+
+    def recommendations(self, today=None, index=None):
+        """
+        Watering recommendations for many lawns from their current state
+
+        Returns:
+            Dictionary of arrays: should_water, water_amount (NaN when not
+            watering) and next_water_date (datetime64[D])
+        """
+        today = np.datetime64(datetime.datetime.now().date() if today is None else today, 'D')
+        lawns = self._select(index)
+        capacity = ROOT_ZONE_CAPACITY[self.lawn_type[lawns].astype(np.intp)]
+        moisture = self.moisture[lawns]
+
+        refill_at = capacity * REFILL_POINT
+        should_water = moisture <= refill_at
+        days_left = np.ceil((moisture - refill_at) / np.maximum(self.daily_use[lawns], 1e-6))
+        days_left = np.clip(np.nan_to_num(days_left), 0, 365).astype('timedelta64[D]')
+
+        return {
+            'should_water': should_water,
+            'water_amount': np.where(should_water, capacity - moisture, np.nan),
+            'next_water_date': (today + days_left).astype('datetime64[D]'),
+        }
+
+    def recommend(self, index, today=None):
+        """
+        Watering recommendation for one lawn, shaped like get_watering_recommendation
+        """
+        result = self.recommendations(today, [index])
+        capacity = float(ROOT_ZONE_CAPACITY[self.lawn_type[index]])
+        level = float(self.moisture[index]) / capacity
+
+        recommendation = {
+            'should_water': bool(result['should_water'][0]),
+            'next_water_date': result['next_water_date'][0].astype(datetime.date),
+            'soil_moisture': round(level, 2),
+        }
+        if recommendation['should_water']:
+            amount = float(result['water_amount'][0])
+            recommendation['water_amount'] = amount
+            recommendation['message'] = (f"Soil moisture is down to {level:.0%}. Water your lawn with "
+                                         f"{amount:.2f} inches of water to refill the root zone.")
+        else:
+            recommendation['message'] = (f"Soil moisture is at {level:.0%}. Next watering expected "
+                                         f"{recommendation['next_water_date'].strftime('%A, %b %d')}.")
+        return recommendation
+
+    def _arrays(self):
+        return {field: getattr(self, field)[:self._size] for field in _STATE_FIELDS}
+
+    @classmethod
+    def _from_arrays(cls, data):
+        model = cls()
+        for field in _STATE_FIELDS:
+            setattr(model, field, data[field].copy())
+        model._size = len(model.moisture)
+        return model
+
+    def save(self, path):
+        """
+        Save all lawn state to a .npz file
+        """
+        np.savez(path, **self._arrays())
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as data:
+            return cls._from_arrays(data)
+
+
+class LawnStore:
+    """
+    Water balance for lawns named by location and lawn type, kept on disk
+
+    Every session and process shares one state per lawn, so soil moisture
+    and logged watering carry over between sessions and restarts. The state
+    is saved after each change (to a temporary file renamed into place) and
+    reloaded when another process has saved since; if two processes update
+    at the same moment, the last save wins.
+    """
+
+    def __init__(self, path=WATER_BALANCE_PATH):
+        self.path = path
+        self.model = WaterBalance()
+        self.locations = []
+        self._lawns = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+        self._reload()
+
+    def _reload(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns if self.path else None
+        except FileNotFoundError:
+            mtime = None
+        if mtime is None or mtime == self._mtime:
+            return
+        try:
+            with np.load(self.path) as data:
+                model = WaterBalance._from_arrays(data)
+                locations = data['locations'].tolist()
+        except (OSError, KeyError, ValueError) as e:
+            logger.warning("Could not load soil moisture from %s: %s", self.path, e)
+            return
+        self.model, self.locations, self._mtime = model, locations, mtime
+        self._lawns = {(location, int(code)): index
+                       for index, (location, code) in enumerate(zip(locations, model.lawn_type))}
+
+    def _save(self):
+        if not self.path:
+            return
+        directory = os.path.dirname(os.path.abspath(self.path))
+        try:
+            fd, temporary = tempfile.mkstemp(dir=directory, suffix=".npz")
+            try:
+                with os.fdopen(fd, "wb") as f:
+                    np.savez(f, locations=np.array(self.locations, dtype=str), **self.model._arrays())
+                os.replace(temporary, self.path)
+            except BaseException:
+                os.unlink(temporary)
+                raise
+            self._mtime = os.stat(self.path).st_mtime_ns
+        except OSError as e:
+            logger.warning("Could not save soil moisture to %s: %s", self.path, e)
+
+    def _lawn(self, location, lawn_type, now):
+        key = (canonical_location(location), int(lawn_type_codes([lawn_type])[0]))
+        index = self._lawns.get(key)
+        if index is None:
+            index = self._lawns[key] = self.model.add_lawn(lawn_type, now=now)
+            self.locations.append(key[0])
+        return index
+
+    def observe(self, location, lawn_type, weather_data, now=None):
+        """
+        Advance a lawn with a get_weather_data result
+
+        Returns:
+            The lawn's watering recommendation (see WaterBalance.recommend)
+        """
+        with self._lock:
+            self._reload()
+            index = self._lawn(location, lawn_type, now)
+            self.model.observe(index, weather_data, now)
+            self._save()
+            return self.model.recommend(index)
+
+    def irrigate(self, location, lawn_type, amount, now=None):
+        """
+        Record water applied to a lawn (inches)
+        """
+        with self._lock:
+            self._reload()
+            self.model.irrigate(self._lawn(location, lawn_type, now), amount)
+            self._save()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_lawn_store():
+    """
+    Return the process-wide lawn water-balance store
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = LawnStore()
+    return _store
+
+
+def daily_water_use(codes, temp, humidity):
+    """
+    Estimate daily evapotranspiration (inches) per lawn from temperature and humidity
+
+    Uses the same lawn-type baselines and multipliers as get_watering_recommendation.
+    """
+    codes = np.where((codes >= 0) & (codes < len(LAWN_TYPES)), codes, MIXED)
+    temp = np.asarray(temp, dtype=float)
+    humidity = np.asarray(humidity, dtype=float)
+
+    use = WEEKLY_WATER_NEED[codes] / 7
+    use = np.where(temp > IDEAL_TEMP_HIGH[codes] + 10, use * 1.3,
+                   np.where(temp < IDEAL_TEMP_LOW[codes] - 10, use * 0.7, use))
+    use = np.where(humidity < 40, use * 1.2, np.where(humidity > 80, use * 0.8, use))
+    return use
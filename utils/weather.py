@@ -1,139 +1,338 @@
-import requests
 import datetime
-import os
-from dotenv import load_dotenv
-import streamlit as st
+import logging
 
-# Load environment variables
-load_dotenv()
+from utils.config import getenv
+from utils import metrics
+from utils.cache import cached
+from utils.geocode import canonical_location, parse_coordinates
+from utils.models import EPOCH_ORDINAL, DailyForecast, Observation
+from utils.ratelimit import RateLimited, get_limiter, parse_retry_after
+
+logger = logging.getLogger(__name__)
 
 # Get API key from environment variables or use a placeholder for demo
-API_KEY = os.getenv("OPENWEATHER_API_KEY", "demo_key")
+API_KEY = getenv("OPENWEATHER_API_KEY", "demo_key")
+
+# Base URL of the OpenWeatherMap API; override to point at a local stub server
+BASE_URL = getenv("OPENWEATHER_BASE_URL", "https://api.openweathermap.org/data/2.5")
+
+# Seconds to wait for the API before giving up on a request
+REQUEST_TIMEOUT = float(getenv("OPENWEATHER_TIMEOUT", "10"))
+
+_session = None
+
+def get_session():
+    """
+    Return a shared requests session so connections are kept alive between calls
+    """
+    global _session
+    if _session is None:
+        import requests  # Deferred: only needed once a real API call is made
+        _session = requests.Session()
+    return _session
+
+def normalize_location(location):
+    """
+    Normalize a free-text location so equivalent spellings share a cache entry
+
+    Known places become "lat,lon" keys via the local gazetteer (see utils.geocode).
+    """
+    return canonical_location(location)
+
+def api_params(location):
+    """
+    Build the query parameters for an OpenWeatherMap request
+
+    Coordinate keys are sent as lat/lon; anything else as a free-text query.
+    """
+    coordinates = parse_coordinates(location)
+    if coordinates is not None:
+        return {'lat': coordinates[0], 'lon': coordinates[1], 'appid': API_KEY, 'units': 'imperial'}
+    return {'q': location, 'appid': API_KEY, 'units': 'imperial'}
+
+def fetch_json(endpoint, location):
+    """
+    Make one rate-limited OpenWeatherMap request and return the decoded JSON
+
+    Waits for a token from the shared rate limiter first. A 429 pauses every
+    process for the Retry-After period, then the request is retried once if
+    the wait fits within the caller's priority budget.
+
+    Raises:
+        RateLimited: If the limiter or the API refuses the request
+    """
+    limiter = get_limiter()
+    for attempt in range(2):
+        limiter.acquire()
+        with metrics.span("upstream", endpoint=endpoint):
+            response = get_session().get(f"{BASE_URL}/{endpoint}", params=api_params(location),
+                                         timeout=REQUEST_TIMEOUT)
+        metrics.incr("upstream_requests", endpoint=endpoint, status=response.status_code)
+        
+        if response.status_code != 429:
+            break
+        retry_after = parse_retry_after(response.headers.get('Retry-After'))
+        limiter.block(retry_after)
+    else:
+        raise RateLimited("Weather API rate limit exceeded", retry_after)
+        
+    if response.status_code != 200:
+        raise Exception(f"API error: {response.status_code}")
+    return response.json()
 
-@st.cache_data(ttl=1800)  # Cache data for 30 minutes
+@cached("weather", ttl=1800, normalize=normalize_location,  # Cache data for 30 minutes
+        fallback=lambda location: get_mock_weather_data(location))
 def get_weather_data(location):
     """
     Get current weather data for a location using OpenWeatherMap API
+
+    Falls back to mock data (never cached) when a request fails, except
+    when rate limited; refresh() raises instead.
     """
     # For demo purposes, if API key is not available, return mock data
     if API_KEY == "demo_key":
         return get_mock_weather_data(location)
         
-    try:
-        # Make API call to OpenWeatherMap
-        url = f"https://api.openweathermap.org/data/2.5/weather?q={location}&appid={API_KEY}&units=imperial"
-        response = requests.get(url)
-        
-        if response.status_code != 200:
-            raise Exception(f"API error: {response.status_code}")
-            
-        data = response.json()
-        
-        # Extract relevant weather information
-        weather_data = {
-            'temp': round(data['main']['temp']),
-            'humidity': data['main']['humidity'],
-            'conditions': data['weather'][0]['main'],
-            'wind_speed': data['wind']['speed'],
-            'location': f"{data['name']}, {data.get('sys', {}).get('country', '')}",
-            'timestamp': datetime.datetime.now()
-        }
+    # Make API call to OpenWeatherMap
+    data = fetch_json("weather", location)
+    
+    with metrics.span("parse_weather"):
+        weather_data = parse_weather(data)
+    return record_weather(location, weather_data)
+
+def parse_weather(data):
+    """
+    Extract the fields we use from a current weather API response
+    """
+    # Try to get rainfall data if available
+    rainfall_1h = data['rain'].get('1h', 0) if 'rain' in data else 0
+    
+    return Observation(
+        temp=round(data['main']['temp']),
+        humidity=data['main']['humidity'],
+        conditions=data['weather'][0]['main'],
+        wind_speed=data['wind']['speed'],
+        location=f"{data['name']}, {data.get('sys', {}).get('country', '')}",
+        timestamp=datetime.datetime.now(),
+        rainfall_1h=rainfall_1h,
+        rainfall_24h=rainfall_1h * 24,  # Estimate based on current rainfall
+    )
+
+def record_weather(location, weather_data):
+    """
+    Persist a fetched observation to the history store
+
+    Once enough observations have accumulated, the rainfall_24h estimate is
+    replaced with rainfall measured over the last 24 hours.
+    """
+    from utils.history import get_history_store
+    
+    store = get_history_store()
+    if store is None:
+        return weather_data
         
-        # Try to get rainfall data if available
-        if 'rain' in data:
-            weather_data['rainfall_24h'] = data['rain'].get('1h', 0) * 24  # Estimate based on current rainfall
-        else:
-            weather_data['rainfall_24h'] = 0
-            
+    try:
+        store.record_observation(location, weather_data)
+        measured = store.rainfall_24h(location)
+    except OSError as e:
+        logger.warning("Could not record weather history for %s: %s", location, e)
         return weather_data
         
-    except Exception as e:
-        st.error(f"Error getting weather data: {str(e)}")
-        return get_mock_weather_data(location)
+    if measured is not None:
+        weather_data['rainfall_24h'] = measured
+    return weather_data
 
-@st.cache_data(ttl=3600)  # Cache data for 60 minutes
+def record_forecast(location, forecast_data):
+    """
+    Persist fetched daily forecasts to the history store
+    """
+    from utils.history import get_history_store
+    
+    store = get_history_store()
+    if store is not None:
+        try:
+            store.record_forecast(location, forecast_data)
+        except OSError as e:
+            logger.warning("Could not record forecast history for %s: %s", location, e)
+    return forecast_data
+
+@cached("forecast", ttl=3600, normalize=normalize_location,  # Cache data for 60 minutes
+        fallback=lambda location, days=5: get_mock_forecast(location, days))
 def get_forecast(location, days=5):
     """
     Get 5-day forecast for a location using OpenWeatherMap API
+
+    Falls back to mock data like get_weather_data.
     """
     # For demo purposes, if API key is not available, return mock data
     if API_KEY == "demo_key":
         return get_mock_forecast(location, days)
         
-    try:
-        # Make API call to OpenWeatherMap forecast endpoint
-        url = f"https://api.openweathermap.org/data/2.5/forecast?q={location}&appid={API_KEY}&units=imperial"
-        response = requests.get(url)
-        
-        if response.status_code != 200:
-            raise Exception(f"API error: {response.status_code}")
-            
-        data = response.json()
-        
-        # Process and organize forecast data by day
-        forecast_data = []
-        today = datetime.datetime.now().date()
-        
-        # Group by date
-        forecasts_by_date = {}
-        
-        for item in data['list']:
-            dt = datetime.datetime.fromtimestamp(item['dt'])
-            date_str = dt.date()
+    # Make API call to OpenWeatherMap forecast endpoint
+    data = fetch_json("forecast", location)
+    
+    with metrics.span("parse_forecast"):
+        forecast_data = parse_forecast(data, days)
+    return record_forecast(location, forecast_data)
+
+def parse_forecast(data, days=5):
+    """
+    Summarize a 5-day/3-hour forecast API response into daily forecasts
+
+    Makes a single pass over the 3-hour slots, keeping running high/low/sums
+    and condition counts per day instead of building a dict per slot.
+    """
+    today = datetime.datetime.now().date()
+    first_date = today + datetime.timedelta(days=1)
+    last_date = today + datetime.timedelta(days=days)
+    
+    # Running stats per day: [high, low, temp_sum, humidity_sum, rainfall, count, condition_counts]
+    daily = {}
+    
+    for item in data['list']:
+        forecast_date = datetime.date.fromtimestamp(item['dt'])
+        if forecast_date < first_date or forecast_date > last_date:
+            continue
             
-            if date_str not in forecasts_by_date:
-                forecasts_by_date[date_str] = []
-                
-            forecasts_by_date[date_str].append({
-                'temp': item['main']['temp'],
-                'conditions': item['weather'][0]['main'],
-                'humidity': item['main']['humidity'],
-                'rainfall': item.get('rain', {}).get('3h', 0),
-                'time': dt.time()
-            })
+        main = item['main']
+        temp = main['temp']
+        conditions = item['weather'][0]['main']
+        rain = item.get('rain')
         
-        # Create daily summaries for the next 'days' days
-        for i in range(1, days + 1):
-            forecast_date = today + datetime.timedelta(days=i)
+        stats = daily.get(forecast_date)
+        if stats is None:
+            daily[forecast_date] = [temp, temp, temp, main['humidity'],
+                                    rain.get('3h', 0) if rain else 0, 1, {conditions: 1}]
+            continue
             
-            if forecast_date in forecasts_by_date:
-                day_forecasts = forecasts_by_date[forecast_date]
-                
-                # Calculate daily stats
-                temps = [f['temp'] for f in day_forecasts]
-                rainfall = sum(f.get('rainfall', 0) for f in day_forecasts)
-                conditions = max(set(f['conditions'] for f in day_forecasts), 
-                                key=[f['conditions'] for f in day_forecasts].count)
-                
-                forecast_data.append({
-                    'date': forecast_date,
-                    'temp_high': round(max(temps)),
-                    'temp_low': round(min(temps)),
-                    'temp_avg': round(sum(temps) / len(temps)),
-                    'conditions': conditions,
-                    'rainfall': round(rainfall, 2),
-                    'humidity': round(sum(f['humidity'] for f in day_forecasts) / len(day_forecasts))
-                })
-        
-        return forecast_data
+        if temp > stats[0]:
+            stats[0] = temp
+        elif temp < stats[1]:
+            stats[1] = temp
+        stats[2] += temp
+        stats[3] += main['humidity']
+        if rain:
+            stats[4] += rain.get('3h', 0)
+        stats[5] += 1
+        condition_counts = stats[6]
+        condition_counts[conditions] = condition_counts.get(conditions, 0) + 1
+    
+    # Create daily summaries in date order; ties for the modal condition go to the earliest seen
+    forecast_data = []
+    for forecast_date in sorted(daily):
+        high, low, temp_sum, humidity_sum, rainfall, count, condition_counts = daily[forecast_date]
+        forecast_data.append(DailyForecast(
+            date=forecast_date,
+            temp_high=round(high),
+            temp_low=round(low),
+            temp_avg=round(temp_sum / count),
+            conditions=max(condition_counts, key=condition_counts.get),
+            rainfall=round(rainfall, 2),
+            humidity=round(humidity_sum / count),
+        ))
+    
+    return forecast_data
+
+def parse_forecast_numpy(data, days=5):
+    """
+    Vectorized variant of parse_forecast; see parse_forecasts_numpy
+    """
+    return parse_forecasts_numpy([data], days)[0]
+
+def parse_forecasts_numpy(payloads, days=5):
+    """
+    Summarize many forecast API responses at once for bulk refreshes
+
+    Flattens every 'list' payload into arrays and aggregates per
+    (location, day) with NumPy group-by reductions. Produces the same daily
+    summaries as parse_forecast for each payload.
+    """
+    import numpy as np
+    
+    items = [item for data in payloads for item in data['list']]
+    sizes = [len(data['list']) for data in payloads]
+    if not items:
+        return [[] for _ in payloads]
         
-    except Exception as e:
-        st.error(f"Error getting forecast data: {str(e)}")
-        return get_mock_forecast(location, days)
+    # One pass over the payload: numeric fields into a flat table, conditions into integer codes
+    labels = {}
+    table = np.array([
+        (item['dt'], item['main']['temp'], item['main']['humidity'],
+         item['rain'].get('3h', 0) if 'rain' in item else 0,
+         labels.setdefault(item['weather'][0]['main'], len(labels)))
+        for item in items
+    ], dtype=float)
+    labels = list(labels)
+    
+    count = len(items)
+    location = np.repeat(np.arange(len(payloads)), sizes)
+    timestamps = table[:, 0].astype(np.int64)
+    temps, humidity, rainfall = table[:, 1], table[:, 2], table[:, 3]
+    codes = table[:, 4].astype(np.intp)
+    
+    # Local calendar day of each slot; offsets only differ across a DST change
+    first_offset = datetime.datetime.fromtimestamp(int(timestamps.min())).astimezone().utcoffset()
+    last_offset = datetime.datetime.fromtimestamp(int(timestamps.max())).astimezone().utcoffset()
+    if first_offset == last_offset:
+        local_days = (timestamps + int(first_offset.total_seconds())) // 86400
+    else:
+        local_days = np.fromiter((datetime.date.fromtimestamp(item['dt']).toordinal() - EPOCH_ORDINAL
+                                  for item in items), dtype=np.int64, count=count)
+    
+    first_day = datetime.datetime.now().date().toordinal() - EPOCH_ORDINAL + 1
+    day_index = local_days - first_day
+    in_range = (day_index >= 0) & (day_index < days)
+    
+    codes = codes[in_range]
+    group = (location * days + day_index)[in_range]
+    temps, humidity, rainfall = temps[in_range], humidity[in_range], rainfall[in_range]
+    groups = len(payloads) * days
+    
+    counts = np.bincount(group, minlength=groups)
+    high = np.full(groups, -np.inf)
+    low = np.full(groups, np.inf)
+    np.maximum.at(high, group, temps)
+    np.minimum.at(low, group, temps)
+    temp_sum = np.bincount(group, weights=temps, minlength=groups)
+    humidity_sum = np.bincount(group, weights=humidity, minlength=groups)
+    rain_sum = np.bincount(group, weights=rainfall, minlength=groups)
+    
+    # Modal condition per group; ties go to the condition seen first that day
+    cell = group * len(labels) + codes
+    condition_counts = np.bincount(cell, minlength=groups * len(labels)).reshape(groups, len(labels))
+    first_seen = np.full(groups * len(labels), len(cell))
+    np.minimum.at(first_seen, cell, np.arange(len(cell)))
+    score = condition_counts * (len(cell) + 1) - first_seen.reshape(groups, len(labels))
+    modal = score.argmax(axis=1)
+    
+    results = [[] for _ in payloads]
+    for g in np.flatnonzero(counts).tolist():
+        n = int(counts[g])
+        results[g // days].append(DailyForecast(
+            date=datetime.date.fromordinal(first_day + g % days + EPOCH_ORDINAL),
+            temp_high=round(float(high[g])),
+            temp_low=round(float(low[g])),
+            temp_avg=round(float(temp_sum[g]) / n),
+            conditions=labels[modal[g]],
+            rainfall=round(float(rain_sum[g]), 2),
+            humidity=round(float(humidity_sum[g]) / n),
+        ))
+    
+    return results
 
 def get_mock_weather_data(location):
     """
     Generate mock weather data for demo purposes
     """
-    return {
-        'temp': 72,
-        'humidity': 65,
-        'conditions': 'Partly Cloudy',
-        'wind_speed': 5.2,
-        'location': location,
-        'timestamp': datetime.datetime.now(),
-        'rainfall_24h': 0.1
-    }
+    return Observation(
+        temp=72,
+        humidity=65,
+        conditions='Partly Cloudy',
+        wind_speed=5.2,
+        location=location,
+        timestamp=datetime.datetime.now(),
+        rainfall_24h=0.1,
+    )
 
 def get_mock_forecast(location, days=5):
     """
@@ -149,14 +348,14 @@ def get_mock_forecast(location, days=5):
     
     for i in range(1, days + 1):
         forecast_date = today + datetime.timedelta(days=i)
-        forecast_data.append({
-            'date': forecast_date,
-            'temp_high': temps_high[i-1] if i <= len(temps_high) else 75,
-            'temp_low': temps_low[i-1] if i <= len(temps_low) else 60,
-            'temp_avg': (temps_high[i-1] + temps_low[i-1]) / 2 if i <= len(temps_high) else 68,
-            'conditions': conditions[i-1] if i <= len(conditions) else 'Sunny',
-            'rainfall': rainfall[i-1] if i <= len(rainfall) else 0,
-            'humidity': 65
-        })
+        forecast_data.append(DailyForecast(
+            date=forecast_date,
+            temp_high=temps_high[i-1] if i <= len(temps_high) else 75,
+            temp_low=temps_low[i-1] if i <= len(temps_low) else 60,
+            temp_avg=(temps_high[i-1] + temps_low[i-1]) / 2 if i <= len(temps_high) else 68,
+            conditions=conditions[i-1] if i <= len(conditions) else 'Sunny',
+            rainfall=rainfall[i-1] if i <= len(rainfall) else 0,
+            humidity=65,
+        ))
     
     return forecast_data